@@ -0,0 +1,261 @@
+# -*- coding: utf-8 -*-
+"""Runs RazorClient benchmark scenarios against a SimulatedRazorServer.
+
+Results are written as JSON, one object per scenario with wall-clock timings
+for each repetition, so runs can be stored and compared to catch regressions:
+
+    python -m benchmarks.run --nodes 1000 --latency 0.002 -o results.json
+    python -m benchmarks.run --scenario sweep --nodes 100000 --workers 32
+
+The cli_import and cli_end_to_end scenarios track the startup cost of the
+py-razor-client tool, each repetition running it in a fresh interpreter.
+"""
+from argparse import ArgumentParser
+import json
+import os
+import platform
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+from benchmarks.simulated_server import SimulatedRazorServer
+from py_razor_client.razor_client import collection_members
+from py_razor_client.razor_client import RazorClient
+from py_razor_client.version import VERSION
+
+
+def scenario_discovery(server, options):
+    """Constructs a client, which runs discovery against /api."""
+    client = RazorClient(server.hostname, server.port)
+    client.close()
+    return 1
+
+
+def scenario_list(server, options):
+    """Lists every node stub."""
+    client = options['client']
+    return len(collection_members(client.nodes()))
+
+
+def scenario_list_paged(server, options):
+    """Lists every node stub, 500 at a time, prefetching the next page."""
+    client = options['client']
+    return sum(1 for _ in client.nodes(page_size=500))
+
+
+def scenario_get_member(server, options):
+    """Fetches individual nodes one at a time."""
+    client = options['client']
+    count = min(options['members'], server.razor.node_count)
+    for index in range(count):
+        client.nodes("node%d" % index)
+    return count
+
+
+def scenario_sweep(server, options):
+    """Lists the nodes and fetches every one of them concurrently."""
+    client = options['client']
+    nodes = client.nodes(expand=True, max_workers=options['workers'])
+    return len(nodes)
+
+
+def scenario_sweep_include(server, options):
+    """Fetches every node along with its policy and tags, and each policy's
+    repo and broker, resolving every distinct reference once.
+    """
+    client = options['client']
+    nodes = client.nodes(include=["policy", "tags", "repo", "broker"],
+                         depth=2, max_workers=options['workers'])
+    return len(nodes)
+
+
+def scenario_sweep_serial(server, options):
+    """Lists the nodes and fetches every one of them serially."""
+    client = options['client']
+    stubs = collection_members(client.nodes())
+    for stub in stubs:
+        client.get_path(stub['id'])
+    return len(stubs)
+
+
+def scenario_command_burst(server, options):
+    """Runs a burst of commands concurrently."""
+    client = options['client']
+    argument_sets = [{"name": "node%d" % i}
+                     for i in range(options['commands'])]
+    results = client.execute_bulk("delete-node", argument_sets,
+                                  max_workers=options['workers'])
+    if not results.ok:
+        raise RuntimeError("%d commands failed" % len(results.failed))
+    return len(results)
+
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+CLI_PATH = os.path.join(ROOT, "bin", "py-razor-client")
+
+
+def run_python(argv):
+    env = dict(os.environ, PYTHONPATH=ROOT)
+    with open(os.devnull, "w") as devnull:
+        subprocess.check_call([sys.executable] + argv, env=env,
+                              stdout=devnull)
+
+
+def scenario_cli_import(server, options):
+    """Starts an interpreter and imports what the command line tool needs."""
+    run_python(["-c", "import py_razor_client.cli; "
+                      "import py_razor_client.razor_client"])
+    return 1
+
+
+def scenario_cli_end_to_end(server, options):
+    """Runs py-razor-client to fetch one node, with its discovery cache
+    warmed by the warmup runs.
+    """
+    run_python([CLI_PATH, "-c", options['cli_config'], "nodes", "node0"])
+    return 1
+
+
+SCENARIOS = (
+    ("discovery", scenario_discovery),
+    ("list", scenario_list),
+    ("list_paged", scenario_list_paged),
+    ("get_member", scenario_get_member),
+    ("sweep", scenario_sweep),
+    ("sweep_serial", scenario_sweep_serial),
+    ("sweep_include", scenario_sweep_include),
+    ("command_burst", scenario_command_burst),
+    ("cli_import", scenario_cli_import),
+    ("cli_end_to_end", scenario_cli_end_to_end),
+)
+
+
+def summarize(timings, operations):
+    ordered = sorted(timings)
+    median = ordered[len(ordered) // 2]
+    return {
+        "timings": timings,
+        "min": ordered[0],
+        "median": median,
+        "max": ordered[-1],
+        "mean": sum(ordered) / len(ordered),
+        "operations": operations,
+        "operations_per_second": operations / median if median else None,
+    }
+
+
+def run_scenario(name, fn, server, options):
+    client = RazorClient(server.hostname, server.port,
+                         pool_size=options['workers'])
+    options = dict(options, client=client)
+    try:
+        for _ in range(options['warmup']):
+            fn(server, options)
+
+        timings = []
+        operations = 0
+        for _ in range(options['repeat']):
+            start = time.time()
+            operations = fn(server, options)
+            timings.append(time.time() - start)
+    finally:
+        client.close()
+
+    result = summarize(timings, operations)
+    result['scenario'] = name
+    return result
+
+
+def write_cli_config(server, scratch_dir):
+    """Writes a py-razor-client config pointing at the server, with a
+    discovery cache of its own.
+    """
+    config_path = os.path.join(scratch_dir, "py_razor_clientrc")
+    with open(config_path, "w") as f:
+        json.dump({
+            "hostname": server.hostname,
+            "port": server.port,
+            "discovery_cache_dir": os.path.join(scratch_dir, "cache"),
+        }, f)
+    return config_path
+
+
+def create_parser():
+    parser = ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--nodes", type=int, default=1000)
+    parser.add_argument("--latency", type=float, default=0.0,
+                        help="Seconds of latency added to every request")
+    parser.add_argument("--jitter", type=float, default=0.0,
+                        help="Up to this many seconds of extra latency")
+    parser.add_argument("--slow-fraction", type=float, default=0.0,
+                        help="Fraction of requests that are very slow")
+    parser.add_argument("--slow-latency", type=float, default=0.0)
+    parser.add_argument("--wrap-items", action="store_true",
+                        help="Serve collections as objects with 'items'")
+    parser.add_argument("--workers", type=int, default=16)
+    parser.add_argument("--members", type=int, default=100,
+                        help="Members fetched by the get_member scenario")
+    parser.add_argument("--commands", type=int, default=200,
+                        help="Commands sent by the command_burst scenario")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--warmup", type=int, default=1)
+    parser.add_argument("--scenario", action="append",
+                        choices=[name for name, _ in SCENARIOS],
+                        help="Scenario to run; may be repeated. "
+                             "Defaults to all of them.")
+    parser.add_argument("-o", "--output",
+                        help="Write results here instead of stdout")
+    return parser
+
+
+def main(argv=None):
+    args = create_parser().parse_args(argv)
+    selected = args.scenario or [name for name, _ in SCENARIOS]
+    options = {
+        "workers": args.workers,
+        "members": args.members,
+        "commands": args.commands,
+        "repeat": args.repeat,
+        "warmup": args.warmup,
+    }
+
+    server = SimulatedRazorServer(node_count=args.nodes,
+                                  latency=args.latency, jitter=args.jitter,
+                                  slow_fraction=args.slow_fraction,
+                                  slow_latency=args.slow_latency,
+                                  wrap_items=args.wrap_items)
+    results = []
+    scratch_dir = tempfile.mkdtemp()
+    try:
+        with server:
+            options['cli_config'] = write_cli_config(server, scratch_dir)
+            for name, fn in SCENARIOS:
+                if name in selected:
+                    results.append(run_scenario(name, fn, server, options))
+                    print >> sys.stderr, "%-14s median %.4fs" % (
+                        name, results[-1]['median'])
+    finally:
+        shutil.rmtree(scratch_dir)
+
+    report = {
+        "client_version": VERSION,
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "timestamp": time.time(),
+        "parameters": dict(vars(args), scenario=selected),
+        "results": results,
+    }
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+    else:
+        json.dump(report, sys.stdout, indent=2)
+        sys.stdout.write("\n")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
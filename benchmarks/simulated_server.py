@@ -0,0 +1,360 @@
+# -*- coding: utf-8 -*-
+"""A local stand-in for a Razor server, for benchmarking RazorClient.
+
+SimulatedRazorServer serves /api, the usual collections and every command
+from memory, at whatever scale it's asked for, with optional injected latency.
+Collection and member responses carry ETags and honour If-None-Match,
+collections can be paged with start and limit query parameters (unless the
+server is created with paging=False, like older Razors), and commands are
+accepted and acknowledged without changing anything. GETting a command
+describes it, with a parameter schema for the common ones.
+
+    with SimulatedRazorServer(node_count=10000, latency=0.002) as server:
+        client = RazorClient(server.hostname, server.port)
+"""
+from BaseHTTPServer import BaseHTTPRequestHandler
+from BaseHTTPServer import HTTPServer
+import hashlib
+import json
+import random
+import SocketServer
+import threading
+import time
+import urlparse
+
+
+COLLECTIONS = ("nodes", "tags", "repos", "policies", "brokers")
+COMMANDS = ("create-repo", "delete-repo", "create-tag", "delete-tag",
+            "update-tag-rule", "create-broker", "delete-broker",
+            "create-policy", "enable-policy", "disable-policy",
+            "delete-node", "unbind-node", "reinstall-node")
+SPEC_ROOT = "http://api.puppetlabs.com/razor/v1"
+
+STRING = {"type": "string"}
+REQUIRED_STRING = {"type": "string", "required": True}
+# Parameter schemas served for some commands; the rest don't describe theirs
+COMMAND_SCHEMAS = {
+    "create-repo": {"name": REQUIRED_STRING, "iso-url": STRING, "url": STRING,
+                    "task": STRING},
+    "delete-repo": {"name": REQUIRED_STRING},
+    "create-tag": {"name": REQUIRED_STRING, "rule": {"type": "array"}},
+    "delete-tag": {"name": REQUIRED_STRING, "force": {"type": "boolean"}},
+    "create-broker": {"name": REQUIRED_STRING, "broker-type": REQUIRED_STRING,
+                      "configuration": {"type": "object"}},
+    "delete-node": {"name": REQUIRED_STRING},
+    "unbind-node": {"name": REQUIRED_STRING},
+    "reinstall-node": {"name": REQUIRED_STRING},
+}
+
+
+def make_node(index, base_url, tag_count, policy_count):
+    name = "node%d" % index
+    tag = "tag%d" % (index % tag_count)
+    policy = "policy%d" % (index % policy_count)
+    return {
+        "spec": SPEC_ROOT + "/collections/nodes/member",
+        "id": "%s/api/collections/nodes/%s" % (base_url, name),
+        "name": name,
+        "hw_info": {
+            "mac": ["52-54-00-%02x-%02x-%02x" % (
+                (index >> 16) & 0xff, (index >> 8) & 0xff, index & 0xff)],
+            "serial": "SN%08d" % index,
+            "uuid": "564d%028x" % index,
+        },
+        "dhcp_mac": "52:54:00:%02x:%02x:%02x" % (
+            (index >> 16) & 0xff, (index >> 8) & 0xff, index & 0xff),
+        "tags": [make_stub("tags", tag, base_url)],
+        "policy": make_stub("policies", policy, base_url),
+        "facts": dict(("fact_%d" % i, "value %d for %s" % (i, name))
+                      for i in range(40)),
+        "state": {"installed": policy, "installed_at": "2014-04-01"},
+        "hostname": "%s.example.com" % name,
+    }
+
+
+def make_stub(collection, name, base_url):
+    return {
+        "spec": "%s/collections/%s/member" % (SPEC_ROOT, collection),
+        "id": "%s/api/collections/%s/%s" % (base_url, collection, name),
+        "name": name,
+    }
+
+
+class SimulatedRazor(object):
+    """The data a SimulatedRazorServer serves."""
+
+    def __init__(self, base_url, node_count, tag_count=20, policy_count=10,
+                 repo_count=5, broker_count=3, wrap_items=False,
+                 paging=True):
+        self.base_url = base_url
+        self.node_count = node_count
+        self.tag_count = tag_count
+        self.policy_count = policy_count
+        self.wrap_items = wrap_items
+        self.paging = paging
+        self.counts = {
+            "nodes": node_count,
+            "tags": tag_count,
+            "policies": policy_count,
+            "repos": repo_count,
+            "brokers": broker_count,
+        }
+        self.singular = {
+            "nodes": "node",
+            "tags": "tag",
+            "policies": "policy",
+            "repos": "repo",
+            "brokers": "broker",
+        }
+
+    def document_for(self, path):
+        parts = [part for part in path.split("/") if part]
+        if parts == ["api"]:
+            return self.api_document()
+        elif len(parts) == 3 and parts[:2] == ["api", "collections"]:
+            return self.collection(parts[2])
+        elif len(parts) == 4 and parts[:2] == ["api", "collections"]:
+            return self.member(parts[2], parts[3])
+        elif len(parts) == 3 and parts[:2] == ["api", "commands"]:
+            return self.command(parts[2])
+        return None
+
+    def api_document(self):
+        return {
+            "collections": [{
+                "name": name,
+                "rel": "%s/collections/%s" % (SPEC_ROOT, name),
+                "id": "%s/api/collections/%s" % (self.base_url, name),
+            } for name in COLLECTIONS],
+            "commands": [{
+                "name": name,
+                "rel": "%s/commands/%s" % (SPEC_ROOT, name),
+                "id": "%s/api/commands/%s" % (self.base_url, name),
+            } for name in COMMANDS],
+        }
+
+    def command(self, name):
+        if name not in COMMANDS:
+            return None
+        document = {"name": name}
+        if name in COMMAND_SCHEMAS:
+            document['schema'] = COMMAND_SCHEMAS[name]
+        return document
+
+    def page_for(self, path, start, limit):
+        """Returns one page of the collection at path, or None if there's no
+        collection there.
+        """
+        parts = [part for part in path.split("/") if part]
+        if len(parts) != 3 or parts[:2] != ["api", "collections"]:
+            return None
+        name = parts[2]
+        if name not in self.counts:
+            return None
+        count = self.counts[name]
+        return {
+            "spec": "%s/collections/%s" % (SPEC_ROOT, name),
+            "items": self.stubs(name, start, min(start + limit, count)),
+            "total": count,
+        }
+
+    def stubs(self, name, start, end):
+        singular = self.singular[name]
+        return [make_stub(name, "%s%d" % (singular, i), self.base_url)
+                for i in range(start, end)]
+
+    def collection(self, name):
+        if name not in self.counts:
+            return None
+        stubs = self.stubs(name, 0, self.counts[name])
+        if self.wrap_items:
+            return {
+                "spec": "%s/collections/%s" % (SPEC_ROOT, name),
+                "items": stubs,
+            }
+        return stubs
+
+    def member(self, collection, name):
+        singular = self.singular.get(collection)
+        if singular is None or not name.startswith(singular):
+            return None
+        try:
+            index = int(name[len(singular):])
+        except ValueError:
+            return None
+        if not 0 <= index < self.counts[collection]:
+            return None
+
+        if collection == "nodes":
+            return make_node(index, self.base_url, self.tag_count,
+                             self.policy_count)
+        member = make_stub(collection, name, self.base_url)
+        if collection == "policies":
+            member.update(
+                repo=make_stub("repos", "repo%d" % (index % self.counts["repos"]),
+                               self.base_url),
+                broker=make_stub("brokers",
+                                 "broker%d" % (index % self.counts["brokers"]),
+                                 self.base_url),
+                enabled=True,
+                max_count=None,
+            )
+        return member
+
+
+class _RequestHandler(BaseHTTPRequestHandler):
+
+    protocol_version = "HTTP/1.1"  # so clients can keep connections alive
+    # Buffer each response so that headers and body go out together, and
+    # don't hold back the last segment waiting on a delayed ACK.
+    wbufsize = -1
+    disable_nagle_algorithm = True
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_GET(self):
+        self.server.simulate_latency()
+        _, _, path, query, _ = urlparse.urlsplit(self.path)
+        params = urlparse.parse_qs(query)
+        if self.server.razor.paging and "limit" in params:
+            encoded = self.server.encode_page(
+                path, int(params.get("start", ["0"])[0]),
+                int(params["limit"][0]))
+        else:
+            encoded = self.server.encode_cached(path)
+        if encoded is None:
+            self.send_json(404, {"error": "not found: %s" % path})
+        else:
+            self.send_body(200, *encoded)
+
+    def do_POST(self):
+        self.server.simulate_latency()
+        length = int(self.headers.getheader("Content-Length") or 0)
+        body = self.rfile.read(length)
+        path = urlparse.urlsplit(self.path)[2]
+        parts = [part for part in path.split("/") if part]
+
+        if len(parts) != 3 or parts[:2] != ["api", "commands"] or \
+                parts[2] not in COMMANDS:
+            self.send_json(404, {"error": "no such command: %s" % path})
+            return
+
+        try:
+            arguments = json.loads(body or "{}")
+        except ValueError:
+            self.send_json(400, {"error": "bad JSON"})
+            return
+
+        self.server.count_command(parts[2])
+        self.send_json(202, {"result": "%s accepted" % parts[2],
+                             "arguments": arguments})
+
+    def send_json(self, status, document):
+        self.send_body(status, json.dumps(document))
+
+    def send_body(self, status, body, etag=None):
+        if etag and self.headers.getheader("If-None-Match") == etag:
+            self.send_response(304)
+            self.send_header("ETag", etag)
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            return
+
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        if etag:
+            self.send_header("ETag", etag)
+        self.end_headers()
+        self.wfile.write(body)
+
+
+class SimulatedRazorServer(SocketServer.ThreadingMixIn, HTTPServer):
+    """Serves a SimulatedRazor on localhost from a background thread.
+
+    Each request is delayed by latency seconds plus up to jitter seconds
+    more; slow_fraction of requests are additionally delayed by slow_latency,
+    to simulate a server with a long latency tail.
+    """
+
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self, node_count=100, latency=0.0, jitter=0.0,
+                 slow_fraction=0.0, slow_latency=0.0, port=0, seed=0,
+                 **razor_options):
+        HTTPServer.__init__(self, ("127.0.0.1", port), _RequestHandler)
+        self.hostname, self.port = self.server_address
+        self.latency = latency
+        self.jitter = jitter
+        self.slow_fraction = slow_fraction
+        self.slow_latency = slow_latency
+        self.razor = SimulatedRazor(self.base_url, node_count,
+                                    **razor_options)
+        self.commands_received = {}
+        self._encoded = {}
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        self._thread = None
+
+    @property
+    def base_url(self):
+        return "http://%s:%d" % (self.hostname, self.port)
+
+    def start(self):
+        self._thread = threading.Thread(target=self.serve_forever)
+        self._thread.daemon = True
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
+        self._thread.join()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.stop()
+
+    def simulate_latency(self):
+        with self._lock:
+            delay = self.latency + self._random.random() * self.jitter
+            if self._random.random() < self.slow_fraction:
+                delay += self.slow_latency
+        if delay:
+            time.sleep(delay)
+
+    def encode_cached(self, path):
+        """Returns the JSON body and ETag served for a GET of path, or None if
+        there's nothing there. Everything served is static, so the bodies of
+        /api and the collections are encoded once and reused; members are
+        encoded on every request to keep memory bounded at large scales.
+        """
+        encoded = self._encoded.get(path)
+        if encoded is None:
+            document = self.razor.document_for(path)
+            if document is None:
+                return None
+            body = json.dumps(document)
+            encoded = (body, '"%s"' % hashlib.md5(body).hexdigest())
+            if path.rstrip("/").count("/") < 4:
+                self._encoded[path] = encoded
+        return encoded
+
+    def encode_page(self, path, start, limit):
+        """Like encode_cached, for one page of a collection. Pages aren't
+        cached.
+        """
+        document = self.razor.page_for(path, start, limit)
+        if document is None:
+            return None
+        body = json.dumps(document)
+        return body, '"%s"' % hashlib.md5(body).hexdigest()
+
+    def count_command(self, name):
+        with self._lock:
+            self.commands_received[name] = \
+                self.commands_received.get(name, 0) + 1
@@ -0,0 +1,248 @@
+# -*- coding: utf-8 -*-
+"""A long-lived local agent that keeps RazorClients warm for py-razor-client.
+
+Every py-razor-client process otherwise pays for interpreter startup,
+connection setup and discovery. The agent holds one RazorClient per Razor
+server (with its pooled connections and discovered methods) and listens on a
+Unix socket. When the agent is running, the command line tool forwards the
+collection or command it was asked to run to the agent instead of running it
+itself, and falls back to running it in-process when it isn't.
+
+Start the agent with:
+
+    py-razor-client-agent [--socket PATH] [-c CONFIG]
+
+The protocol is one JSON object per line: the tool sends a request naming the
+server, the collection or command, and its arguments; the agent answers with
+either {"result": ...} or {"error": ..., "type": ...}.
+
+A request for a collection or command the agent's client doesn't know makes
+it rediscover the server once before giving up, so ones added to the server
+since the agent started are picked up without restarting it.
+"""
+from argparse import ArgumentParser
+import errno
+import os
+import signal
+import socket
+import SocketServer
+import sys
+import threading
+import types
+
+from py_razor_client.codec import default_codec
+
+
+DEFAULT_SOCKET_PATH = os.path.expanduser("~/.py_razor_client_agent.sock")
+DEFAULT_TIMEOUT = 300  # seconds
+
+
+class AgentUnavailableException(Exception):
+    """Raised when there's no agent to forward a request to."""
+    pass
+
+
+class AgentError(Exception):
+    """Raised when the agent fails to run a forwarded request."""
+
+    def __init__(self, message, error_type=None):
+        super(AgentError, self).__init__(message)
+        self.error_type = error_type
+
+
+def make_request(hostname, port, name, positional, keywords):
+    return {
+        "hostname": hostname,
+        "port": str(port),
+        "name": name,
+        "positional": list(positional),
+        "keywords": keywords,
+    }
+
+
+def forward(request, socket_path=DEFAULT_SOCKET_PATH,
+            timeout=DEFAULT_TIMEOUT):
+    """Sends a request to the agent and returns the result.
+
+    Raises AgentUnavailableException if no agent is listening on
+    socket_path, and AgentError if the agent couldn't run the request or
+    didn't answer within timeout seconds.
+    """
+    if not os.path.exists(socket_path):
+        raise AgentUnavailableException(socket_path)
+
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        sock.settimeout(timeout)
+        try:
+            sock.connect(socket_path)
+        except socket.error:
+            raise AgentUnavailableException(socket_path)
+
+        stream = sock.makefile("rwb")
+        try:
+            stream.write(default_codec().dumps(request) + "\n")
+            stream.flush()
+            line = stream.readline()
+        except socket.timeout:
+            raise AgentError("The agent didn't answer within %s seconds" %
+                             timeout)
+    finally:
+        sock.close()
+
+    if not line:
+        raise AgentError("The agent closed the connection without answering")
+    response = default_codec().loads(line)
+    if "error" in response:
+        raise AgentError(response['error'], response.get('type'))
+    return response['result']
+
+
+class _AgentRequestHandler(SocketServer.StreamRequestHandler):
+
+    def handle(self):
+        line = self.rfile.readline()
+        if not line:
+            return
+        try:
+            request = default_codec().loads(line)
+        except ValueError:
+            response = {"error": "Malformed request", "type": "ValueError"}
+        else:
+            response = self.server.run_request(request)
+        self.wfile.write(default_codec().dumps(response) + "\n")
+
+
+class AgentServer(SocketServer.ThreadingMixIn, SocketServer.UnixStreamServer):
+    """Serves forwarded requests using a warm RazorClient per server.
+
+    client_factory(hostname, port) creates the client for a server the first
+    time a request for it arrives.
+    """
+
+    daemon_threads = True
+
+    def __init__(self, socket_path, client_factory):
+        self.socket_path = socket_path
+        self.client_factory = client_factory
+        self._clients = {}
+        self._clients_lock = threading.Lock()
+        remove_stale_socket(socket_path)
+        old_umask = os.umask(0o077)  # only the owner may connect
+        try:
+            SocketServer.UnixStreamServer.__init__(self, socket_path,
+                                                   _AgentRequestHandler)
+        finally:
+            os.umask(old_umask)
+
+    def client_for(self, hostname, port):
+        key = (hostname, str(port))
+        with self._clients_lock:
+            client = self._clients.get(key)
+            if client is None:
+                client = self.client_factory(hostname, port)
+                self._clients[key] = client
+            return client
+
+    def run_request(self, request):
+        # Imported here so that the command line tool, which imports this
+        # module to forward requests, doesn't pay for it.
+        from py_razor_client.cli import dispatch
+        from py_razor_client.cli import UnknownCommandException
+
+        def run(client):
+            return dispatch(client, request['name'],
+                            request.get('positional', []),
+                            request.get('keywords', {}))
+
+        try:
+            client = self.client_for(request['hostname'], request['port'])
+            try:
+                result = run(client)
+            except UnknownCommandException:
+                # It may have been added to the server since discovery
+                client.discover_methods(refresh=True)
+                result = run(client)
+            # Generators (e.g. from stream=True) can't be sent as they are
+            if isinstance(result, types.GeneratorType):
+                result = list(result)
+        except UnknownCommandException as e:
+            return {"error": str(e), "type": "UnknownCommandException"}
+        except Exception as e:
+            return {"error": "%s: %s" % (e.__class__.__name__, e),
+                    "type": e.__class__.__name__}
+        return {"result": result}
+
+    def server_close(self):
+        SocketServer.UnixStreamServer.server_close(self)
+        with self._clients_lock:
+            clients, self._clients = self._clients.values(), {}
+        for client in clients:
+            client.close()
+        try:
+            os.unlink(self.socket_path)
+        except OSError as e:
+            if e.errno != errno.ENOENT:
+                raise
+
+
+def remove_stale_socket(socket_path):
+    """Removes a socket left behind by an agent that's no longer running.
+
+    Raises an exception if an agent is still listening there.
+    """
+    if not os.path.exists(socket_path):
+        return
+
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        sock.connect(socket_path)
+    except socket.error:
+        os.unlink(socket_path)
+    else:
+        raise RuntimeError("An agent is already listening on %s" %
+                           socket_path)
+    finally:
+        sock.close()
+
+
+def main(argv=None):
+    from py_razor_client import cli
+
+    parser = ArgumentParser(description="Keeps RazorClients warm for "
+                                        "py-razor-client.")
+    parser.add_argument("-c", "--config")
+    parser.add_argument("--socket")
+    args = parser.parse_args(argv)
+
+    config = cli.load_config(args.config)
+    socket_path = os.path.expanduser(
+        args.socket or config.get('agent_socket') or DEFAULT_SOCKET_PATH)
+
+    def client_factory(hostname, port):
+        client_config = dict(config, hostname=hostname, port=port)
+        return cli.make_client(client_config)
+
+    server = AgentServer(socket_path, client_factory)
+    if config.get('hostname') and config.get('port'):
+        # Warm up the configured server before the first request arrives
+        try:
+            server.client_for(config['hostname'], config['port']).commands
+        except Exception as e:
+            sys.stderr.write("Couldn't warm up %s:%s: %s\n" % (
+                config['hostname'], config['port'], e))
+
+    # Exit through the finally below on SIGTERM too, so the socket is removed
+    signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))
+    sys.stderr.write("py-razor-client agent listening on %s\n" % socket_path)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,57 @@
+# -*- coding: utf-8 -*-
+"""A non-blocking flavour of RazorClient.
+
+AsyncRazorClient discovers collections and commands exactly like RazorClient,
+but every bound lister, getter and command returns a Future instead of
+blocking. Calls run on a shared pool of worker threads over the client's
+single pooled session, so hundreds of lookups can be in flight at once:
+
+    client = AsyncRazorClient("example.com", 8080, max_workers=32)
+    futures = [client.nodes(name) for name in names]
+    nodes = gather(futures)
+
+The interpreters this package supports predate asyncio, so this is built on
+threads rather than an event loop; a Future's add_done_callback can be used
+to hand results back to whatever loop the caller is running.
+"""
+from py_razor_client.concurrency import WorkerPool
+from py_razor_client.deadline import propagate
+from py_razor_client.razor_client import RazorClient
+
+
+class AsyncRazorClient(RazorClient):
+
+    DEFAULT_MAX_WORKERS = 10
+
+    def __init__(self, hostname, port, lazy_discovery=False,
+                 max_workers=DEFAULT_MAX_WORKERS, worker_pool=None, **kwargs):
+        # Size the connection pool to match the workers by default so that
+        # no worker ever waits on a connection.
+        kwargs.setdefault("pool_size", max_workers)
+        self.max_workers = max_workers
+        self._owns_worker_pool = worker_pool is None
+        self.worker_pool = worker_pool or WorkerPool(max_workers)
+        super(AsyncRazorClient, self).__init__(hostname, port,
+                                               lazy_discovery=lazy_discovery,
+                                               **kwargs)
+
+    def submit(self, fn, *args, **kwargs):
+        """Runs fn(*args, **kwargs) on the worker pool, returning a Future.
+
+        Any deadline in effect when the call is submitted applies to it.
+        """
+        return self.worker_pool.submit(propagate(fn), *args, **kwargs)
+
+    def discover_methods_async(self, refresh=False):
+        return self.submit(self.discover_methods, refresh)
+
+    def close(self):
+        if self._owns_worker_pool:
+            self.worker_pool.shutdown(wait=False)
+            self.worker_pool = WorkerPool(self.max_workers)
+        super(AsyncRazorClient, self).close()
+
+    def _bind_method(self, method_name, method):
+        def submit_method(*args, **kwargs):
+            return self.submit(method, *args, **kwargs)
+        super(AsyncRazorClient, self)._bind_method(method_name, submit_method)
@@ -0,0 +1,141 @@
+# -*- coding: utf-8 -*-
+"""Runs many py-razor-client commands in one process.
+
+With --batch FILE (or --batch - for stdin), py-razor-client reads one command
+per line, written exactly as it would be on the command line after the global
+options:
+
+    nodes node1
+    delete-node --name node2
+    create-repo --name repo1 --iso-url "http://example.com/my image.iso"
+
+Every line runs against the same client, so startup, connection setup and
+discovery are paid once for the whole batch rather than once per command.
+With --jobs N, up to N lines run at a time. Each line produces one JSON
+record on stdout, in input order:
+
+    {"line": 1, "command": "nodes node1", "ok": true, "result": {...}}
+    {"line": 2, "command": "delete-node --name node2", "ok": false,
+     "error": "HTTPError: 404 Client Error: Not Found"}
+
+Blank lines and lines starting with # are skipped.
+"""
+from argparse import ArgumentParser
+from collections import deque
+import shlex
+import types
+
+from py_razor_client import cli
+from py_razor_client.codec import get_codec
+from py_razor_client.concurrency import WorkerPool
+
+
+PROMPT = "razor> "
+
+
+class BatchLineError(ValueError):
+    """Raised for a batch line that can't be parsed."""
+    pass
+
+
+class _LineParser(ArgumentParser):
+
+    def error(self, message):
+        # The default prints usage and exits, which would end the whole batch
+        raise BatchLineError(message)
+
+
+def create_line_parser():
+    parser = _LineParser(prog="py-razor-client --batch", add_help=False)
+    parser.add_argument("collection_or_command")
+    parser.add_argument("collection_item", nargs="?")
+    parser.add_argument("additional_args", nargs="*")
+    return parser
+
+
+def parse_line(line):
+    """Parses one batch line into (name, positional, keywords)."""
+    argv = shlex.split(line, comments=True)
+    args, added_args = cli.parse_args(create_line_parser(), argv)
+    positional, keywords = cli.command_arguments(args, added_args)
+    return args.collection_or_command, positional, keywords
+
+
+def read_lines(stream, prompt=None):
+    """Yields (line number, line) for each command in stream.
+
+    If prompt is given, it's called before each line is read, e.g. to show
+    an interactive user a prompt.
+    """
+    number = 0
+    while True:
+        if prompt is not None:
+            prompt()
+        # readline rather than iteration, which reads ahead and would leave
+        # an interactive user waiting on a full buffer
+        line = stream.readline()
+        if not line:
+            return
+        number += 1
+        line = line.strip()
+        if line and not line.startswith("#"):
+            yield number, line
+
+
+def run_line(client, number, line):
+    """Runs one batch line, returning its result record."""
+    record = {"line": number, "command": line}
+    try:
+        name, positional, keywords = parse_line(line)
+        result = cli.dispatch(client, name, positional, keywords)
+        if isinstance(result, types.GeneratorType):
+            result = list(result)
+    except cli.UnknownCommandException as e:
+        record.update(ok=False, error="No such collection or command: %s" % e)
+    except Exception as e:
+        record.update(ok=False, error="%s: %s" % (e.__class__.__name__, e))
+    else:
+        record.update(ok=True, result=result)
+    return record
+
+
+def run_batch(client, lines, jobs=1):
+    """Runs (line number, line) pairs against client, yielding their result
+    records in input order.
+
+    With more than one job, lines run concurrently on a pool of that many
+    threads; at most twice that many are read ahead of the record currently
+    being waited for.
+    """
+    if jobs <= 1:
+        for number, line in lines:
+            yield run_line(client, number, line)
+        return
+
+    pool = WorkerPool(jobs)
+    pending = deque()
+    try:
+        for number, line in lines:
+            pending.append(pool.submit(run_line, client, number, line))
+            while len(pending) > 2 * jobs or (pending and pending[0].done()):
+                yield pending.popleft().result()
+        while pending:
+            yield pending.popleft().result()
+    finally:
+        # Only wait for the workers if they're idle, i.e. the batch wasn't
+        # abandoned part way through
+        pool.shutdown(wait=not pending)
+
+
+def write_records(records, stream, codec=None):
+    """Writes each record as a line of JSON, returning 0 if every record
+    succeeded and 1 otherwise.
+    """
+    codec = get_codec(codec)
+    status = 0
+    for record in records:
+        if not record['ok']:
+            status = 1
+        stream.write(codec.dumps(record) + "\n")
+        stream.flush()
+    return status
@@ -0,0 +1,119 @@
+# -*- coding: utf-8 -*-
+"""Support for running one Razor command many times concurrently.
+
+See RazorClient.execute_bulk. A bulk run is given a sequence of keyword
+argument sets; BARRIER can be placed in the sequence to split it into phases,
+where every command in a phase finishes before any command in the next one
+starts:
+
+    client.execute_bulk("create_tag", [
+        {"name": "small", "rule": [...]},
+        {"name": "large", "rule": [...]},
+        BARRIER,
+        {"name": "huge", "rule": [...]},
+    ])
+"""
+from py_razor_client.concurrency import map_outcomes
+
+
+class _Barrier(object):
+
+    def __repr__(self):
+        return "BARRIER"
+
+
+BARRIER = _Barrier()
+
+
+class BulkAbortedException(Exception):
+    """Recorded for commands that were skipped because an earlier phase of a
+    bulk run failed.
+    """
+    pass
+
+
+class CommandResult(object):
+    """The outcome of one command in a bulk run."""
+
+    def __init__(self, index, arguments, response=None, exception=None):
+        self.index = index
+        self.arguments = arguments
+        self.response = response
+        self.exception = exception
+
+    @property
+    def succeeded(self):
+        return self.exception is None
+
+    def __repr__(self):
+        if self.succeeded:
+            return "CommandResult(%r, %r, response=%r)" % (
+                self.index, self.arguments, self.response)
+        return "CommandResult(%r, %r, exception=%r)" % (
+            self.index, self.arguments, self.exception)
+
+
+class BulkResult(list):
+    """The CommandResults of a bulk run, in the order they were given."""
+
+    @property
+    def succeeded(self):
+        return [result for result in self if result.succeeded]
+
+    @property
+    def failed(self):
+        return [result for result in self if not result.succeeded]
+
+    @property
+    def ok(self):
+        return not self.failed
+
+
+def split_phases(argument_sets):
+    """Splits argument sets into lists of (index, arguments) at each BARRIER.
+
+    Indexes count only the argument sets, not the barriers.
+    """
+    phases = [[]]
+    index = 0
+    for arguments in argument_sets:
+        if arguments is BARRIER:
+            phases.append([])
+        else:
+            phases[-1].append((index, arguments))
+            index += 1
+    return [phase for phase in phases if phase]
+
+
+def run_bulk(execute, argument_sets, max_workers, stop_on_failure=False):
+    """Calls execute(arguments) for every argument set, at most max_workers
+    at a time, and returns a BulkResult.
+
+    If stop_on_failure is set, a phase containing any failure keeps later
+    phases from running; their commands are recorded as failed with a
+    BulkAbortedException.
+    """
+    phases = split_phases(argument_sets)
+    results = BulkResult()
+    aborted = False
+
+    for phase in phases:
+        if aborted:
+            for index, arguments in phase:
+                exception = BulkAbortedException(
+                    "skipped after an earlier phase failed")
+                results.append(CommandResult(index, arguments,
+                                             exception=exception))
+            continue
+
+        outcomes = map_outcomes(execute,
+                                [arguments for _, arguments in phase],
+                                max_workers)
+        for (index, arguments), (response, exception) in zip(phase,
+                                                               outcomes):
+            results.append(CommandResult(index, arguments, response,
+                                         exception))
+            if exception is not None and stop_on_failure:
+                aborted = True
+
+    return results
@@ -0,0 +1,232 @@
+# -*- coding: utf-8 -*-
+"""Caches that let RazorClient avoid talking to the Razor server.
+
+DiscoveryCache persists the document served from /api so that a client (and,
+more importantly, each invocation of the command line tool) can bind its
+collections and commands without a round-trip. Entries are keyed by
+hostname:port, considered fresh for a configurable TTL, and revalidated with
+the server's ETag/Last-Modified validators once they go stale.
+
+ResponseCache keeps recent GET responses in memory, bounded by an LRU policy,
+so repeated reads of the same collection or member can be revalidated with a
+conditional request instead of being transferred again.
+"""
+import errno
+import json
+import os
+import tempfile
+import threading
+import time
+
+
+DEFAULT_CACHE_DIR = os.path.expanduser("~/.cache/py_razor_client")
+
+
+def conditional_headers(etag=None, last_modified=None):
+    """Returns the headers to revalidate a response with the given
+    validators.
+    """
+    headers = {}
+    if etag:
+        headers['If-None-Match'] = etag
+    if last_modified:
+        headers['If-Modified-Since'] = last_modified
+    return headers
+
+
+class DiscoveryCache(object):
+
+    DEFAULT_TTL = 300  # seconds
+
+    def __init__(self, cache_dir=DEFAULT_CACHE_DIR, ttl=DEFAULT_TTL):
+        self.cache_dir = cache_dir
+        self.ttl = ttl
+
+    def load(self, key):
+        """Returns the cached entry for key, or None if there isn't a usable
+        one. Unreadable or corrupt entries are treated as missing.
+        """
+        try:
+            with open(self._path_for(key)) as f:
+                entry = json.load(f)
+        except (IOError, OSError, ValueError):
+            return None
+
+        if not isinstance(entry, dict) or 'document' not in entry:
+            return None
+        return entry
+
+    def store(self, key, document, etag=None, last_modified=None):
+        entry = {
+            "document": document,
+            "etag": etag,
+            "last_modified": last_modified,
+            "fetched_at": time.time(),
+        }
+        self._write(key, entry)
+        return entry
+
+    def touch(self, key, entry):
+        """Marks an entry as freshly validated without changing its contents."""
+        entry['fetched_at'] = time.time()
+        self._write(key, entry)
+        return entry
+
+    def invalidate(self, key):
+        try:
+            os.unlink(self._path_for(key))
+        except OSError as e:
+            if e.errno != errno.ENOENT:
+                raise
+
+    def is_fresh(self, entry):
+        age = time.time() - entry.get('fetched_at', 0)
+        return 0 <= age < self.ttl
+
+    def validators(self, entry):
+        """Returns the conditional request headers to revalidate an entry."""
+        return conditional_headers(entry.get('etag'),
+                                   entry.get('last_modified'))
+
+    def _path_for(self, key):
+        safe_key = key.replace(os.sep, "_").replace(":", "_")
+        return os.path.join(self.cache_dir, "%s.json" % safe_key)
+
+    def _write(self, key, entry):
+        """Writes an entry atomically so concurrent readers never see a
+        partially written file.
+        """
+        try:
+            os.makedirs(self.cache_dir)
+        except OSError as e:
+            if e.errno != errno.EEXIST:
+                raise
+
+        fd, tmp_path = tempfile.mkstemp(dir=self.cache_dir, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "w") as f:
+                json.dump(entry, f)
+            os.rename(tmp_path, self._path_for(key))
+        except Exception:
+            if os.path.exists(tmp_path):
+                os.unlink(tmp_path)
+            raise
+
+
+class LRUCache(object):
+    """A thread-safe mapping that holds at most max_entries items, evicting
+    the least recently used one when full.
+    """
+
+    def __init__(self, max_entries):
+        if max_entries < 1:
+            raise ValueError("max_entries must be at least 1")
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._entries = {}
+        # A circular doubly linked list of [prev, next, key, value] links,
+        # most recently used first, with self._root as the sentinel.
+        self._root = []
+        self._root[:] = [self._root, self._root, None, None]
+
+    def __len__(self):
+        return len(self._entries)
+
+    def __contains__(self, key):
+        return key in self._entries
+
+    def keys(self):
+        with self._lock:
+            return list(self._entries)
+
+    def get(self, key, default=None):
+        with self._lock:
+            link = self._entries.get(key)
+            if link is None:
+                return default
+            self._unlink(link)
+            self._link_first(link)
+            return link[3]
+
+    def put(self, key, value):
+        with self._lock:
+            link = self._entries.get(key)
+            if link is not None:
+                self._unlink(link)
+                link[3] = value
+            else:
+                if len(self._entries) >= self.max_entries:
+                    oldest = self._root[0]
+                    self._unlink(oldest)
+                    del self._entries[oldest[2]]
+                link = [None, None, key, value]
+                self._entries[key] = link
+            self._link_first(link)
+
+    def pop(self, key, default=None):
+        with self._lock:
+            link = self._entries.pop(key, None)
+            if link is None:
+                return default
+            self._unlink(link)
+            return link[3]
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._root[:] = [self._root, self._root, None, None]
+
+    def _link_first(self, link):
+        first = self._root[1]
+        link[0] = self._root
+        link[1] = first
+        first[0] = link
+        self._root[1] = link
+
+    def _unlink(self, link):
+        prev_link, next_link = link[0], link[1]
+        prev_link[1] = next_link
+        next_link[0] = prev_link
+
+
+class ResponseCache(object):
+    """Remembers GET responses that carry validators, keyed by URL."""
+
+    DEFAULT_MAX_ENTRIES = 256
+
+    def __init__(self, max_entries=DEFAULT_MAX_ENTRIES):
+        self._responses = LRUCache(max_entries)
+
+    def __len__(self):
+        return len(self._responses)
+
+    def get(self, url):
+        return self._responses.get(url)
+
+    def store(self, url, response):
+        """Caches a response if it can be revalidated later, otherwise drops
+        any stale copy of url.
+        """
+        if self.validators(response):
+            self._responses.put(url, response)
+        else:
+            self._responses.pop(url)
+
+    def invalidate(self, url=None):
+        if url is None:
+            self._responses.clear()
+        else:
+            self._responses.pop(url)
+
+    def invalidate_collection(self, url):
+        """Drops the cached responses for the collection at url: its listing
+        (and pages of it) and its members.
+        """
+        for cached_url in self._responses.keys():
+            if cached_url == url or cached_url.startswith(url + "/") or \
+                    cached_url.startswith(url + "?"):
+                self._responses.pop(cached_url)
+
+    def validators(self, response):
+        return conditional_headers(response.headers.get("ETag"),
+                                   response.headers.get("Last-Modified"))
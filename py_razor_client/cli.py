@@ -1,7 +1,32 @@
 # -*- coding: utf-8 -*-
+"""The guts of the py-razor-client command line tool.
+
+The tool is often run thousands of times an hour from scripts, so this module
+keeps its startup cheap: requests (via RazorClient) and yaml are only
+imported once they're actually needed, argv is normally parsed only once, and
+clients discover their methods on demand from the on-disk discovery cache.
+When a py-razor-client agent is running (see py_razor_client.agent), the
+collection or command is forwarded to it and no client is created here at all.
+With --batch, many commands are read from a file or stdin and run against one
+client (see py_razor_client.batch). With --format, results are written as
+JSON, newline-delimited JSON or a table as they're produced (see
+py_razor_client.output); collection listings run in-process are streamed.
+
+A config file can list several Razor servers under servers (as hostname:port
+strings) instead of giving a hostname and port; commands then run against a
+py_razor_client.pool.RazorClientPool over all of them.
+"""
+from argparse import ArgumentParser
+import json
 import os.path
+import sys
 from urlparse import urlparse
-import yaml
+
+from py_razor_client import agent
+from py_razor_client import output
+from py_razor_client.cache import DEFAULT_CACHE_DIR
+from py_razor_client.cache import DiscoveryCache
+from py_razor_client.version import VERSION
 
 
 RC_LOCATIONS = (os.path.expanduser("~/.py_razor_clientrc"),
@@ -16,24 +41,55 @@ class InsufficientHostException(Exception):
     pass
 
 
-def dynamicize_argparser(parser, args):
-    """Given an ArgumentParser, tries to coerce the ArgumentParser to have
-    options for each unknown --longopt it encounters.
+class UnknownCommandException(Exception):
+    pass
+
+
+def create_parser():
+    parser = ArgumentParser(version=VERSION)
+    parser.add_argument("-c", "--config")
+    parser.add_argument("--hostname")
+    parser.add_argument("--port")
+    parser.add_argument("--url")
+    parser.add_argument("--no-discovery-cache", action="store_true")
+    parser.add_argument("--timings", action="store_true",
+                        help="Print a breakdown of time spent talking to Razor")
+    parser.add_argument("--no-agent", action="store_true",
+                        help="Don't forward to a running py-razor-client-agent")
+    parser.add_argument("--batch", metavar="FILE",
+                        help="Run one command per line from FILE ('-' for "
+                             "stdin), printing a JSON record for each")
+    parser.add_argument("-j", "--jobs", type=int, default=1,
+                        help="How many --batch commands to run at a time")
+    parser.add_argument("--format", choices=output.FORMATS,
+                        help="Write the result as JSON, newline-delimited "
+                             "JSON or a table, member by member")
+    parser.add_argument("collection_or_command", nargs="?")
+    parser.add_argument("collection_item", nargs="?")
+    parser.add_argument("additional_args", nargs="*")
+    return parser
+
+
+def parse_args(parser, argv):
+    """Parses argv, adding options to the parser for any unknown --longopts.
+
+    This lets the tool be used in the same manner as the pure-ruby optparse
+    that powers razor-client.
 
-    This exists to provide a compatibility shim to allow this tool to be used
-    in the same manner as the pure-ruby optparse that powers razor-client.
+    Returns the parsed arguments and the dests of the added options. argv is
+    only parsed a second time if it actually contains unknown options.
     """
-    _, unknown_args = parser.parse_known_args(args)
+    args, unknown_args = parser.parse_known_args(argv)
     unknown_longopts = filter_for_longopts(unknown_args)
+    if not unknown_longopts:
+        if unknown_args:
+            parser.error("unrecognized arguments: %s" % " ".join(unknown_args))
+        return args, []
 
     added_args = []
-
     for opt in unknown_longopts:
-        add_result = parser.add_argument(opt)
-        dest = add_result.dest
-        added_args.append(dest)
-
-    return (parser, added_args)
+        added_args.append(parser.add_argument(opt).dest)
+    return parser.parse_args(argv), added_args
 
 
 def filter_for_longopts(arglist):
@@ -59,11 +115,29 @@ def load_config(config_file=None):
 
     if config_file:
         with open(config_file) as f:
-            return yaml.load(f.read())
+            return parse_config(f.read())
     else:
         return {}
 
 
+def parse_config(contents):
+    """Parses the contents of a config file.
+
+    Config files are YAML, but since YAML is a superset of JSON, configs
+    written as JSON objects are parsed with the much cheaper json module
+    (without importing yaml at all).
+    """
+    if contents.lstrip().startswith("{"):
+        try:
+            return json.loads(contents)
+        except ValueError:
+            pass
+
+    import yaml
+    loader = getattr(yaml, "CSafeLoader", yaml.SafeLoader)
+    return yaml.load(contents, Loader=loader)
+
+
 def make_config(args):
     config = vars(args)
     config.update(load_config(args.config))
@@ -75,7 +149,220 @@ def make_config(args):
         config.update(hostname=hostname, port=port)
         del config['url']
 
-    if not (config['hostname'] and config['port']):
+    if not (config['hostname'] and config['port']) and \
+            not config.get('servers'):
         raise InsufficientHostException()
 
     return config
+
+
+def make_discovery_cache(config):
+    """Builds the DiscoveryCache described by a config, or returns None if
+    discovery caching has been turned off.
+
+    The cache location and TTL can be set with the discovery_cache_dir and
+    discovery_cache_ttl config keys.
+    """
+    if config.get('no_discovery_cache'):
+        return None
+
+    cache_dir = config.get('discovery_cache_dir') or DEFAULT_CACHE_DIR
+    ttl = config.get('discovery_cache_ttl')
+    if ttl is None:
+        ttl = DiscoveryCache.DEFAULT_TTL
+    return DiscoveryCache(os.path.expanduser(cache_dir), int(ttl))
+
+
+def uses_pool(config):
+    """Whether config describes several servers rather than one."""
+    return bool(config.get('servers')) and not config.get('hostname')
+
+
+def make_client(config, collect_stats=False, pool_size=None):
+    """Creates the RazorClient described by config, or a RazorClientPool if
+    it lists servers (and no hostname).
+
+    The client discovers its methods on demand, so with a fresh discovery
+    cache, running a collection or command makes no request to /api. The
+    json_codec config key picks the JSON library it uses (see
+    py_razor_client.codec).
+    """
+    options = {}
+    if pool_size is not None:
+        options['pool_size'] = pool_size
+    options.update(discovery_cache=make_discovery_cache(config),
+                   collect_stats=collect_stats,
+                   codec=config.get('json_codec'))
+
+    if uses_pool(config):
+        from py_razor_client.pool import RazorClientPool
+        return RazorClientPool(config['servers'], **options)
+
+    # Imported here because it pulls in requests, which is comparatively
+    # slow to import and isn't needed to, say, print --help.
+    from py_razor_client.razor_client import RazorClient
+    return RazorClient(config['hostname'], config['port'],
+                       discover_on_demand=True, **options)
+
+
+def command_arguments(args, added_args):
+    """Returns the positional and keyword arguments to call a collection or
+    command with, given the parsed command line.
+    """
+    positional = []
+    if args.collection_item:
+        positional.append(args.collection_item)
+    if args.additional_args:
+        positional.extend(args.additional_args)
+
+    keywords = {}
+    for dest in added_args:
+        value = getattr(args, dest)
+        if value is not None:
+            keywords[dest] = value
+    return positional, keywords
+
+
+def dispatch(client, name, positional, keywords):
+    """Calls the named collection or command on a client."""
+    sanitary_name = client.sanitize_command_name(name)
+    try:
+        collection_or_command = getattr(client, sanitary_name)
+    except AttributeError:
+        raise UnknownCommandException(name)
+    return collection_or_command(*positional, **keywords)
+
+
+def is_collection(client, name):
+    return client.sanitize_command_name(name) in client.collections
+
+
+def run_in_process(client, name, positional, keywords, stream=False):
+    """Runs a collection or command on client, streaming it if it's a
+    collection and stream is set.
+
+    A client whose methods came from the discovery cache rediscovers once
+    before giving up on a name it doesn't know, in case the name was added
+    to the server since the API document was cached.
+    """
+    def run():
+        if stream and is_collection(client, name):
+            # Formatted output is written member by member, so there's no
+            # need to hold the whole listing in memory first
+            return dispatch(client, name, positional, {"stream": True})
+        return dispatch(client, name, positional, keywords)
+
+    try:
+        return run()
+    except UnknownCommandException:
+        if getattr(client, "discovery_cache", None) is None:
+            raise
+    client.discover_methods(refresh=True)
+    return run()
+
+
+def run_with_agent(config, name, positional, keywords):
+    """Runs a collection or command through the agent.
+
+    Raises agent.AgentUnavailableException if no agent is running.
+    """
+    socket_path = os.path.expanduser(config.get('agent_socket') or
+                                     agent.DEFAULT_SOCKET_PATH)
+    request = agent.make_request(config['hostname'], config['port'], name,
+                                 positional, keywords)
+    timeout = config.get('agent_timeout') or agent.DEFAULT_TIMEOUT
+    return agent.forward(request, socket_path, timeout=float(timeout))
+
+
+def run_batch(config, args):
+    """Runs the commands in the --batch file, writing a JSON record for each
+    to stdout. Returns the exit status.
+    """
+    from py_razor_client import batch
+
+    jobs = max(args.jobs, 1)
+    client = make_client(config, collect_stats=args.timings, pool_size=jobs)
+    if args.batch == "-":
+        stream = sys.stdin
+    else:
+        stream = open(args.batch)
+
+    prompt = None
+    if stream.isatty():
+        def prompt():
+            sys.stderr.write(batch.PROMPT)
+            sys.stderr.flush()
+
+    try:
+        records = batch.run_batch(client, batch.read_lines(stream, prompt),
+                                  jobs)
+        status = batch.write_records(records, sys.stdout, client.codec)
+    finally:
+        if stream is not sys.stdin:
+            stream.close()
+
+    if args.timings:
+        sys.stderr.write(client.stats.format_table() + "\n")
+    return status
+
+
+def main(argv=None):
+    if argv is None:
+        argv = sys.argv[1:]
+
+    parser = create_parser()
+    args, added_args = parse_args(parser, argv)
+
+    if args.url and (args.hostname or args.port):
+        parser.error("Options --hostname and --port are mutuall exclusive with --url")
+    if args.batch and args.collection_or_command:
+        parser.error("--batch can't be combined with a collection or command")
+    if not (args.batch or args.collection_or_command):
+        parser.error("too few arguments")
+
+    config = make_config(args)
+    if args.batch:
+        return run_batch(config, args)
+
+    positional, keywords = command_arguments(args, added_args)
+    unknown_command_message = ("No such collection or command: %s" %
+                               args.collection_or_command)
+
+    # Timings are collected by the client doing the work, and formatted
+    # listings are streamed from it member by member, so both need the
+    # command to run in-process. The agent only serves single servers.
+    streamed = bool(args.format) and not (positional or keywords)
+    forwarded = False
+    if not (args.no_agent or args.timings or streamed or uses_pool(config)):
+        try:
+            result = run_with_agent(config, args.collection_or_command,
+                                    positional, keywords)
+            forwarded = True
+        except agent.AgentUnavailableException:
+            pass
+        except agent.AgentError as e:
+            if e.error_type == UnknownCommandException.__name__:
+                parser.error(unknown_command_message)
+            parser.exit(1, "%s: error: %s\n" % (parser.prog, e))
+
+    if not forwarded:
+        client = make_client(config, collect_stats=args.timings)
+        try:
+            result = run_in_process(client, args.collection_or_command,
+                                    positional, keywords, streamed)
+        except UnknownCommandException:
+            parser.error(unknown_command_message)
+
+    if args.format:
+        if forwarded:
+            from py_razor_client.codec import get_codec
+            codec = get_codec(config.get('json_codec'))
+        else:
+            codec = client.codec
+        output.write_result(result, sys.stdout, args.format, codec)
+    else:
+        sys.stdout.write("%s\n" % (result,))
+
+    if args.timings:
+        sys.stderr.write(client.stats.format_table() + "\n")
+    return 0
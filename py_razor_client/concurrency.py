@@ -0,0 +1,228 @@
+# -*- coding: utf-8 -*-
+"""Small thread-based concurrency primitives used by the clients.
+
+These mirror the parts of concurrent.futures that the rest of the package
+needs (a Future and a bounded pool of worker threads), without pulling in a
+backport for the Python 2 interpreters we support. map_outcomes runs a
+function over many items at once without one failure failing the rest, and
+SingleFlight coalesces concurrent identical calls into one.
+"""
+import Queue
+import sys
+import threading
+
+
+class Future(object):
+    """The eventual result of a call submitted to a WorkerPool."""
+
+    def __init__(self):
+        self._condition = threading.Condition()
+        self._done = False
+        self._result = None
+        self._exception = None
+        self._callbacks = []
+
+    def done(self):
+        return self._done
+
+    def result(self, timeout=None):
+        """Waits for the call to finish and returns its result, re-raising
+        any exception it raised.
+        """
+        self._wait(timeout)
+        if self._exception is not None:
+            raise self._exception
+        return self._result
+
+    def exception(self, timeout=None):
+        self._wait(timeout)
+        return self._exception
+
+    def add_done_callback(self, fn):
+        """Calls fn(future) once the future is done (immediately if it
+        already is).
+        """
+        with self._condition:
+            if not self._done:
+                self._callbacks.append(fn)
+                return
+        fn(self)
+
+    def set_result(self, result):
+        self._finish(result, None)
+
+    def set_exception(self, exception):
+        self._finish(None, exception)
+
+    def _finish(self, result, exception):
+        with self._condition:
+            self._result = result
+            self._exception = exception
+            self._done = True
+            callbacks, self._callbacks = self._callbacks, []
+            self._condition.notify_all()
+        for callback in callbacks:
+            callback(self)
+
+    def _wait(self, timeout):
+        with self._condition:
+            if not self._done:
+                self._condition.wait(timeout)
+            if not self._done:
+                raise TimeoutError()
+
+
+class TimeoutError(Exception):
+    pass
+
+
+class WorkerPool(object):
+    """A bounded pool of daemon threads that runs submitted calls.
+
+    Threads are started lazily, up to max_workers. Calls submitted from inside
+    a worker wait behind everything already queued, so don't block a worker
+    on the result of a call submitted to the same pool.
+    """
+
+    def __init__(self, max_workers):
+        if max_workers < 1:
+            raise ValueError("max_workers must be at least 1")
+        self.max_workers = max_workers
+        self._queue = Queue.Queue()
+        self._threads = []
+        self._lock = threading.Lock()
+        self._shutdown = False
+
+    def submit(self, fn, *args, **kwargs):
+        future = Future()
+        with self._lock:
+            if self._shutdown:
+                raise RuntimeError("cannot submit to a pool after shutdown")
+            self._queue.put((future, fn, args, kwargs))
+            if len(self._threads) < self.max_workers:
+                self._start_worker()
+        return future
+
+    def map(self, fn, iterable):
+        """Calls fn on every item concurrently and returns the futures in the
+        same order as the items.
+        """
+        return [self.submit(fn, item) for item in iterable]
+
+    def shutdown(self, wait=True):
+        with self._lock:
+            self._shutdown = True
+            threads = list(self._threads)
+            for _ in threads:
+                self._queue.put(None)
+        if wait:
+            for thread in threads:
+                thread.join()
+
+    def _start_worker(self):
+        thread = threading.Thread(target=self._work)
+        thread.daemon = True
+        thread.start()
+        self._threads.append(thread)
+
+    def _work(self):
+        while True:
+            work_item = self._queue.get()
+            if work_item is None:
+                return
+
+            future, fn, args, kwargs = work_item
+            try:
+                result = fn(*args, **kwargs)
+            except BaseException:
+                future.set_exception(sys.exc_info()[1])
+            else:
+                future.set_result(result)
+
+
+def gather(futures, timeout=None):
+    """Waits for every future and returns their results in order.
+
+    The first exception raised by any of the calls is re-raised.
+    """
+    return [future.result(timeout) for future in futures]
+
+
+def outcome(future):
+    """Returns (result, None) for a future whose call succeeded, or (None,
+    exception) for one whose call raised, waiting for it if need be.
+    """
+    exception = future.exception()
+    if exception is None:
+        return future.result(), None
+    return None, exception
+
+
+def map_outcomes(fn, items, max_workers):
+    """Calls fn on each item, at most max_workers at a time, and returns an
+    outcome (a (result, exception) pair) for each, in order.
+    """
+    items = list(items)
+    if not items:
+        return []
+    worker_pool = WorkerPool(min(max_workers, len(items)))
+    try:
+        outcomes = [outcome(future)
+                    for future in worker_pool.map(fn, items)]
+    except BaseException:
+        # Interrupted while waiting; don't wait for the calls as well
+        worker_pool.shutdown(wait=False)
+        raise
+    # Every call has finished, so this doesn't wait for long, and leaves no
+    # idle worker to be torn down mid-exit in short-lived processes like the
+    # command line tool
+    worker_pool.shutdown()
+    return outcomes
+
+
+class SingleFlight(object):
+    """Coalesces concurrent calls that have the same key.
+
+    While a call for a key is in flight, further calls for it wait for that
+    call and share its result (or exception) rather than making their own.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._flights = {}
+
+    def do(self, key, fn, timeout=None):
+        """Returns fn(), or the result of the call for key already in flight.
+
+        Callers that join a flight wait at most timeout seconds for it, then
+        raise TimeoutError; the call that started it isn't affected.
+        """
+        with self._lock:
+            future = self._flights.get(key)
+            leading = future is None
+            if leading:
+                future = Future()
+                self._flights[key] = future
+
+        if not leading:
+            return future.result(timeout)
+
+        try:
+            result = fn()
+        except BaseException:
+            future.set_exception(sys.exc_info()[1])
+            raise
+        else:
+            future.set_result(result)
+            return result
+        finally:
+            with self._lock:
+                if self._flights.get(key) is future:
+                    del self._flights[key]
+
+    def forget(self):
+        """Makes calls from now on start new flights rather than joining
+        ones already in flight (whose callers still get their results).
+        """
+        with self._lock:
+            self._flights = {}
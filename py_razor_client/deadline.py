@@ -0,0 +1,95 @@
+# -*- coding: utf-8 -*-
+"""Deadlines that bound how long a whole operation against Razor may take.
+
+A deadline applies to every request the current thread makes while it's in
+effect, including discovery and the requests fanned out to worker threads by
+things like expand=True or execute_bulk:
+
+    with deadline(2.5):
+        client = RazorClient("example.com", 8080)
+        nodes = client.nodes(expand=True)
+
+Each request is given the time remaining as its timeout, and once the
+deadline has passed no further requests are started; DeadlineExceeded is
+raised instead. Nested deadlines can only tighten the enclosing one.
+"""
+from contextlib import contextmanager
+import threading
+import time
+
+
+_local = threading.local()
+
+
+class DeadlineExceeded(Exception):
+    pass
+
+
+class Deadline(object):
+
+    def __init__(self, seconds):
+        self.expires_at = time.time() + seconds
+
+    def remaining(self):
+        return max(self.expires_at - time.time(), 0.0)
+
+    def expired(self):
+        return time.time() >= self.expires_at
+
+    def check(self):
+        if self.expired():
+            raise DeadlineExceeded()
+
+
+def current_deadline():
+    """Returns the Deadline in effect for this thread, if there is one."""
+    return getattr(_local, 'deadline', None)
+
+
+@contextmanager
+def deadline(seconds):
+    previous = current_deadline()
+    new = Deadline(seconds)
+    if previous is not None and previous.expires_at < new.expires_at:
+        new = previous
+
+    _local.deadline = new
+    try:
+        yield new
+    finally:
+        _local.deadline = previous
+
+
+def propagate(fn):
+    """Wraps fn so that, when it's called on another thread, the deadline in
+    effect here (if any) is in effect there too.
+    """
+    captured = current_deadline()
+    if captured is None:
+        return fn
+
+    def with_deadline(*args, **kwargs):
+        previous = current_deadline()
+        _local.deadline = captured
+        try:
+            return fn(*args, **kwargs)
+        finally:
+            _local.deadline = previous
+    return with_deadline
+
+
+def timeout_within_deadline(timeout=None):
+    """Returns the timeout to give a request being started now: the smaller
+    of timeout and the time left before the current deadline.
+
+    Raises DeadlineExceeded if the deadline has already passed.
+    """
+    current = current_deadline()
+    if current is None:
+        return timeout
+
+    current.check()
+    remaining = current.remaining()
+    if timeout is None:
+        return remaining
+    return min(timeout, remaining)
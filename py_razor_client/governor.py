@@ -0,0 +1,152 @@
+# -*- coding: utf-8 -*-
+"""Adaptive limits on how many requests a client has in flight at once.
+
+Fixed worker counts either overload a Razor server or leave throughput on the
+table, depending on what else is hitting it. A ConcurrencyGovernor instead
+finds the limit as it goes, AIMD-style (like TCP congestion control):
+
+  - while requests are answered about as fast as the quickest recent ones,
+    and at least half the limit is in use, it grows by up to one request per
+    round trip
+  - when latency climbs well above that baseline, or a request fails in a
+    way that points at an overloaded server (a connection error, timeout, or
+    429/502/503/504), it's halved, at most once per round trip
+
+Reads and commands are limited separately, since commands are much slower
+and a burst of them shouldn't starve reads (or the other way around):
+
+    governor = ConcurrencyGovernor()
+    client = RazorClient("example.com", 8080, governor=governor)
+
+Every thread using the client shares its governor, and one governor can be
+given to several clients so that they share a budget. Callers over the limit
+wait for a slot (or until the current deadline passes).
+"""
+import threading
+import time
+
+from py_razor_client.deadline import current_deadline
+from py_razor_client.deadline import DeadlineExceeded
+
+
+READ = "read"
+COMMAND = "command"
+
+# Statuses that mean the server (or something in front of it) is overloaded
+OVERLOAD_STATUSES = frozenset([429, 502, 503, 504])
+
+
+class AdaptiveLimiter(object):
+    """An AIMD concurrency limit for one kind of request."""
+
+    def __init__(self, initial=4, minimum=1, maximum=64, backoff=0.5,
+                 tolerance=2.0, slack=0.01):
+        """Latencies above tolerance times the baseline latency, plus slack
+        seconds (so that jitter on very fast requests isn't mistaken for
+        congestion), count as congestion. On congestion the limit is
+        multiplied by backoff.
+        """
+        self.minimum = minimum
+        self.maximum = maximum
+        self.backoff = backoff
+        self.tolerance = tolerance
+        self.slack = slack
+        self._limit = float(min(max(initial, minimum), maximum))
+        self._in_flight = 0
+        # A slowly rising minimum of recent latencies
+        self._baseline = None
+        self._last_decrease = 0
+        self._condition = threading.Condition()
+
+    @property
+    def limit(self):
+        return int(self._limit)
+
+    @property
+    def in_flight(self):
+        return self._in_flight
+
+    def acquire(self):
+        """Waits for a slot, returning a token to pass to release.
+
+        Raises DeadlineExceeded if the current deadline passes first.
+        """
+        deadline = current_deadline()
+        with self._condition:
+            while self._in_flight >= int(self._limit):
+                if deadline is None:
+                    self._condition.wait()
+                    continue
+                if deadline.expired():
+                    raise DeadlineExceeded()
+                self._condition.wait(deadline.remaining())
+            self._in_flight += 1
+        return time.time()
+
+    def release(self, token, overloaded=False):
+        """Gives back a slot, adjusting the limit by how the request went."""
+        started = token
+        now = time.time()
+        with self._condition:
+            # Growing a limit that isn't being approached would only let a
+            # later burst overshoot
+            busy = self._in_flight * 2 >= self._limit
+            self._in_flight -= 1
+            self._adjust(started, now, now - started, busy, overloaded)
+            self._condition.notify()
+
+    def _adjust(self, started, now, latency, busy, overloaded):
+        if not overloaded:
+            if self._baseline is None or latency < self._baseline:
+                self._baseline = latency
+            else:
+                # Let the baseline creep up, so that a server that's got
+                # slower for good isn't treated as congested forever
+                self._baseline += (latency - self._baseline) * 0.01
+            overloaded = latency > (self._baseline * self.tolerance +
+                                    self.slack)
+
+        if overloaded:
+            # Requests started before the last decrease were sent under the
+            # old limit, so they don't say anything about the new one
+            if started >= self._last_decrease:
+                self._limit = max(self._limit * self.backoff, self.minimum)
+                self._last_decrease = now
+        elif busy:
+            # Up to one more request per round trip's worth of completions
+            self._limit = min(self._limit + 1.0 / self._limit, self.maximum)
+            # A higher limit may let waiters in
+            self._condition.notify_all()
+
+
+class ConcurrencyGovernor(object):
+    """Separate AdaptiveLimiters for reads and commands."""
+
+    def __init__(self, reads=None, commands=None):
+        self.reads = reads or AdaptiveLimiter()
+        self.commands = commands or AdaptiveLimiter(initial=2, maximum=16)
+
+    def limiter(self, kind):
+        if kind == READ:
+            return self.reads
+        if kind == COMMAND:
+            return self.commands
+        raise ValueError("Unknown kind of request: %s" % kind)
+
+    def governed(self, kind, send):
+        """Wraps send (which returns a response) so that each call holds a
+        slot from the limiter for kind.
+        """
+        limiter = self.limiter(kind)
+
+        def governed_send(*args, **kwargs):
+            token = limiter.acquire()
+            try:
+                response = send(*args, **kwargs)
+            except Exception:
+                limiter.release(token, overloaded=True)
+                raise
+            status = getattr(response, "status_code", None)
+            limiter.release(token, overloaded=status in OVERLOAD_STATUSES)
+            return response
+        return governed_send
@@ -0,0 +1,102 @@
+# -*- coding: utf-8 -*-
+"""Hedged requests, to keep one slow Razor worker from stalling a read.
+
+A hedged call starts a request and, if it hasn't answered within a delay,
+starts a second identical one and uses whichever answers first. The delay is
+usually taken from a high percentile of recently observed latencies, so only
+the slowest few percent of requests are ever duplicated.
+"""
+from collections import deque
+import Queue
+import sys
+import threading
+import time
+
+from py_razor_client.deadline import DeadlineExceeded
+
+
+class LatencyTracker(object):
+    """Keeps a sliding window of recent latencies, in seconds."""
+
+    DEFAULT_WINDOW = 200
+
+    def __init__(self, window=DEFAULT_WINDOW):
+        self._samples = deque(maxlen=window)
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._samples)
+
+    def record(self, latency):
+        with self._lock:
+            self._samples.append(latency)
+
+    def percentile(self, percent):
+        """Returns the given percentile of the window, or None if it's
+        empty.
+        """
+        with self._lock:
+            samples = sorted(self._samples)
+        if not samples:
+            return None
+        rank = int(round(percent / 100.0 * (len(samples) - 1)))
+        return samples[min(max(rank, 0), len(samples) - 1)]
+
+
+def hedged_call(fn, delay, deadline=None):
+    """Calls fn on a background thread, and again on a second thread if the
+    first call hasn't finished after delay seconds. Returns the first result.
+
+    An exception is only raised once every attempt has failed. If a deadline
+    is given, waiting stops when it passes and DeadlineExceeded is raised;
+    attempts still in flight are abandoned.
+    """
+    results = Queue.Queue()
+
+    def attempt():
+        try:
+            results.put((True, fn()))
+        except BaseException:
+            results.put((False, sys.exc_info()[1]))
+
+    def launch():
+        thread = threading.Thread(target=attempt)
+        thread.daemon = True
+        thread.start()
+
+    launch()
+    launched = 1
+    failed = 0
+    while True:
+        wait = delay if launched == 1 else None
+        if deadline is not None:
+            remaining = deadline.remaining()
+            wait = remaining if wait is None else min(wait, remaining)
+
+        try:
+            if wait is None:
+                succeeded, value = results.get()
+            else:
+                succeeded, value = results.get(True, max(wait, 0))
+        except Queue.Empty:
+            if deadline is not None and deadline.expired():
+                raise DeadlineExceeded()
+            launch()
+            launched += 1
+            continue
+
+        if succeeded:
+            return value
+        failed += 1
+        if failed == launched:
+            raise value
+
+
+def timed(fn, tracker):
+    """Wraps fn so that the latency of each successful call is recorded."""
+    def timed_fn(*args, **kwargs):
+        start = time.time()
+        result = fn(*args, **kwargs)
+        tracker.record(time.time() - start)
+        return result
+    return timed_fn
@@ -0,0 +1,306 @@
+# -*- coding: utf-8 -*-
+"""A local, indexed copy of a Razor server's collections.
+
+Answering "which nodes have tag X and no policy" from the API means listing
+every node and then fetching each one. An Inventory keeps the full document
+of every member in SQLite instead, with indexes over node tags, policies and
+facts, so questions like that are answered locally in milliseconds:
+
+    inventory = Inventory(client, "/var/cache/razor-inventory.sqlite")
+    inventory.sync()
+    inventory.find_nodes(tags=["X"], policy=None)
+
+Syncing is incremental. Collection listings and members are fetched with the
+ETag/Last-Modified validators stored from last time, so unchanged ones cost a
+304 with no body; only new and changed members are transferred and decoded,
+and members that have disappeared from their collection are dropped. Members
+are revalidated concurrently over the client's connection pool. Members that
+couldn't be fetched are tried again on the next sync.
+
+An Inventory (like the SQLite connection behind it) must only be used from
+the thread that created it.
+"""
+import json
+import sqlite3
+import time
+
+from py_razor_client.razor_client import collection_members
+
+
+SCHEMA_VERSION = 1
+
+SCHEMA = """
+CREATE TABLE collections (
+    collection TEXT PRIMARY KEY,
+    etag TEXT,
+    last_modified TEXT,
+    synced_at REAL
+);
+CREATE TABLE members (
+    collection TEXT NOT NULL,
+    name TEXT NOT NULL,
+    url TEXT NOT NULL,
+    etag TEXT,
+    last_modified TEXT,
+    checked_at REAL,
+    document TEXT NOT NULL,
+    PRIMARY KEY (collection, name)
+);
+CREATE TABLE node_tags (
+    node TEXT NOT NULL,
+    tag TEXT NOT NULL
+);
+CREATE INDEX node_tags_by_tag ON node_tags (tag);
+CREATE INDEX node_tags_by_node ON node_tags (node);
+CREATE TABLE node_policies (
+    node TEXT PRIMARY KEY,
+    policy TEXT
+);
+CREATE INDEX node_policies_by_policy ON node_policies (policy);
+CREATE TABLE node_facts (
+    node TEXT NOT NULL,
+    fact TEXT NOT NULL,
+    value TEXT
+);
+CREATE INDEX node_facts_by_fact ON node_facts (fact, value);
+CREATE INDEX node_facts_by_node ON node_facts (node);
+"""
+
+TABLES = ("collections", "members", "node_tags", "node_policies",
+          "node_facts")
+NODE_TABLES = ("node_tags", "node_policies", "node_facts")
+
+# Passed as find_nodes' policy to mean "whatever the policy", since None
+# means "no policy"
+ANY = object()
+
+
+def fact_value(value):
+    """Normalizes a fact value for storage and lookup."""
+    if value is None or isinstance(value, basestring):
+        return value
+    return json.dumps(value, sort_keys=True)
+
+
+class SyncResult(object):
+    """What a sync changed in the inventory."""
+
+    def __init__(self):
+        self.added = []
+        self.changed = []
+        self.removed = []
+        self.unchanged = 0
+        # (collection, name, exception) for members that couldn't be fetched;
+        # whatever the inventory already had for them is kept
+        self.errors = []
+
+    def __repr__(self):
+        return ("SyncResult(added=%d, changed=%d, removed=%d, unchanged=%d, "
+                "errors=%d)" % (len(self.added), len(self.changed),
+                                len(self.removed), self.unchanged,
+                                len(self.errors)))
+
+
+class Inventory(object):
+
+    DEFAULT_COLLECTIONS = ("nodes", "tags", "policies")
+
+    def __init__(self, client, path=":memory:"):
+        self.client = client
+        self.path = path
+        self._db = sqlite3.connect(path)
+        self._create_schema()
+
+    def close(self):
+        self._db.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def sync(self, collections=DEFAULT_COLLECTIONS, max_age=0,
+             max_workers=None):
+        """Brings the inventory up to date with the server.
+
+        Members checked less than max_age seconds ago aren't revalidated
+        (unless they've just appeared in their collection). At most
+        max_workers requests (by default, the client's pool size) are in
+        flight at once. Returns a SyncResult.
+        """
+        result = SyncResult()
+        for collection in collections:
+            self._sync_collection(collection, max_age, max_workers, result)
+        return result
+
+    def names(self, collection):
+        """Returns the sorted names of a collection's members."""
+        rows = self._db.execute(
+            "SELECT name FROM members WHERE collection = ? ORDER BY name",
+            (collection,))
+        return [name for name, in rows]
+
+    def get(self, collection, name):
+        """Returns the stored document of a member, or None."""
+        row = self._db.execute(
+            "SELECT document FROM members WHERE collection = ? AND name = ?",
+            (collection, name)).fetchone()
+        if row is None:
+            return None
+        return json.loads(row[0])
+
+    def find_nodes(self, tags=(), policy=ANY, facts=None):
+        """Returns the sorted names of nodes matching every criterion given.
+
+        Nodes must have every tag in tags and, if a policy is given, be bound
+        to it (or, with policy=None, to no policy at all). facts maps fact
+        names to the value they must have, or to ANY to require only that the
+        fact is present.
+        """
+        query = ["SELECT name FROM members WHERE collection = 'nodes'"]
+        params = []
+        for tag in tags:
+            query.append("AND name IN "
+                         "(SELECT node FROM node_tags WHERE tag = ?)")
+            params.append(tag)
+        if policy is None:
+            query.append("AND name IN (SELECT node FROM node_policies "
+                         "WHERE policy IS NULL)")
+        elif policy is not ANY:
+            query.append("AND name IN "
+                         "(SELECT node FROM node_policies WHERE policy = ?)")
+            params.append(policy)
+        for fact, value in sorted((facts or {}).items()):
+            if value is ANY:
+                query.append("AND name IN "
+                             "(SELECT node FROM node_facts WHERE fact = ?)")
+                params.append(fact)
+            else:
+                query.append("AND name IN (SELECT node FROM node_facts "
+                             "WHERE fact = ? AND value = ?)")
+                params.extend((fact, fact_value(value)))
+        query.append("ORDER BY name")
+
+        rows = self._db.execute(" ".join(query), params)
+        return [name for name, in rows]
+
+    def _create_schema(self):
+        version, = self._db.execute("PRAGMA user_version").fetchone()
+        if version == SCHEMA_VERSION:
+            return
+        # Anything else is a cache from another version; start over
+        with self._db:
+            for table in TABLES:
+                self._db.execute("DROP TABLE IF EXISTS %s" % table)
+            self._db.executescript(SCHEMA)
+            self._db.execute("PRAGMA user_version = %d" % SCHEMA_VERSION)
+
+    def _sync_collection(self, collection, max_age, max_workers, result):
+        url = self.client.collection_url(collection)
+        known = {}
+        for name, member_url, etag, last_modified, checked_at in \
+                self._db.execute("SELECT name, url, etag, last_modified, "
+                                 "checked_at FROM members "
+                                 "WHERE collection = ?", (collection,)):
+            known[name] = (member_url, etag, last_modified, checked_at)
+
+        row = self._db.execute(
+            "SELECT etag, last_modified FROM collections WHERE collection = ?",
+            (collection,)).fetchone()
+        etag, last_modified = row or (None, None)
+        listing = self.client.get_if_modified(url, etag, last_modified)
+
+        if listing is None:
+            members = dict((name, values[0])
+                           for name, values in known.items())
+        else:
+            document, etag, last_modified = listing
+            members = dict((stub['name'], stub['id']) for stub in
+                           collection_members(document))
+
+        now = time.time()
+        to_fetch = []
+        for name, member_url in sorted(members.items()):
+            if name in known:
+                _, member_etag, member_last_modified, checked_at = known[name]
+                if checked_at is not None and now - checked_at < max_age:
+                    result.unchanged += 1
+                    continue
+                to_fetch.append((name, member_url, member_etag,
+                                 member_last_modified))
+            else:
+                to_fetch.append((name, member_url, None, None))
+
+        fetched = self.client.get_many_if_modified(
+            [(member_url, member_etag, member_last_modified) for
+             _, member_url, member_etag, member_last_modified in to_fetch],
+            max_workers)
+
+        removed = sorted(set(known) - set(members))
+        errors_before = len(result.errors)
+        with self._db:
+            for name in removed:
+                self._delete_member(collection, name)
+                result.removed.append((collection, name))
+
+            checked = []
+            for (name, member_url, _, _), (response, exception) in \
+                    zip(to_fetch, fetched):
+                if exception is not None:
+                    result.errors.append((collection, name, exception))
+                elif response is None:
+                    checked.append((now, collection, name))
+                    result.unchanged += 1
+                else:
+                    document, member_etag, member_last_modified = response
+                    self._store_member(collection, name, member_url, document,
+                                       member_etag, member_last_modified, now)
+                    if name in known:
+                        result.changed.append((collection, name))
+                    else:
+                        result.added.append((collection, name))
+            self._db.executemany(
+                "UPDATE members SET checked_at = ? "
+                "WHERE collection = ? AND name = ?", checked)
+
+            if listing is not None:
+                if len(result.errors) > errors_before:
+                    # A 304 next time would mean only stored members are
+                    # checked, so new ones that failed would never be retried
+                    etag = last_modified = None
+                self._db.execute(
+                    "INSERT OR REPLACE INTO collections VALUES (?, ?, ?, ?)",
+                    (collection, etag, last_modified, now))
+
+    def _store_member(self, collection, name, url, document, etag,
+                      last_modified, checked_at):
+        self._db.execute(
+            "INSERT OR REPLACE INTO members VALUES (?, ?, ?, ?, ?, ?, ?)",
+            (collection, name, url, etag, last_modified, checked_at,
+             json.dumps(document)))
+        if collection != "nodes":
+            return
+
+        self._delete_node_index(name)
+        tags = [tag['name'] for tag in document.get('tags') or []]
+        self._db.executemany("INSERT INTO node_tags VALUES (?, ?)",
+                             [(name, tag) for tag in tags])
+        policy = document.get('policy')
+        self._db.execute("INSERT INTO node_policies VALUES (?, ?)",
+                         (name, policy['name'] if policy else None))
+        facts = document.get('facts') or {}
+        self._db.executemany("INSERT INTO node_facts VALUES (?, ?, ?)",
+                             [(name, fact, fact_value(value))
+                              for fact, value in facts.items()])
+
+    def _delete_member(self, collection, name):
+        self._db.execute(
+            "DELETE FROM members WHERE collection = ? AND name = ?",
+            (collection, name))
+        if collection == "nodes":
+            self._delete_node_index(name)
+
+    def _delete_node_index(self, name):
+        for table in NODE_TABLES:
+            self._db.execute("DELETE FROM %s WHERE node = ?" % table, (name,))
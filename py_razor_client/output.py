@@ -0,0 +1,139 @@
+# -*- coding: utf-8 -*-
+"""Writes the command line tool's results in formats meant for piping.
+
+With --format, py-razor-client writes its result as:
+
+    json    one JSON document (for a collection, an array of its members)
+    ndjson  one JSON document per line; for a collection, one per member
+    table   aligned columns, one row per member, with a header
+
+Members are written as they're produced rather than after the whole result
+has been built, so a streamed listing is printed in constant memory and its
+first line appears as soon as its first member has been parsed.
+"""
+from collections import Iterator
+
+
+FORMATS = ("json", "ndjson", "table")
+
+# How many rows a table buffers to work out its column widths. Later rows
+# that are wider than that push the columns after them out of line rather
+# than being truncated.
+TABLE_SAMPLE_ROWS = 50
+
+
+def _members(result):
+    """Returns an iterator over result's members if it's a collection (a
+    list or an iterator, such as a streamed listing), or None otherwise.
+    """
+    if isinstance(result, (list, tuple, Iterator)):
+        return iter(result)
+    return None
+
+
+def write_result(result, stream, format, codec):
+    """Writes result to stream in the named format (one of FORMATS)."""
+    if format == "json":
+        write_json(result, stream, codec)
+    elif format == "ndjson":
+        write_ndjson(result, stream, codec)
+    elif format == "table":
+        write_table(result, stream, codec)
+    else:
+        raise ValueError("Unknown output format: %s" % format)
+
+
+def write_json(result, stream, codec):
+    members = _members(result)
+    if members is None:
+        stream.write(codec.dumps(result) + "\n")
+        return
+
+    separator = "[\n"
+    for member in members:
+        stream.write(separator + codec.dumps(member))
+        stream.flush()
+        separator = ",\n"
+    if separator == "[\n":
+        stream.write("[]\n")
+    else:
+        stream.write("\n]\n")
+
+
+def write_ndjson(result, stream, codec):
+    members = _members(result)
+    if members is None:
+        members = [result]
+    for member in members:
+        stream.write(codec.dumps(member) + "\n")
+        stream.flush()
+
+
+def write_table(result, stream, codec):
+    members = _members(result)
+    if members is None:
+        if isinstance(result, dict):
+            # A single member: one row per field
+            columns = ["key", "value"]
+            members = iter([{"key": key, "value": result[key]}
+                            for key in sorted(result)])
+        else:
+            stream.write(_cell(result, codec).encode("utf-8") + "\n")
+            return
+    else:
+        columns = None
+
+    sample = []
+    for member in members:
+        sample.append(member)
+        if len(sample) >= TABLE_SAMPLE_ROWS:
+            break
+    if not sample:
+        return
+    if columns is None:
+        columns = _columns(sample[0])
+
+    rows = [_row(member, columns, codec) for member in sample]
+    widths = [max(len(column), *[len(row[i]) for row in rows])
+              for i, column in enumerate(columns)]
+
+    def write_row(cells):
+        line = "  ".join(cell.ljust(width)
+                         for cell, width in zip(cells, widths))
+        stream.write(line.rstrip().encode("utf-8") + "\n")
+        stream.flush()
+
+    write_row([column.upper() for column in columns])
+    for row in rows:
+        write_row(row)
+    for member in members:
+        write_row(_row(member, columns, codec))
+
+
+def _columns(member):
+    """The columns of a table: the first member's keys, name first."""
+    if not isinstance(member, dict):
+        return ["value"]
+    keys = sorted(member)
+    if "name" in keys:
+        keys.remove("name")
+        keys.insert(0, "name")
+    return keys
+
+
+def _row(member, columns, codec):
+    if not isinstance(member, dict):
+        return [_cell(member, codec)]
+    return [_cell(member.get(column), codec) for column in columns]
+
+
+def _cell(value, codec):
+    if value is None:
+        return u""
+    if isinstance(value, unicode):
+        return value
+    if isinstance(value, str):
+        return value.decode("utf-8")
+    if isinstance(value, (dict, list)):
+        return codec.dumps(value).decode("utf-8")
+    return unicode(value)
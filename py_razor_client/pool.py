@@ -0,0 +1,276 @@
+# -*- coding: utf-8 -*-
+"""Talks to several Razor servers (one per datacenter, say) as if they were
+one.
+
+    pool = RazorClientPool(["razor.dc1:8080", "razor.dc2:8080"])
+    pool.nodes()
+    pool.create_tag(name="small", rule=[...], razor_server="razor.dc2:8080")
+
+The servers are discovered concurrently, and the pool binds a method for
+every collection and command any of them offers, just as RazorClient does.
+
+Reads fan out to every server offering the collection, in parallel, and the
+results are merged in server order. Every member is tagged with the name of
+the server it came from under SERVER_KEY. A server that fails doesn't fail
+the read: the other servers' members are still returned, and the failure is
+recorded in the result's errors. Members that couldn't be expanded, and
+references that couldn't be resolved, are reported in member_errors and
+unresolved just as a single client's ExpandedCollection does. Asking for one
+member (pool.nodes("node1")) returns it from each server that has it.
+
+Commands go to a single server, chosen by the pool's selector, which is
+called as selector(pool, command, arguments) and returns a server name
+("hostname:port"). The default, select_server, takes it from a razor_server
+argument, or uses the only server if the pool has just one.
+"""
+import logging
+from collections import Iterator
+
+from py_razor_client.concurrency import map_outcomes
+from py_razor_client.deadline import propagate
+from py_razor_client.razor_client import collection_members
+from py_razor_client.razor_client import MemberError
+from py_razor_client.razor_client import RazorClient
+from py_razor_client.records import Record
+from py_razor_client.stats import RequestStats
+
+
+log = logging.getLogger(__name__)
+
+SERVER_KEY = "razor_server"
+
+
+class NoServerSelectedException(Exception):
+    pass
+
+
+class ServerError(object):
+    """Records a server that failed while fanning a read out."""
+
+    def __init__(self, server, exception):
+        self.server = server
+        self.exception = exception
+
+    def __repr__(self):
+        return "ServerError(%r, %r)" % (self.server, self.exception)
+
+
+class MergedResult(list):
+    """The members read from every server, in server order, each tagged with
+    its server under SERVER_KEY. Servers that failed are recorded in errors
+    as a list of ServerErrors.
+
+    When expanding, members that couldn't be fetched are recorded in
+    member_errors as MemberErrors, indexed into the merged result; when
+    resolving references, those that couldn't be are recorded in unresolved
+    as UnresolvedReferences.
+    """
+
+    def __init__(self, members=(), errors=(), member_errors=(),
+                 unresolved=()):
+        super(MergedResult, self).__init__(members)
+        self.errors = list(errors)
+        self.member_errors = list(member_errors)
+        self.unresolved = list(unresolved)
+
+
+def parse_server(server):
+    """Returns (hostname, port) for a server given as "hostname:port", a
+    (hostname, port) pair or a {"hostname": ..., "port": ...} mapping, as
+    in the servers config key.
+    """
+    if isinstance(server, basestring):
+        hostname, _, port = server.rpartition(":")
+        if not (hostname and port):
+            raise ValueError("Servers must be given as hostname:port, not %r"
+                             % server)
+        return hostname, port
+    if isinstance(server, dict):
+        return server['hostname'], str(server['port'])
+    hostname, port = server
+    return hostname, str(port)
+
+
+def select_server(pool, command, arguments):
+    """Routes a command to the server named by its razor_server argument
+    (which is removed from arguments), or to the pool's only server.
+    """
+    server = arguments.pop(SERVER_KEY, None)
+    if server is not None:
+        return server
+    if len(pool.servers) == 1:
+        return pool.servers[0]
+    raise NoServerSelectedException(
+        "%s needs a %s argument to say which server to run on" %
+        (command, SERVER_KEY))
+
+
+def tag(member, server):
+    """Returns member tagged with the server it came from."""
+    if isinstance(member, dict):
+        tagged = dict(member)
+        tagged[SERVER_KEY] = server
+        return tagged
+    if isinstance(member, Record):
+        extra = dict(member._extra or {})
+        extra[SERVER_KEY] = server
+        member._extra = extra
+    return member
+
+
+def _is_not_found(exception):
+    response = getattr(exception, "response", None)
+    return getattr(response, "status_code", None) == 404
+
+
+class RazorClientPool(object):
+
+    def __init__(self, servers, selector=select_server, max_workers=None,
+                 **client_options):
+        """Creates a RazorClient for each server, passing it client_options,
+        and discovers them all. At most max_workers servers (by default, all
+        of them) are talked to at once.
+        """
+        targets = [parse_server(server) for server in servers]
+        if not targets:
+            raise ValueError("A pool needs at least one server")
+
+        self.selector = selector
+        self.max_workers = max_workers or len(targets)
+        # Every client adds to the same stats, so they cover the whole pool
+        if client_options.get("collect_stats"):
+            self.stats = RequestStats()
+        else:
+            self.stats = None
+
+        client_options['lazy_discovery'] = True
+        self.servers = []
+        self._clients = {}
+        for hostname, port in targets:
+            client = RazorClient(hostname, port, **client_options)
+            if self.stats is not None:
+                client.stats = self.stats
+            server = "%s:%s" % (hostname, port)
+            self.servers.append(server)
+            self._clients[server] = client
+        self.codec = self._clients[self.servers[0]].codec
+
+        # Servers that couldn't be discovered, mapped to the exception
+        self.unavailable = {}
+        # Collection and command names, mapped to the servers offering them
+        self._collections = {}
+        self._commands = {}
+        self.discover_methods()
+
+    @property
+    def collections(self):
+        return set(self._collections)
+
+    @property
+    def commands(self):
+        return set(self._commands)
+
+    def client_for(self, server):
+        """Returns the RazorClient for the named server."""
+        try:
+            return self._clients[server]
+        except KeyError:
+            raise NoServerSelectedException("No such server: %s" % server)
+
+    def close(self):
+        for client in self._clients.values():
+            client.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def sanitize_command_name(self, name):
+        return name.replace("-", "_")
+
+    def discover_methods(self, refresh=False):
+        """Discovers every server concurrently, binding a method for each
+        collection and command any of them offers.
+
+        Servers that can't be discovered are logged and left out of the
+        pool (see unavailable); if none can be, the first failure is raised.
+        """
+        results = self._fan_out(
+            self.servers,
+            lambda client: client.discover_methods(refresh))
+
+        self.unavailable = {}
+        self._collections = {}
+        self._commands = {}
+        for server, (_, exception) in zip(self.servers, results):
+            if exception is not None:
+                log.warning("Couldn't discover %s: %s", server, exception)
+                self.unavailable[server] = exception
+                continue
+            client = self._clients[server]
+            for name in sorted(client.collections):
+                self._collections.setdefault(name, []).append(server)
+                self._bind_collection(name)
+            for name in sorted(client.commands):
+                self._commands.setdefault(name, []).append(server)
+                self._bind_command(name)
+
+        if len(self.unavailable) == len(self.servers):
+            raise self.unavailable[self.servers[0]]
+
+    def _bind_collection(self, name):
+        self._bind_method(name, lambda *args, **kwargs:
+                          self._read(name, *args, **kwargs))
+
+    def _bind_command(self, name):
+        self._bind_method(name, lambda **kwargs:
+                          self._execute_command(name, **kwargs))
+
+    def _bind_method(self, method_name, method):
+        setattr(self, method_name, method)
+
+    def _read(self, collection, *item, **options):
+        servers = [server for server in self._collections[collection]
+                   if server not in self.unavailable]
+
+        def read(client):
+            result = getattr(client, collection)(*item, **options)
+            if isinstance(result, Iterator):
+                # Streamed and paged listings are read in the worker
+                result = list(result)
+            return result
+
+        merged = MergedResult()
+        for server, (result, exception) in zip(
+                servers, self._fan_out(servers, read)):
+            if exception is not None:
+                # Members normally live on just one server
+                if not (item and _is_not_found(exception)):
+                    merged.errors.append(ServerError(server, exception))
+            elif item:
+                merged.append(tag(result, server))
+            else:
+                offset = len(merged)
+                # Newer Razors wrap a listing's members under "items"
+                merged.extend(tag(member, server)
+                              for member in collection_members(result))
+                for error in getattr(result, "errors", ()):
+                    merged.member_errors.append(MemberError(
+                        offset + error.index, error.stub, error.exception))
+                merged.unresolved.extend(getattr(result, "unresolved", ()))
+        return merged
+
+    def _execute_command(self, command, **arguments):
+        server = self.selector(self, command, arguments)
+        client = self.client_for(server)
+        return getattr(client, command)(**arguments)
+
+    def _fan_out(self, servers, fn):
+        """Calls fn(client) for each server's client concurrently, returning
+        a (result, exception) pair for each, in order.
+        """
+        return map_outcomes(
+            propagate(lambda server: fn(self._clients[server])), servers,
+            self.max_workers)
@@ -17,12 +17,226 @@ Example usage:
     client.nodes()
     client.nodes("node1")
     client.create_repo(name="test_repo", iso_url="http://example.com/img.iso")
+
+Every request made by a client goes through a single pooled requests.Session,
+so connections to the Razor server are kept alive and reused between calls.
+The session is safe to share between threads; call close() (or use the client
+as a context manager) to release its connections when you're done.
+
+Discovery can be backed by a py_razor_client.cache.DiscoveryCache, in which
+case the /api document is read from disk while it's fresh and revalidated with
+a conditional request once it isn't:
+    client = RazorClient("example.com", 8080,
+                         discovery_cache=DiscoveryCache(ttl=600))
+
+Collection listers can also fetch the full document of every member in
+parallel rather than just returning stubs:
+    client.nodes(expand=True, max_workers=16)
+or stream members as they're parsed, keeping memory use flat for very large
+collections:
+    for node in client.nodes(stream=True):
+        ...
+or page through a collection with the server's start/limit parameters, with
+the next page fetched in the background (expand works here too):
+    for node in client.nodes(page_size=500, expand=True):
+        ...
+
+References between members (a node's policy, a policy's repo and broker)
+can be resolved too, each distinct URL being fetched once and concurrently:
+    client.nodes(include=["policy", "repo", "broker"], depth=2)
+
+Passing response_cache_size keeps that many recent GET responses in memory;
+repeat reads send If-None-Match/If-Modified-Since and reuse the cached body
+when the server answers 304 Not Modified. Running a command drops the cached
+responses for the collections its name refers to (delete-node drops nodes,
+add-policy-tag policies and tags), or every cached response if it doesn't
+name any.
+
+A command can be run for many sets of arguments at once, concurrently, with
+a per-item report of what succeeded:
+    results = client.execute_bulk("delete_node", [{"name": n} for n in names])
+    for failure in results.failed:
+        ...
+
+Requests have no timeout unless one is given, but a whole operation can be
+bounded with py_razor_client.deadline.deadline(). Read-only GETs can also be
+hedged: with hedge_percentile=95, a GET that hasn't answered within the 95th
+percentile of recent latencies is sent again and the first answer wins.
+
+With collect_stats=True, the latency, status, size and JSON decode time of
+every request are aggregated per endpoint in client.stats (see
+py_razor_client.stats).
+
+With records=True, collection listers and getters return compact
+py_razor_client.records objects (one class per collection type, with
+__slots__, interned keys and lazily decoded facts) instead of plain dicts,
+for keeping large sweeps in memory.
+
+JSON is encoded and decoded with the fastest library installed (see
+py_razor_client.codec), or the one named by codec.
+
+Discovery normally happens when a client is constructed. With
+discover_on_demand=True, constructing a client costs nothing: discovery
+happens (exactly once, even with many threads) the first time a collection or
+command method, or client.collections/client.commands, is used.
+
+With validate_commands=True, discovery also fetches every command's parameter
+schema, and command arguments are renamed and checked against it locally, so
+bad ones raise a py_razor_client.schema.CommandValidationError without a
+round trip (see py_razor_client.schema).
+
+Given a py_razor_client.governor.ConcurrencyGovernor, a client limits how
+many reads and commands it has in flight at once (across every thread using
+it), adapting the limits to the latency and errors it sees.
+
+Identical GETs made at the same time by different threads (every worker
+asking for client.policies() at once, say) are coalesced: one request goes to
+the server and each caller decodes its own copy of the shared response.
+Running a command starts afresh, so reads made after it never share a
+response with reads sent before it. Pass coalesce_reads=False to turn this
+off.
 """
+from contextlib import contextmanager
 from functools import partial
-import json
+import threading
 import urlparse
 
-import requests
+from py_razor_client.bulk import run_bulk
+from py_razor_client.cache import conditional_headers
+from py_razor_client.cache import ResponseCache
+from py_razor_client.codec import get_codec
+from py_razor_client.concurrency import map_outcomes
+from py_razor_client.concurrency import SingleFlight
+from py_razor_client.concurrency import TimeoutError
+from py_razor_client.concurrency import WorkerPool
+from py_razor_client.deadline import current_deadline
+from py_razor_client.deadline import DeadlineExceeded
+from py_razor_client.deadline import propagate
+from py_razor_client.deadline import timeout_within_deadline
+from py_razor_client.governor import COMMAND
+from py_razor_client.governor import READ
+from py_razor_client.hedging import hedged_call
+from py_razor_client.hedging import LatencyTracker
+from py_razor_client.hedging import timed
+from py_razor_client.records import Record
+from py_razor_client.records import record_for
+from py_razor_client.schema import compile_schema
+from py_razor_client.stats import NullRecord
+from py_razor_client.stats import RequestRecord
+from py_razor_client.stats import RequestStats
+from py_razor_client.streaming import iter_json_items
+
+
+class MemberError(object):
+    """Records a collection member that couldn't be fetched while expanding."""
+
+    def __init__(self, index, stub, exception):
+        self.index = index
+        self.stub = stub
+        self.exception = exception
+
+    def __repr__(self):
+        return "MemberError(%r, %r, %r)" % (self.index, self.stub,
+                                            self.exception)
+
+
+class UnresolvedReference(object):
+    """Records a reference that couldn't be fetched while resolving."""
+
+    def __init__(self, url, exception):
+        self.url = url
+        self.exception = exception
+
+    def __repr__(self):
+        return "UnresolvedReference(%r, %r)" % (self.url, self.exception)
+
+
+class ExpandedCollection(list):
+    """The full documents for a collection's members, in collection order.
+
+    Members that couldn't be fetched are left as their stubs, and the reason
+    is recorded in errors as a list of MemberErrors. Likewise, references
+    that couldn't be resolved are left as they were and recorded in
+    unresolved as a list of UnresolvedReferences.
+    """
+
+    def __init__(self, members=(), errors=(), unresolved=()):
+        super(ExpandedCollection, self).__init__(members)
+        self.errors = list(errors)
+        self.unresolved = list(unresolved)
+
+
+def collection_members(collection):
+    """Returns the member stubs from a collection document.
+
+    Older Razor servers return a bare list of stubs; newer ones wrap the
+    list in an object under "items".
+    """
+    if isinstance(collection, dict):
+        return collection.get('items', [])
+    return collection
+
+
+def _reference_urls(document, include):
+    """Yields the URL of each reference under document's include keys."""
+    if not isinstance(document, dict):
+        return
+    for key in include:
+        value = document.get(key)
+        for reference in value if isinstance(value, list) else [value]:
+            if isinstance(reference, dict) and \
+                    isinstance(reference.get('id'), basestring):
+                yield reference['id']
+
+
+def _hydrate(document, include, depth, fetched, hydrated):
+    """Returns a copy of document with the references under its include
+    keys replaced by their fetched documents, themselves hydrated to one
+    level less deep.
+
+    hydrated memoizes (url, depth) to its hydrated document, so a member
+    referred to many times is only copied once (and cycles end at depth 0).
+    """
+    if depth <= 0 or not isinstance(document, dict):
+        return document
+
+    def resolve(reference):
+        url = reference.get('id') if isinstance(reference, dict) else None
+        if url not in fetched:
+            return reference
+        key = (url, depth)
+        if key not in hydrated:
+            hydrated[key] = _hydrate(fetched[url], include, depth - 1,
+                                     fetched, hydrated)
+        return hydrated[key]
+
+    copy = dict(document)
+    for key in include:
+        if key not in copy:
+            continue
+        value = copy[key]
+        if isinstance(value, list):
+            copy[key] = [resolve(reference) for reference in value]
+        else:
+            copy[key] = resolve(value)
+    return copy
+
+
+def _singular(collection):
+    if collection.endswith("ies"):
+        return collection[:-3] + "y"
+    if collection.endswith("s"):
+        return collection[:-1]
+    return collection
+
+
+def _affected_collections(command, collections):
+    """Returns the names of the collections that the command (a command name
+    like "delete-node") refers to.
+    """
+    words = set(command.split("-"))
+    return [collection for collection in collections
+            if collection in words or _singular(collection) in words]
 
 
 class RazorClient(object):
@@ -35,44 +249,588 @@ class RazorClient(object):
         "iso_url": "iso-url",
     }
     API_PATH = "/api"  # It's less likely that this will change
+    DEFAULT_POOL_SIZE = 10
+    STREAM_CHUNK_SIZE = 64 * 1024
+    MIN_HEDGE_SAMPLES = 20
 
-    def __init__(self, hostname, port, lazy_discovery=False):
+    def __init__(self, hostname, port, lazy_discovery=False,
+                 pool_size=DEFAULT_POOL_SIZE, keep_alive=True,
+                 pool_block=False, discovery_cache=None,
+                 response_cache_size=0, timeout=None, hedge_delay=None,
+                 hedge_percentile=None, collect_stats=False,
+                 discover_on_demand=False, records=False, codec=None,
+                 validate_commands=False, governor=None, coalesce_reads=True):
         self.hostname = hostname
         self.port = str(port)
+        self.pool_size = pool_size
+        self.keep_alive = keep_alive
+        self.pool_block = pool_block
+        self.discovery_cache = discovery_cache
+        if response_cache_size:
+            self.response_cache = ResponseCache(response_cache_size)
+        else:
+            self.response_cache = None
+        self.timeout = timeout
+        self.hedge_delay = hedge_delay
+        self.hedge_percentile = hedge_percentile
+        if hedge_percentile is not None:
+            self.latencies = LatencyTracker()
+        else:
+            self.latencies = None
+        self.stats = RequestStats() if collect_stats else None
+        self.records = records
+        self.codec = get_codec(codec)
+        self.validate_commands = validate_commands
+        self.governor = governor
+        self._flights = SingleFlight() if coalesce_reads else None
+        # Compiled CommandSchemas, by command URL
+        self._command_schemas = {}
         self._collection_urls = {}
-        self.collections = set()
-        self.commands = set()
+        self._command_urls = {}
+        self._collections = set()
+        self._commands = set()
+        self._session = None
+        self._session_lock = threading.Lock()
+        self.discover_on_demand = discover_on_demand
+        self._discovered = False
+        self._discovering = threading.local()
+        self._discovery_lock = threading.Lock()
 
-        if not lazy_discovery:
+        if not (lazy_discovery or discover_on_demand):
             self.discover_methods()
 
+    def __getattr__(self, name):
+        # Only called for attributes that don't exist, which before discovery
+        # includes every collection and command method.
+        if name.startswith("_") or not self.__dict__.get("discover_on_demand"):
+            raise AttributeError(name)
+        if self.__dict__.get("_discovered", True):
+            raise AttributeError(name)
+
+        self._ensure_discovered()
+        try:
+            return self.__dict__[name]
+        except KeyError:
+            raise AttributeError(name)
+
+    @property
+    def collections(self):
+        self._ensure_discovered()
+        return self._collections
+
+    @property
+    def commands(self):
+        self._ensure_discovered()
+        return self._commands
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    @property
+    def session(self):
+        """The pooled HTTP session every request is made through.
+
+        The session is created on first use. requests.Session hands out
+        connections from a thread-safe urllib3 pool, so a single session is
+        shared by every thread using this client.
+        """
+        if self._session is None:
+            with self._session_lock:
+                if self._session is None:
+                    self._session = self._make_session()
+        return self._session
+
+    def close(self):
+        """Closes any pooled connections held by this client.
+
+        The client remains usable afterwards; a fresh session will be created
+        the next time a request is made.
+        """
+        with self._session_lock:
+            session, self._session = self._session, None
+        if session is not None:
+            session.close()
+
+    def expand_members(self, stubs, max_workers=None):
+        """Fetches the full document behind each member stub concurrently.
+
+        At most max_workers requests (by default, the connection pool size)
+        are in flight at once. A failure fetching one member doesn't fail the
+        rest; see ExpandedCollection.
+        """
+        stubs = list(stubs)
+        members = []
+        errors = []
+        for index, (stub, (member, exception)) in enumerate(zip(
+                stubs, self._map_concurrently(self._get_member, stubs,
+                                              max_workers))):
+            if exception is None:
+                members.append(member)
+            else:
+                members.append(stub)
+                errors.append(MemberError(index, stub, exception))
+        return ExpandedCollection(members, errors)
+
     def get_path(self, path, response_as_json=True):
         url = self._coerce_to_full_url(path)
-        response = requests.get(url)
-        response.raise_for_status()  # makes sure errors get propagated as exceptions
-        if response_as_json:
-            return response.json()
-        else:
-            return response.text
+        with self._instrument("GET", url) as record:
+            response = self._get(url, record)
+            if response_as_json:
+                with record.decoding():
+                    return self._decode(response)
+            else:
+                return response.text
+
+    def get_if_modified(self, path, etag=None, last_modified=None):
+        """GETs path unless it's unchanged since it was last fetched with the
+        given validators, bypassing the response cache.
+
+        Returns None if the server answers 304 Not Modified, and otherwise
+        (document, etag, last_modified).
+        """
+        url = self._coerce_to_full_url(path)
+        with self._instrument("GET", url) as record:
+            response = self._send_get(url,
+                                      conditional_headers(etag, last_modified))
+            record.response_received(response)
+            if response.status_code == 304:
+                return None
+            response.raise_for_status()
+            with record.decoding():
+                document = self._decode(response)
+        return (document, response.headers.get("ETag"),
+                response.headers.get("Last-Modified"))
+
+    def get_many_if_modified(self, requests, max_workers=None):
+        """Runs get_if_modified for each (path, etag, last_modified) in
+        requests concurrently.
+
+        Returns a (result, exception) pair for each request, in order; a
+        failure fetching one path doesn't fail the rest. At most max_workers
+        requests (by default, the connection pool size) are in flight at
+        once.
+        """
+        def get(request):
+            return self.get_if_modified(*request)
+
+        return self._map_concurrently(get, requests, max_workers)
+
+    def resolve_references(self, documents, include, depth=1,
+                           max_workers=None):
+        """Replaces the references to other members (by id URL) under the
+        keys named in include with the documents they refer to, following
+        the same keys in those documents up to depth levels deep.
+
+        Each distinct URL is fetched only once, however many documents refer
+        to it, and each level's URLs are fetched concurrently. Returns an
+        ExpandedCollection of hydrated copies of documents; the documents
+        passed in aren't modified.
+        """
+        return self._resolve_references(documents, include, depth,
+                                        max_workers, {})
+
+    def _resolve_references(self, documents, include, depth, max_workers,
+                            fetched):
+        # fetched maps URLs to documents already fetched, and can be shared
+        # between calls (e.g. for successive pages) to avoid refetching
+        include = tuple(include)
+        documents = list(documents)
+        unresolved = []
+        seen = set(fetched)
+        level = documents
+        for _ in range(depth):
+            urls = []
+            for document in level:
+                for url in _reference_urls(document, include):
+                    if url not in seen:
+                        seen.add(url)
+                        urls.append(url)
+            if not urls:
+                break
+
+            level = []
+            results = self._map_concurrently(self.get_path, urls, max_workers)
+            for url, (document, exception) in zip(urls, results):
+                if exception is None:
+                    fetched[url] = document
+                    level.append(document)
+                else:
+                    unresolved.append(UnresolvedReference(url, exception))
+
+        hydrated = {}
+        return ExpandedCollection(
+            [_hydrate(document, include, depth, fetched, hydrated)
+             for document in documents], unresolved=unresolved)
+
+    def _map_concurrently(self, fn, items, max_workers=None):
+        """Calls fn on each item concurrently, within the current deadline,
+        returning a (result, exception) pair for each, in order. At most
+        max_workers (by default, the connection pool size) run at once.
+        """
+        return map_outcomes(propagate(fn), items,
+                            max_workers or self.pool_size)
+
+    def iter_path(self, path):
+        """Yields the members of the collection at path as they're parsed
+        from the response, without buffering the whole body.
+        """
+        url = self._coerce_to_full_url(path)
+        with self._instrument("GET", url) as record:
+            get = self._governed(READ, self.session.get)
+            response = get(url, stream=True, **self._request_options())
+            try:
+                record.response_received(response, streamed=True)
+                response.raise_for_status()
+                chunks = self._count_bytes(
+                    response.iter_content(self.STREAM_CHUNK_SIZE), record)
+                for item in iter_json_items(chunks):
+                    yield item
+            finally:
+                response.close()
+
+    def iter_pages(self, path, page_size, prefetch=True):
+        """Yields the member stubs of the collection at path, page_size at a
+        time, using Razor's start and limit paging parameters.
+
+        With prefetch, each page is requested in the background while the
+        caller works through the one before it, so at most two pages are
+        held at once. A server that doesn't page the collection returns it
+        whole, as a single page.
+        """
+        url = self._coerce_to_full_url(path)
+        get_page = propagate(partial(self._get_page, url, page_size))
+        worker_pool = WorkerPool(1) if prefetch else None
+        try:
+            if prefetch:
+                next_page = worker_pool.submit(get_page, 0)
+            start = 0
+            while True:
+                if prefetch:
+                    members, total = next_page.result()
+                else:
+                    members, total = get_page(start)
+                start += len(members)
+                more = (total is not None and len(members) > 0 and
+                        start < total)
+                if more and prefetch:
+                    next_page = worker_pool.submit(get_page, start)
+                yield members
+                if not more:
+                    return
+        finally:
+            if worker_pool is not None:
+                worker_pool.shutdown(wait=False)
 
     def post_data(self, path, **data):
         url = self._coerce_to_full_url(path)
-        headers = {
-            "Content-Type": "application/json",
-        }
-        response = requests.post(url, headers=headers, data=json.dumps(data))
-        return response.json()
+        return self._post_json(url, data)
 
-    def discover_methods(self):
-        methods_data = self.get_path("/api")
+    def execute_bulk(self, command_name, argument_sets, max_workers=None,
+                     stop_on_failure=False):
+        """Runs a command once for each set of keyword arguments, up to
+        max_workers (by default, the connection pool size) at a time.
+
+        argument_sets may contain py_razor_client.bulk.BARRIER to run the
+        commands in dependent phases. Rather than raising, returns a
+        BulkResult reporting the response or exception for each set; a
+        command counts as failed if the server responds with an error status.
+        """
+        command_name = self.sanitize_command_name(command_name)
+        self._ensure_discovered()
+        if command_name not in self._command_urls:
+            raise ValueError("Unknown command: %s" % command_name)
+        url = self._command_urls[command_name]
+
+        def execute(arguments):
+            data = self._prepare_command_args(url, dict(arguments))
+            return self._post_json(url, data, raise_for_status=True)
+
+        return run_bulk(propagate(execute), argument_sets,
+                        max_workers or self.pool_size, stop_on_failure)
+
+    def discover_methods(self, refresh=False):
+        """Binds a method for every collection and command the server offers.
+
+        If this client has a discovery cache, a fresh cached copy of the API
+        document is used without contacting the server unless refresh is set.
+        """
+        methods_data = self._get_api_document(refresh)
         for collection in methods_data['collections']:
             self._bind_collection(collection)
         for command in methods_data['commands']:
             self._bind_command(command)
+        if self.validate_commands:
+            self._load_command_schemas(methods_data['commands'], refresh)
+        self._discovered = True
+
+    def collection_url(self, name):
+        """Returns the URL of the named collection."""
+        self._ensure_discovered()
+        try:
+            return self._collection_urls[name]
+        except KeyError:
+            raise ValueError("No such collection: %s" % name)
 
     def sanitize_command_name(self, name):
         return name.replace("-", "_")
 
+    def _ensure_discovered(self):
+        """Runs discovery if this client discovers on demand and hasn't yet.
+
+        Concurrent callers wait for a single discovery to finish. Calls made
+        by the discovering thread itself (while binding methods, say) return
+        immediately.
+        """
+        if self._discovered or not self.discover_on_demand:
+            return
+        if getattr(self._discovering, "active", False):
+            return
+
+        with self._discovery_lock:
+            if self._discovered:
+                return
+            self._discovering.active = True
+            try:
+                self.discover_methods()
+            finally:
+                self._discovering.active = False
+
+    def _get_api_document(self, refresh=False):
+        if self.discovery_cache is None:
+            return self.get_path(self.API_PATH)
+
+        cache = self.discovery_cache
+        key = self._make_netloc()
+        entry = cache.load(key)
+        if entry and not refresh and cache.is_fresh(entry):
+            return entry['document']
+
+        headers = cache.validators(entry) if entry else {}
+        url = self._coerce_to_full_url(self.API_PATH)
+        with self._instrument("GET", url) as record:
+            response = self._send_get(url, headers)
+            record.response_received(response)
+            if entry and response.status_code == 304:
+                return cache.touch(key, entry)['document']
+
+            response.raise_for_status()
+            with record.decoding():
+                document = self._decode(response)
+        cache.store(key, document,
+                    etag=response.headers.get("ETag"),
+                    last_modified=response.headers.get("Last-Modified"))
+        return document
+
+    def _load_command_schemas(self, commands, refresh=False):
+        """Fetches every command's document concurrently (or reads them from
+        the discovery cache) and compiles their schemas.
+
+        Commands whose documents can't be fetched or don't describe their
+        parameters aren't validated.
+        """
+        cache = self.discovery_cache
+        key = "%s-commands" % self._make_netloc()
+        entry = cache.load(key) if cache is not None else None
+        if entry and not refresh and cache.is_fresh(entry):
+            documents = entry['document']
+        else:
+            urls = [command['id'] for command in commands]
+            documents = {}
+            complete = True
+            for url, (document, exception) in zip(
+                    urls, self._map_concurrently(self.get_path, urls)):
+                if exception is None:
+                    documents[url] = document
+                else:
+                    complete = False
+            # A partial set would leave commands unvalidated until it expired
+            if cache is not None and complete:
+                cache.store(key, documents)
+
+        schemas = {}
+        for url, document in documents.items():
+            schema = compile_schema(document)
+            if schema is not None:
+                schemas[url] = schema
+        self._command_schemas = schemas
+
+    def _get(self, url, record=None):
+        """GETs url, revalidating a cached copy of it if there is one.
+
+        The response the server sent is passed to record, so a revalidated
+        copy is recorded as the 304 it was rather than as the cached body.
+        """
+        if record is None:
+            record = NullRecord()
+        if self.response_cache is None:
+            response = self._send_get(url)
+            record.response_received(response)
+            response.raise_for_status()  # makes sure errors get propagated as exceptions
+            return response
+
+        cached = self.response_cache.get(url)
+        if cached is None:
+            response = self._send_get(url)
+        else:
+            headers = self.response_cache.validators(cached)
+            response = self._send_get(url, headers)
+        record.response_received(response)
+        if cached is not None and response.status_code == 304:
+            return cached
+
+        response.raise_for_status()
+        self.response_cache.store(url, response)
+        return response
+
+    def _send_get(self, url, headers=None):
+        """Sends a GET, or shares the response to an identical one already
+        in flight.
+        """
+        if self._flights is None:
+            return self._send_get_uncoalesced(url, headers)
+
+        key = (url, tuple(sorted((headers or {}).items())))
+        deadline = current_deadline()
+        try:
+            return self._flights.do(
+                key, partial(self._send_get_uncoalesced, url, headers),
+                deadline.remaining() if deadline is not None else None)
+        except TimeoutError:
+            raise DeadlineExceeded()
+
+    def _send_get_uncoalesced(self, url, headers=None):
+        """Sends a GET, hedging it if this client is configured to."""
+        options = self._request_options()
+        if headers:
+            options['headers'] = headers
+
+        send = self._governed(READ, partial(self.session.get, url, **options))
+        if self.latencies is not None:
+            send = timed(send, self.latencies)
+
+        delay = self._hedge_delay()
+        if delay is None:
+            return send()
+        return hedged_call(send, delay, current_deadline())
+
+    def _governed(self, kind, send):
+        """Wraps send to wait for a slot from this client's governor, if it
+        has one.
+        """
+        if self.governor is None:
+            return send
+        return self.governor.governed(kind, send)
+
+    def _hedge_delay(self):
+        """Returns how long to wait before hedging a GET, or None if GETs
+        shouldn't be hedged.
+
+        The configured percentile of recent latencies is used once there are
+        enough samples for it to mean something; until then, hedge_delay is.
+        """
+        if self.latencies is not None and \
+                len(self.latencies) >= self.MIN_HEDGE_SAMPLES:
+            return self.latencies.percentile(self.hedge_percentile)
+        return self.hedge_delay
+
+    def _request_options(self):
+        timeout = timeout_within_deadline(self.timeout)
+        if timeout is None:
+            return {}
+        return {"timeout": timeout}
+
+    def _post_json(self, url, data, raise_for_status=False):
+        """POSTs data to url as JSON and returns the decoded response."""
+        headers = {
+            "Content-Type": "application/json",
+        }
+        body = self.codec.dumps(data)
+        if self._flights is not None:
+            # Reads sent before this command may not reflect it
+            self._flights.forget()
+        with self._instrument("POST", url) as record:
+            record.request_bytes = len(body)
+            post = self._governed(COMMAND, self.session.post)
+            response = post(url, headers=headers, data=body,
+                            **self._request_options())
+            record.response_received(response)
+            if response.ok:
+                self._invalidate_cached(url)
+            if raise_for_status:
+                response.raise_for_status()
+            with record.decoding():
+                return self._decode(response)
+
+    def _invalidate_cached(self, command_url):
+        """Drops the cached responses that the command at command_url may
+        have made stale.
+        """
+        if self.response_cache is None:
+            return
+        command = urlparse.urlsplit(command_url).path.rstrip("/")
+        command = command.rsplit("/", 1)[-1]
+        collection_urls = dict(self._collection_urls)
+        affected = _affected_collections(command, collection_urls)
+        if not affected:
+            self.response_cache.invalidate()
+        for collection in affected:
+            self.response_cache.invalidate_collection(
+                collection_urls[collection])
+
+    def _decode(self, response):
+        """Decodes a JSON response body with this client's codec, passing
+        it the body's bytes unless it declares a charset other than UTF-8
+        (some codecs still make a unicode copy; see py_razor_client.codec).
+        """
+        content = response.content
+        encoding = response.encoding
+        if encoding and encoding.lower().replace("-", "") != "utf8":
+            content = content.decode(encoding)
+        return self.codec.loads(content)
+
+    @contextmanager
+    def _instrument(self, method, url):
+        """Measures the request made inside the block, adding the resulting
+        RequestRecord to this client's stats if it's collecting them.
+        """
+        if self.stats is None:
+            yield NullRecord()
+            return
+
+        record = RequestRecord(method, url)
+        try:
+            yield record
+        except Exception as e:
+            record.failed(e)
+            raise
+        finally:
+            self.stats.add(record)
+
+    def _count_bytes(self, chunks, record):
+        for chunk in chunks:
+            record.response_bytes += len(chunk)
+            yield chunk
+
+    def _make_session(self):
+        # requests is imported here rather than at the top of the module
+        # because it's comparatively slow to import, and short-lived users like
+        # the command line tool may never need to make a request at all.
+        import requests
+        from requests.adapters import HTTPAdapter
+
+        session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=self.pool_size,
+                              pool_maxsize=self.pool_size,
+                              pool_block=self.pool_block)
+        session.mount("http://", adapter)
+        session.mount("https://", adapter)
+        if not self.keep_alive:
+            session.headers["Connection"] = "close"
+        return session
+
     def _coerce_to_full_url(self, maybe_path):
         """Turns what might be a relative path into an asbolute URL."""
         if not maybe_path.startswith("http"):
@@ -94,7 +852,8 @@ class RazorClient(object):
         collection_url = collection['id']
 
         self._bind_method(collection_name, lambda *args, **kwargs: self._get_collection(collection_url, *args, **kwargs))
-        self.collections.add(collection_name)
+        self._collection_urls[collection_name] = collection_url
+        self._collections.add(collection_name)
 
     def _bind_command(self, command):
         command_name = command['name']
@@ -105,22 +864,125 @@ class RazorClient(object):
         command_name = self.sanitize_command_name(command_name)
 
         self._bind_method(command_name, partial(self._execute_command, command_url))
-        self.commands.add(command_name)
+        self._command_urls[command_name] = command_url
+        self._commands.add(command_name)
 
     def _bind_method(self, method_name, method):
         setattr(self, method_name, method)
 
-    def _get_collection(self, url, *item):
+    def _get_collection(self, url, *item, **options):
+        expand = options.pop("expand", False)
+        max_workers = options.pop("max_workers", None)
+        stream = options.pop("stream", False)
+        page_size = options.pop("page_size", None)
+        include = options.pop("include", None)
+        depth = options.pop("depth", 1)
+        if options:
+            raise TypeError("unexpected keyword arguments: %s" %
+                            ", ".join(sorted(options)))
+
         if item:
             item_path = '/'.join(item)
             total_item_path = '/'.join((url, item_path))
         else:
             total_item_path = url
-        return self.get_path(total_item_path)
+        # A listing's members have to be fetched to resolve their references
+        expand = expand or bool(include)
+
+        if stream and not item:
+            if expand:
+                raise ValueError("stream can't be combined with expand or "
+                                 "include")
+            if page_size:
+                raise ValueError("stream and page_size can't be combined")
+            result = self.iter_path(total_item_path)
+        elif page_size and not item:
+            result = self._iter_paged_members(total_item_path, page_size,
+                                              expand, max_workers, include,
+                                              depth)
+        else:
+            result = self.get_path(total_item_path)
+            if item and include:
+                result = self.resolve_references([result], include, depth,
+                                                 max_workers)[0]
+            elif expand and not item:
+                result = self.expand_members(
+                    collection_members(result), max_workers)
+                if include:
+                    resolved = self.resolve_references(result, include,
+                                                       depth, max_workers)
+                    result = ExpandedCollection(resolved, result.errors,
+                                                resolved.unresolved)
+
+        if self.records:
+            return self._to_records(url, result, item, expand,
+                                    stream or page_size)
+        return result
+
+    def _iter_paged_members(self, path, page_size, expand, max_workers,
+                            include=None, depth=1):
+        # Shared between pages, so a policy every node refers to, say, is
+        # only fetched once
+        fetched = {}
+        for page in self.iter_pages(path, page_size):
+            if expand:
+                page = self.expand_members(page, max_workers)
+            if include:
+                page = self._resolve_references(page, include, depth,
+                                                max_workers, fetched)
+            for member in page:
+                yield member
+
+    def _to_records(self, url, result, item, expand, iterating):
+        """Converts what _get_collection fetched to records: typed ones for
+        full member documents, and plain Records for stubs.
+        """
+        collection = self._collection_name(url)
+        if item:
+            return record_for(collection, result)
+        if iterating:
+            if expand:
+                return (record_for(collection, member) for member in result)
+            return (Record(stub) for stub in result)
+        if expand:
+            return ExpandedCollection(
+                [record_for(collection, member) for member in result],
+                result.errors, result.unresolved)
+        return [Record(stub) for stub in collection_members(result)]
+
+    def _get_page(self, url, page_size, start):
+        """Returns the member stubs in one page of a collection, and the
+        size of the whole collection (None if the server doesn't page it).
+        """
+        separator = "&" if "?" in url else "?"
+        document = self.get_path("%s%sstart=%d&limit=%d" % (
+            url, separator, start, page_size))
+        if isinstance(document, dict) and "total" in document:
+            return document.get('items', []), document['total']
+        return collection_members(document), None
+
+    def _collection_name(self, url):
+        return url.rstrip("/").rsplit("/", 1)[-1]
+
+    def _get_member(self, stub):
+        return self.get_path(stub['id'])
 
     def _execute_command(self, url, **kwargs):
+        kwargs = self._prepare_command_args(url, kwargs)
+        return self.post_data(url, **kwargs)
+
+    def _prepare_command_args(self, url, kwargs):
+        """Renames (and, if the command's schema is known, checks) the
+        arguments for the command at url.
+        """
+        schema = self._command_schemas.get(url)
+        if schema is not None:
+            return schema.prepare(kwargs)
+        return self._transform_command_args(kwargs)
+
+    def _transform_command_args(self, kwargs):
         for key in kwargs.keys():
             if key in self.ARG_TRANSFORMS:
                 kwargs[self.ARG_TRANSFORMS[key]] = kwargs[key]
                 del kwargs[key]
-        return self.post_data(url, **kwargs)
+        return kwargs
@@ -0,0 +1,245 @@
+# -*- coding: utf-8 -*-
+"""Compact records for the members of Razor collections.
+
+A RazorClient created with records=True returns these instead of the nested
+dicts decoded from each response. Every collection type (nodes, repos,
+policies, tags and brokers) has a record class with a slot for each field
+Razor documents, so a record carries no per-instance dict of keys. Stubs and
+references to other members (a node's tags and policy, say) are plain Records.
+
+Keys that are repeated across thousands of members are interned, as are spec
+URLs. Large sub-documents, such as a node's facts and hardware info, are kept
+as compact JSON and only decoded the first time they're accessed.
+
+Records support attribute access (node.facts) and enough of the mapping
+protocol (node["facts"], node.get("policy")) for code written against the
+plain dicts; to_dict() converts one back.
+"""
+import json
+
+
+def _intern(string):
+    """Interns a string, if it can be."""
+    if isinstance(string, unicode):
+        try:
+            string = string.encode("ascii")
+        except UnicodeError:
+            return string
+    return intern(string)
+
+
+def _interned_dict(document):
+    # An object_hook rather than an object_pairs_hook, which Python 2.6's
+    # json doesn't have
+    return dict((_intern(key), value) for key, value in document.iteritems())
+
+
+class _Encoded(str):
+    """A sub-document held as JSON until it's first accessed."""
+    __slots__ = ()
+
+
+def _encode(value):
+    if value is None:
+        return None
+    return _Encoded(json.dumps(value, separators=(",", ":")))
+
+
+def _decode(value):
+    if isinstance(value, _Encoded):
+        return json.loads(value, object_hook=_interned_dict)
+    return value
+
+
+class LazyField(object):
+    """A field that's decoded from JSON on first access."""
+
+    def __init__(self, slot):
+        self.slot = slot
+
+    def __get__(self, record, owner):
+        if record is None:
+            return self
+        value = getattr(record, self.slot)
+        if isinstance(value, _Encoded):
+            value = _decode(value)
+            setattr(record, self.slot, value)
+        return value
+
+    def __set__(self, record, value):
+        setattr(record, self.slot, value)
+
+
+def to_record(value):
+    """Converts references to other members (a dict or a list of dicts) to
+    Records, leaving anything else as it is.
+    """
+    if isinstance(value, dict):
+        return Record(value)
+    if isinstance(value, list):
+        return [to_record(item) for item in value]
+    return value
+
+
+def _to_plain(value):
+    if isinstance(value, Record):
+        return value.to_dict()
+    if isinstance(value, list):
+        return [_to_plain(item) for item in value]
+    return value
+
+
+class Record(object):
+    """A member of a Razor collection, or a reference to one.
+
+    FIELDS lists the JSON keys with their own slot (a key's slot is the key
+    with hyphens replaced by underscores). Keys in LAZY_FIELDS are kept as
+    JSON until first accessed, and keys in REFERENCES are converted to
+    Records. Any other key goes in a dict of extras.
+    """
+
+    __slots__ = ("name", "id", "spec", "_extra")
+
+    FIELDS = ("name", "id", "spec")
+    LAZY_FIELDS = ()
+    REFERENCES = ()
+
+    def __init__(self, document):
+        for key in self.FIELDS:
+            value = document.get(key)
+            if key in self.LAZY_FIELDS:
+                value = _encode(value)
+            elif key in self.REFERENCES:
+                value = to_record(value)
+            elif key == "spec" and value is not None:
+                value = _intern(value)
+            # Lazy fields are set through their LazyField, which stores the
+            # JSON in the field's underscored slot
+            setattr(self, self._attribute_for(key), value)
+
+        extra = None
+        if any(key not in self.FIELDS for key in document):
+            extra = dict((_intern(key), value)
+                         for key, value in document.iteritems()
+                         if key not in self.FIELDS)
+        self._extra = extra
+
+    @staticmethod
+    def _attribute_for(key):
+        return key.replace("-", "_")
+
+    def __getitem__(self, key):
+        if key in self.FIELDS:
+            return getattr(self, self._attribute_for(key))
+        if self._extra is not None and key in self._extra:
+            return self._extra[key]
+        raise KeyError(key)
+
+    def __contains__(self, key):
+        return key in self.FIELDS or \
+            (self._extra is not None and key in self._extra)
+
+    def get(self, key, default=None):
+        try:
+            return self[key]
+        except KeyError:
+            return default
+
+    def keys(self):
+        keys = list(self.FIELDS)
+        if self._extra is not None:
+            keys.extend(self._extra)
+        return keys
+
+    def to_dict(self):
+        """Returns the record as plain nested dicts, with None for any field
+        the document it was built from didn't have.
+        """
+        return dict((key, _to_plain(self[key])) for key in self.keys())
+
+    def __eq__(self, other):
+        if not isinstance(other, Record):
+            return NotImplemented
+        return self.to_dict() == other.to_dict()
+
+    def __ne__(self, other):
+        equal = self.__eq__(other)
+        if equal is NotImplemented:
+            return equal
+        return not equal
+
+    def __repr__(self):
+        return "%s(name=%r)" % (self.__class__.__name__, self.name)
+
+
+class NodeRecord(Record):
+
+    __slots__ = ("_hw_info", "dhcp_mac", "tags", "policy", "_facts",
+                 "_metadata", "state", "hostname", "root_password",
+                 "last_checkin")
+
+    FIELDS = Record.FIELDS + ("hw_info", "dhcp_mac", "tags", "policy",
+                              "facts", "metadata", "state", "hostname",
+                              "root_password", "last_checkin")
+    LAZY_FIELDS = ("hw_info", "facts", "metadata")
+    REFERENCES = ("tags", "policy")
+
+    hw_info = LazyField("_hw_info")
+    facts = LazyField("_facts")
+    metadata = LazyField("_metadata")
+
+
+class RepoRecord(Record):
+
+    __slots__ = ("iso_url", "url", "task")
+
+    FIELDS = Record.FIELDS + ("iso_url", "url", "task")
+    REFERENCES = ("task",)
+
+
+class PolicyRecord(Record):
+
+    __slots__ = ("repo", "task", "broker", "enabled", "max_count",
+                 "_configuration", "tags", "nodes", "hostname",
+                 "root_password", "rule_number")
+
+    FIELDS = Record.FIELDS + ("repo", "task", "broker", "enabled",
+                              "max_count", "configuration", "tags", "nodes",
+                              "hostname", "root_password", "rule_number")
+    LAZY_FIELDS = ("configuration",)
+    REFERENCES = ("repo", "task", "broker", "tags", "nodes")
+
+    configuration = LazyField("_configuration")
+
+
+class TagRecord(Record):
+
+    __slots__ = ("rule", "nodes", "policies")
+
+    FIELDS = Record.FIELDS + ("rule", "nodes", "policies")
+    REFERENCES = ("nodes", "policies")
+
+
+class BrokerRecord(Record):
+
+    __slots__ = ("broker_type", "_configuration", "policies")
+
+    FIELDS = Record.FIELDS + ("broker-type", "configuration", "policies")
+    LAZY_FIELDS = ("configuration",)
+    REFERENCES = ("policies",)
+
+    configuration = LazyField("_configuration")
+
+
+RECORD_TYPES = {
+    "nodes": NodeRecord,
+    "repos": RepoRecord,
+    "policies": PolicyRecord,
+    "tags": TagRecord,
+    "brokers": BrokerRecord,
+}
+
+
+def record_for(collection, document):
+    """Builds the record for a member of the named collection."""
+    return RECORD_TYPES.get(collection, Record)(document)
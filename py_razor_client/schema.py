@@ -0,0 +1,115 @@
+# -*- coding: utf-8 -*-
+"""Checks command arguments against the parameter schemas Razor publishes.
+
+Fetching a command's URL describes its parameters, e.g. for
+GET /api/commands/create-repo:
+
+    {"name": "create-repo",
+     "schema": {"name": {"type": "string", "required": true},
+                "iso-url": {"type": "string"},
+                "task": {"type": "string"}}}
+
+A RazorClient created with validate_commands=True fetches these while it
+discovers, and compiles each into a CommandSchema. That maps every Python
+keyword to the parameter Razor expects (iso_url to iso-url, and likewise for
+any hyphenated parameter) and rejects unknown, missing and mistyped arguments
+with a CommandValidationError, before anything is sent to the server.
+"""
+
+
+class CommandValidationError(ValueError):
+    """Raised for command arguments that don't match the command's schema.
+
+    problems lists everything wrong with them, not just the first thing.
+    """
+
+    def __init__(self, command, problems):
+        super(CommandValidationError, self).__init__(
+            "Invalid arguments for %s: %s" % (command, "; ".join(problems)))
+        self.command = command
+        self.problems = problems
+
+
+# JSON schema type names and the Python types that satisfy them
+TYPES = {
+    "string": (basestring,),
+    "number": (int, long, float),
+    "integer": (int, long),
+    "boolean": (bool,),
+    "array": (list, tuple),
+    "object": (dict,),
+}
+
+
+def _matches(value, types):
+    # bool is an int, but True isn't a sensible number of anything
+    if isinstance(value, bool) and bool not in types:
+        return False
+    return isinstance(value, types)
+
+
+class CommandSchema(object):
+    """A command's parameters, compiled for checking arguments against."""
+
+    def __init__(self, name, parameters):
+        self.name = name
+        self.parameters = parameters
+        # Python keywords (and the parameter names themselves) mapped to the
+        # parameters they're sent as
+        self.renames = {}
+        self.types = {}
+        self.required = []
+        for parameter, description in sorted(parameters.items()):
+            self.renames[parameter] = parameter
+            self.renames[parameter.replace("-", "_")] = parameter
+            if not isinstance(description, dict):
+                continue
+            type_name = description.get('type')
+            if type_name in TYPES:
+                self.types[parameter] = (type_name, TYPES[type_name])
+            if description.get('required'):
+                self.required.append(parameter)
+
+    def prepare(self, arguments):
+        """Returns arguments keyed by the parameter names Razor expects,
+        raising CommandValidationError if they don't fit the schema.
+        """
+        prepared = {}
+        problems = []
+        for key, value in sorted(arguments.items()):
+            parameter = self.renames.get(key)
+            if parameter is None:
+                problems.append("unknown argument %s" % key)
+                continue
+            if parameter in prepared:
+                problems.append("%s given more than once" % parameter)
+            expected = self.types.get(parameter)
+            if expected is not None and value is not None and \
+                    not _matches(value, expected[1]):
+                problems.append("%s should be of type %s, not %s" % (
+                    parameter, expected[0], type(value).__name__))
+            prepared[parameter] = value
+
+        for parameter in self.required:
+            if prepared.get(parameter) is None:
+                problems.append("missing required argument %s" % parameter)
+
+        if problems:
+            raise CommandValidationError(self.name, problems)
+        return prepared
+
+    def __repr__(self):
+        return "CommandSchema(%r)" % self.name
+
+
+def compile_schema(document):
+    """Compiles the CommandSchema described by a command's document, or
+    returns None if it doesn't describe its parameters (as older Razors'
+    don't).
+    """
+    if not isinstance(document, dict):
+        return None
+    parameters = document.get('schema')
+    if not isinstance(parameters, dict):
+        return None
+    return CommandSchema(document.get('name'), parameters)
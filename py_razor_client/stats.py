@@ -0,0 +1,245 @@
+# -*- coding: utf-8 -*-
+"""Instrumentation for the requests a RazorClient makes.
+
+When a client is created with collect_stats=True, every request it makes is
+described by a RequestRecord (latency, status, bytes sent and received, time
+spent decoding JSON) and aggregated per endpoint in client.stats. Endpoints
+group requests by method and Razor path, with member names collapsed, so
+"GET collections/nodes/*" covers every individual node fetch.
+
+Listeners can be registered to export each record as it's completed:
+
+    client.stats.add_listener(lambda record: statsd.timing(
+        record.endpoint, record.latency))
+"""
+from bisect import bisect_left
+from contextlib import contextmanager
+import logging
+import threading
+import time
+import urlparse
+
+
+log = logging.getLogger(__name__)
+
+
+def endpoint_for(method, url):
+    """Names the endpoint a request is for, e.g. "GET collections/nodes/*"."""
+    path = urlparse.urlsplit(url)[2]
+    parts = [part for part in path.split("/") if part]
+    if parts and parts[0] == "api":
+        parts = parts[1:] or ["api"]
+    if len(parts) > 2 and parts[0] == "collections":
+        parts[2] = "*"
+    return "%s %s" % (method, "/".join(parts))
+
+
+class Histogram(object):
+    """Counts observations in fixed, roughly exponential buckets."""
+
+    # Upper bounds of each bucket, in seconds; anything larger goes in a
+    # final overflow bucket.
+    BOUNDS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5,
+              1.0, 2.5, 5.0, 10.0, 30.0)
+
+    def __init__(self):
+        self.counts = [0] * (len(self.BOUNDS) + 1)
+        self.count = 0
+        self.total = 0.0
+        self.min = None
+        self.max = None
+
+    def add(self, value):
+        self.counts[bisect_left(self.BOUNDS, value)] += 1
+        self.count += 1
+        self.total += value
+        if self.min is None or value < self.min:
+            self.min = value
+        if self.max is None or value > self.max:
+            self.max = value
+
+    @property
+    def mean(self):
+        if not self.count:
+            return None
+        return self.total / self.count
+
+    def percentile(self, percent):
+        """Estimates a percentile as the upper bound of the bucket it falls
+        in, capped by the largest value seen.
+        """
+        if not self.count:
+            return None
+        rank = percent / 100.0 * self.count
+        seen = 0
+        for bound, count in zip(self.BOUNDS, self.counts):
+            seen += count
+            if seen >= rank and count:
+                return min(bound, self.max)
+        return self.max
+
+
+class RequestRecord(object):
+    """Everything measured about a single request."""
+
+    def __init__(self, method, url):
+        self.method = method
+        self.url = url
+        self.endpoint = endpoint_for(method, url)
+        self.status = None
+        self.latency = None
+        self.request_bytes = 0
+        self.response_bytes = 0
+        self.decode_time = 0.0
+        self.error = None
+        self._start = time.time()
+
+    def response_received(self, response, streamed=False):
+        """Records a response's status and size. A streamed response's body
+        isn't counted here; add its bytes to response_bytes as they're read.
+        """
+        self.latency = time.time() - self._start
+        self.status = response.status_code
+        if streamed:
+            return
+        content_length = response.headers.get("Content-Length")
+        if content_length is not None:
+            self.response_bytes = int(content_length)
+        elif getattr(response, "_content_consumed", False):
+            self.response_bytes = len(response.content)
+
+    @contextmanager
+    def decoding(self):
+        start = time.time()
+        try:
+            yield
+        finally:
+            self.decode_time += time.time() - start
+
+    def failed(self, exception):
+        self.error = exception
+        if self.latency is None:
+            self.latency = time.time() - self._start
+        response = getattr(exception, "response", None)
+        if self.status is None and response is not None:
+            self.status = response.status_code
+
+    def __repr__(self):
+        return "RequestRecord(%r, status=%r, latency=%r)" % (
+            self.endpoint, self.status, self.latency)
+
+
+class NullRecord(object):
+    """Stands in for a RequestRecord when stats aren't being collected, so
+    that instrumented code doesn't have to check.
+    """
+
+    request_bytes = 0
+    response_bytes = 0
+
+    def response_received(self, response, streamed=False):
+        pass
+
+    @contextmanager
+    def decoding(self):
+        yield
+
+    def failed(self, exception):
+        pass
+
+
+class EndpointStats(object):
+    """Aggregated records for one endpoint."""
+
+    def __init__(self, endpoint):
+        self.endpoint = endpoint
+        self.latency = Histogram()
+        self.decode_time = Histogram()
+        self.request_bytes = 0
+        self.response_bytes = 0
+        self.errors = 0
+        self.statuses = {}
+
+    @property
+    def count(self):
+        return self.latency.count
+
+    def add(self, record):
+        self.latency.add(record.latency or 0.0)
+        self.decode_time.add(record.decode_time)
+        self.request_bytes += record.request_bytes
+        self.response_bytes += record.response_bytes
+        if record.error is not None:
+            self.errors += 1
+        self.statuses[record.status] = self.statuses.get(record.status, 0) + 1
+
+
+class RequestStats(object):
+    """Thread-safe per-endpoint aggregation of RequestRecords."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._endpoints = {}
+        self._listeners = []
+
+    def add_listener(self, listener):
+        """Registers listener(record) to be called for every record."""
+        self._listeners.append(listener)
+
+    def remove_listener(self, listener):
+        self._listeners.remove(listener)
+
+    def add(self, record):
+        with self._lock:
+            endpoint = self._endpoints.get(record.endpoint)
+            if endpoint is None:
+                endpoint = EndpointStats(record.endpoint)
+                self._endpoints[record.endpoint] = endpoint
+            endpoint.add(record)
+
+        for listener in list(self._listeners):
+            try:
+                listener(record)
+            except Exception:
+                # A broken exporter shouldn't break the request it measured
+                log.exception("Request stats listener %r failed", listener)
+
+    def endpoints(self):
+        """Returns the EndpointStats for every endpoint seen, by name."""
+        with self._lock:
+            return dict(self._endpoints)
+
+    def reset(self):
+        with self._lock:
+            self._endpoints = {}
+
+    def format_table(self):
+        """Renders a human-readable breakdown, one endpoint per line."""
+        header = ("endpoint", "count", "errors", "mean ms", "p95 ms",
+                  "max ms", "decode ms", "sent B", "recv B")
+        rows = [header]
+        total_time = 0.0
+        for name, endpoint in sorted(self.endpoints().items()):
+            latency = endpoint.latency
+            total_time += latency.total
+            rows.append((
+                name,
+                str(endpoint.count),
+                str(endpoint.errors),
+                "%.1f" % (latency.mean * 1000),
+                "%.1f" % (latency.percentile(95) * 1000),
+                "%.1f" % (latency.max * 1000),
+                "%.1f" % (endpoint.decode_time.total * 1000),
+                str(endpoint.request_bytes),
+                str(endpoint.response_bytes),
+            ))
+
+        widths = [max(len(row[i]) for row in rows) for i in range(len(header))]
+        lines = []
+        for row in rows:
+            cells = [row[0].ljust(widths[0])]
+            cells.extend(cell.rjust(width)
+                         for cell, width in zip(row[1:], widths[1:]))
+            lines.append("  ".join(cells))
+        lines.append("total request time: %.1f ms" % (total_time * 1000))
+        return "\n".join(lines)
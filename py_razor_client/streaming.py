@@ -0,0 +1,142 @@
+# -*- coding: utf-8 -*-
+"""Incremental parsing of collection responses.
+
+Razor returns a collection either as a bare JSON array of members or as an
+object with the members under "items". iter_json_items reads such a document
+from an iterable of byte chunks (like requests' Response.iter_content) and
+yields each member as soon as it has been parsed, so neither the whole body
+nor the whole list of members ever has to be held in memory.
+"""
+import codecs
+import json
+
+
+WHITESPACE = u" \t\n\r"
+
+
+def iter_json_items(chunks, encoding="utf-8"):
+    """Yields the members of a collection document as they're parsed."""
+    reader = _JSONReader(chunks, encoding)
+    first = reader.peek()
+    if first == u"[":
+        items = reader.iter_array()
+    elif first == u"{":
+        items = reader.iter_object_items("items")
+    else:
+        raise ValueError("Expected a JSON array or object, got %r" % first)
+
+    for item in items:
+        yield item
+
+
+class _JSONReader(object):
+    """Pulls JSON values out of a stream of chunks one at a time.
+
+    Whole values are parsed with the stdlib decoder; this class just handles
+    the array/object punctuation between them and buffers just enough input
+    to parse the next value.
+    """
+
+    def __init__(self, chunks, encoding):
+        self._chunks = iter(chunks)
+        self._text_decoder = codecs.getincrementaldecoder(encoding)()
+        self._json_decoder = json.JSONDecoder()
+        self._buffer = u""
+        self._pos = 0
+        self._exhausted = False
+
+    def peek(self):
+        """Returns the next non-whitespace character without consuming it, or
+        None at the end of the stream.
+        """
+        while True:
+            while self._pos < len(self._buffer):
+                if self._buffer[self._pos] not in WHITESPACE:
+                    return self._buffer[self._pos]
+                self._pos += 1
+            if not self._fill():
+                return None
+
+    def expect(self, char):
+        actual = self.peek()
+        if actual != char:
+            raise ValueError("Expected %r, got %r" % (char, actual))
+        self._pos += 1
+
+    def decode_value(self):
+        self.peek()
+        while True:
+            try:
+                value, end = self._json_decoder.raw_decode(self._buffer,
+                                                           idx=self._pos)
+            except ValueError:
+                if not self._fill():
+                    raise
+                continue
+
+            # A value that runs right up to the end of the buffer (a number,
+            # say) might continue in the next chunk.
+            if end == len(self._buffer) and self._fill():
+                continue
+
+            self._pos = end
+            return value
+
+    def iter_array(self):
+        self.expect(u"[")
+        if self.peek() == u"]":
+            self._pos += 1
+            return
+
+        while True:
+            yield self.decode_value()
+            separator = self.peek()
+            self._pos += 1
+            if separator == u"]":
+                return
+            elif separator != u",":
+                raise ValueError("Expected ',' or ']', got %r" % separator)
+
+    def iter_object_items(self, key):
+        """Yields the members of the array stored under key in an object.
+
+        Other values in the object are skipped.
+        """
+        self.expect(u"{")
+        if self.peek() == u"}":
+            return
+
+        while True:
+            name = self.decode_value()
+            self.expect(u":")
+            if name == key:
+                for item in self.iter_array():
+                    yield item
+                return
+
+            self.decode_value()
+            separator = self.peek()
+            self._pos += 1
+            if separator == u"}":
+                return
+            elif separator != u",":
+                raise ValueError("Expected ',' or '}', got %r" % separator)
+
+    def _fill(self):
+        """Reads another chunk into the buffer, discarding what's already been
+        consumed. Returns False once the stream is exhausted.
+        """
+        if self._exhausted:
+            return False
+
+        try:
+            chunk = next(self._chunks)
+        except StopIteration:
+            self._exhausted = True
+            text = self._text_decoder.decode(b"", True)
+        else:
+            text = self._text_decoder.decode(chunk)
+
+        self._buffer = self._buffer[self._pos:] + text
+        self._pos = 0
+        return True
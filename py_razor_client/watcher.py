@@ -0,0 +1,230 @@
+# -*- coding: utf-8 -*-
+"""Watches Razor collections for members being added, changed and removed.
+
+Rather than listing a collection and diffing it by hand, poll it with a
+Watcher and get an event for every difference since the last poll:
+
+    watcher = Watcher(client, ["nodes"], interval=30)
+    watcher.add_listener(lambda event: log.info("%s %s", event.kind,
+                                                event.name))
+    watcher.start()
+
+or, without a background thread:
+
+    for event in watcher.events():
+        ...
+
+Each poll revalidates collection listings and members with the validators
+from the previous poll, so unchanged ones cost a 304 with no body. Razor
+doesn't always send validators, so fetched documents are also hashed and a
+member is only reported as changed when its content actually is.
+
+Polls are bounded: at most max_requests member fetches are made per poll,
+new members first and then whichever were checked longest ago, so a large
+collection is revalidated over several polls rather than all at once.
+"""
+import hashlib
+import json
+import logging
+import threading
+import time
+
+from py_razor_client.razor_client import collection_members
+
+
+log = logging.getLogger(__name__)
+
+ADDED = "add"
+CHANGED = "change"
+REMOVED = "remove"
+
+
+def content_hash(document):
+    """Hashes a document's content, independent of key order."""
+    return hashlib.sha1(json.dumps(document, sort_keys=True)).hexdigest()
+
+
+class WatchEvent(object):
+    """A member that was added, changed or removed.
+
+    document is the member's current document (None once it's removed) and
+    previous is the one seen before (None for new members).
+    """
+
+    def __init__(self, kind, collection, name, document=None, previous=None):
+        self.kind = kind
+        self.collection = collection
+        self.name = name
+        self.document = document
+        self.previous = previous
+
+    def __repr__(self):
+        return "WatchEvent(%r, %r, %r)" % (self.kind, self.collection,
+                                           self.name)
+
+
+class _Member(object):
+
+    __slots__ = ("url", "etag", "last_modified", "hash", "document",
+                 "checked_at")
+
+    def __init__(self, url):
+        self.url = url
+        self.etag = None
+        self.last_modified = None
+        self.hash = None
+        self.document = None
+        # Never fetched; new members are fetched before anything else
+        self.checked_at = None
+
+
+class _CollectionState(object):
+
+    def __init__(self):
+        self.etag = None
+        self.last_modified = None
+        self.members = {}
+
+
+class Watcher(object):
+
+    DEFAULT_INTERVAL = 30  # seconds
+    DEFAULT_MAX_REQUESTS = 100
+
+    def __init__(self, client, collections=("nodes",),
+                 interval=DEFAULT_INTERVAL, max_requests=DEFAULT_MAX_REQUESTS,
+                 max_workers=None):
+        self.client = client
+        self.collections = list(collections)
+        self.interval = interval
+        self.max_requests = max_requests
+        self.max_workers = max_workers
+        self._states = dict((collection, _CollectionState())
+                            for collection in self.collections)
+        self._listeners = []
+        self._stopped = threading.Event()
+        self._thread = None
+
+    def add_listener(self, listener):
+        """Registers listener(event) to be called for every event."""
+        self._listeners.append(listener)
+
+    def remove_listener(self, listener):
+        self._listeners.remove(listener)
+
+    def poll(self):
+        """Polls every collection once, notifying listeners of and returning
+        the events found.
+        """
+        return self._poll(skip_failures=False)
+
+    def _poll(self, skip_failures):
+        events = []
+        for collection in self.collections:
+            try:
+                events.extend(self._poll_collection(collection))
+            except Exception:
+                if not skip_failures:
+                    raise
+                # e.g. Razor being briefly unreachable; try again next time
+                log.exception("Polling %s failed", collection)
+
+        for event in events:
+            for listener in list(self._listeners):
+                try:
+                    listener(event)
+                except Exception:
+                    # One broken listener shouldn't stop the others hearing
+                    log.exception("Watch listener %r failed", listener)
+        return events
+
+    def events(self):
+        """Polls every interval seconds until stop() is called, yielding
+        each event as it's found.
+
+        As on the background thread, a collection that can't be polled is
+        logged and polled again next time, rather than ending the watch.
+        """
+        self._stopped.clear()
+        while not self._stopped.is_set():
+            started = time.time()
+            for event in self._poll(skip_failures=True):
+                yield event
+            self._stopped.wait(max(self.interval - (time.time() - started),
+                                   0))
+
+    def start(self):
+        """Polls on a background thread, notifying listeners, until stop()
+        is called.
+        """
+        if self._thread is not None:
+            raise RuntimeError("The watcher is already running")
+        self._stopped.clear()
+        self._thread = threading.Thread(target=self._run)
+        self._thread.daemon = True
+        self._thread.start()
+
+    def stop(self):
+        self._stopped.set()
+        thread, self._thread = self._thread, None
+        if thread is not None and thread is not threading.current_thread():
+            thread.join()
+
+    def _run(self):
+        while not self._stopped.is_set():
+            started = time.time()
+            self._poll(skip_failures=True)
+            self._stopped.wait(max(self.interval - (time.time() - started),
+                                   0))
+
+    def _poll_collection(self, collection):
+        state = self._states[collection]
+        events = []
+
+        url = self.client.collection_url(collection)
+        listing = self.client.get_if_modified(url, state.etag,
+                                              state.last_modified)
+        if listing is not None:
+            document, state.etag, state.last_modified = listing
+            current = dict((stub['name'], stub['id']) for stub in
+                           collection_members(document))
+            for name in sorted(set(state.members) - set(current)):
+                member = state.members.pop(name)
+                if member.document is not None:
+                    events.append(WatchEvent(REMOVED, collection, name,
+                                             previous=member.document))
+            for name, member_url in current.items():
+                if name not in state.members:
+                    state.members[name] = _Member(member_url)
+
+        # Never-fetched members sort first, then the least recently checked
+        due = sorted(state.members.items(),
+                     key=lambda item: (item[1].checked_at is not None,
+                                       item[1].checked_at, item[0]))
+        due = due[:self.max_requests]
+        fetched = self.client.get_many_if_modified(
+            [(member.url, member.etag, member.last_modified)
+             for _, member in due], self.max_workers)
+
+        now = time.time()
+        for (name, member), (result, exception) in zip(due, fetched):
+            if exception is not None:
+                log.warning("Couldn't fetch %s %s: %s", collection, name,
+                            exception)
+                continue
+            member.checked_at = now
+            if result is None:
+                continue
+
+            document, member.etag, member.last_modified = result
+            new_hash = content_hash(document)
+            if new_hash == member.hash:
+                continue
+
+            previous = member.document
+            member.hash = new_hash
+            member.document = document
+            kind = ADDED if previous is None else CHANGED
+            events.append(WatchEvent(kind, collection, name, document,
+                                     previous))
+        return events
@@ -24,12 +24,15 @@ setup(
         "Topic :: System :: Systems Administration",
         "Topic :: System :: Installation/Setup",
     ],
-    scripts=['bin/py-razor-client'],
+    scripts=['bin/py-razor-client', 'bin/py-razor-client-agent'],
     install_requires=[
         "argparse >= 1.0.0",
         "requests == 2.2.0",
         "pyyaml >= 3.0.0",
     ],
+    extras_require={
+        "speedups": ["simplejson"],
+    },
     tests_require=[
         "coverage == 3.7.1",
         "mock == 1.0.1",
@@ -0,0 +1,163 @@
+# -*- coding: utf-8 -*-
+import os
+import shutil
+import socket
+import tempfile
+import threading
+
+import mock
+import testify as T
+
+from py_razor_client import agent
+from py_razor_client.cli import UnknownCommandException
+
+
+class AgentTestCase(T.TestCase):
+
+    @T.setup_teardown
+    def make_server(self):
+        self.tempdir = tempfile.mkdtemp()
+        self.socket_path = os.path.join(self.tempdir, "agent.sock")
+        self.client_factory = mock.Mock()
+        self.client = self.client_factory.return_value
+        self.client.sanitize_command_name.side_effect = \
+            lambda n: n.replace("-", "_")
+        self.server = agent.AgentServer(self.socket_path, self.client_factory)
+        self.serving = False
+        try:
+            yield
+        finally:
+            if self.serving:
+                self.server.shutdown()
+            self.server.server_close()
+            shutil.rmtree(self.tempdir)
+
+    def serve(self):
+        thread = threading.Thread(target=self.server.serve_forever)
+        thread.daemon = True
+        thread.start()
+        self.serving = True
+
+
+class RunRequestTest(AgentTestCase):
+
+    def test_runs_collection(self):
+        self.client.nodes.return_value = [{"name": "node1"}]
+        response = self.server.run_request(
+            agent.make_request("razor", 8080, "nodes", ["node1"], {}))
+
+        T.assert_equal(response, {"result": [{"name": "node1"}]})
+        self.client_factory.assert_called_once_with("razor", "8080")
+        self.client.nodes.assert_called_once_with("node1")
+
+    def test_reuses_client(self):
+        request = agent.make_request("razor", 8080, "nodes", [], {})
+        self.server.run_request(request)
+        self.server.run_request(request)
+        T.assert_equal(self.client_factory.call_count, 1)
+
+    def test_generator_result(self):
+        self.client.nodes.return_value = (n for n in [1, 2])
+        response = self.server.run_request(
+            agent.make_request("razor", 8080, "nodes", [], {}))
+        T.assert_equal(response, {"result": [1, 2]})
+
+    def test_unknown_command(self):
+        with mock.patch("py_razor_client.cli.dispatch") as mock_dispatch:
+            mock_dispatch.side_effect = UnknownCommandException("frobnicate")
+            response = self.server.run_request(
+                agent.make_request("razor", 8080, "frobnicate", [], {}))
+        T.assert_equal(response, {"error": "frobnicate",
+                                  "type": "UnknownCommandException"})
+        self.client.discover_methods.assert_called_once_with(refresh=True)
+
+    def test_rediscovers_new_command(self):
+        with mock.patch("py_razor_client.cli.dispatch") as mock_dispatch:
+            mock_dispatch.side_effect = [
+                UnknownCommandException("frobnicate"), {"result": "ok"}]
+            response = self.server.run_request(
+                agent.make_request("razor", 8080, "frobnicate", [], {}))
+        T.assert_equal(response, {"result": {"result": "ok"}})
+        self.client.discover_methods.assert_called_once_with(refresh=True)
+
+    def test_failure(self):
+        self.client.create_repo.side_effect = ValueError("bad name")
+        response = self.server.run_request(
+            agent.make_request("razor", 8080, "create-repo", [], {"name": ""}))
+        T.assert_equal(response, {"error": "ValueError: bad name",
+                                  "type": "ValueError"})
+
+    def test_close_closes_clients(self):
+        self.server.run_request(
+            agent.make_request("razor", 8080, "nodes", [], {}))
+        self.server.server_close()
+        self.client.close.assert_called_once_with()
+        T.assert_equal(os.path.exists(self.socket_path), False)
+
+
+class ForwardTest(AgentTestCase):
+
+    def test_round_trip(self):
+        self.client.create_repo.return_value = {"name": "r"}
+        self.serve()
+        request = agent.make_request("razor", 8080, "create-repo", [],
+                                     {"name": "r"})
+
+        T.assert_equal(agent.forward(request, self.socket_path, timeout=5),
+                       {"name": "r"})
+        self.client.create_repo.assert_called_once_with(name="r")
+
+    def test_error(self):
+        self.client.nodes.side_effect = RuntimeError("boom")
+        self.serve()
+        request = agent.make_request("razor", 8080, "nodes", [], {})
+
+        try:
+            agent.forward(request, self.socket_path, timeout=5)
+        except agent.AgentError as e:
+            T.assert_equal(str(e), "RuntimeError: boom")
+            T.assert_equal(e.error_type, "RuntimeError")
+        else:
+            T.assert_not_reached()
+
+    def test_timeout(self):
+        answer = threading.Event()
+        self.client.nodes.side_effect = lambda: answer.wait(5)
+        self.serve()
+        request = agent.make_request("razor", 8080, "nodes", [], {})
+
+        try:
+            agent.forward(request, self.socket_path, timeout=0.1)
+        except agent.AgentError as e:
+            T.assert_equal(str(e), "The agent didn't answer within 0.1 seconds")
+        else:
+            T.assert_not_reached()
+        finally:
+            answer.set()
+
+    def test_no_socket(self):
+        with T.assert_raises(agent.AgentUnavailableException):
+            agent.forward({}, os.path.join(self.tempdir, "missing.sock"))
+
+    def test_nobody_listening(self):
+        stale_path = os.path.join(self.tempdir, "stale.sock")
+        stale = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        stale.bind(stale_path)
+        stale.close()
+        with T.assert_raises(agent.AgentUnavailableException):
+            agent.forward({}, stale_path)
+
+
+class RemoveStaleSocketTest(AgentTestCase):
+
+    def test_removes_stale_socket(self):
+        stale_path = os.path.join(self.tempdir, "stale.sock")
+        stale = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        stale.bind(stale_path)
+        stale.close()
+        agent.remove_stale_socket(stale_path)
+        T.assert_equal(os.path.exists(stale_path), False)
+
+    def test_live_agent(self):
+        with T.assert_raises(RuntimeError):
+            agent.remove_stale_socket(self.socket_path)
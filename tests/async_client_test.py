@@ -0,0 +1,89 @@
+# -*- coding: utf-8 -*-
+import json
+
+import mock
+import testify as T
+
+from py_razor_client.async_client import AsyncRazorClient
+from py_razor_client.concurrency import Future
+
+
+class AsyncRazorClientTestCase(T.TestCase):
+
+    @T.setup_teardown
+    def create_client(self):
+        self.hostname = "some_host"
+        self.port = "some_port"
+        session_tgt = "requests.Session"
+        with mock.patch(session_tgt) as self.mock_session_class:
+            self.mock_session = self.mock_session_class.return_value
+            self.client = AsyncRazorClient(self.hostname, self.port, True,
+                                           max_workers=2)
+            yield
+            self.client.close()
+
+
+class ConstructorTest(AsyncRazorClientTestCase):
+
+    def test_pool_size_matches_workers(self):
+        T.assert_equal(self.client.pool_size, 2)
+        T.assert_equal(self.client.worker_pool.max_workers, 2)
+
+    def test_explicit_pool_size(self):
+        client = AsyncRazorClient(self.hostname, self.port, True,
+                                  max_workers=2, pool_size=8)
+        T.assert_equal(client.pool_size, 8)
+
+    def test_shared_worker_pool(self):
+        worker_pool = mock.Mock()
+        client = AsyncRazorClient(self.hostname, self.port, True,
+                                  worker_pool=worker_pool)
+        client.close()
+        T.assert_equal(client.worker_pool, worker_pool)
+        T.assert_equal(worker_pool.shutdown.call_count, 0)
+
+
+class BoundMethodsTest(AsyncRazorClientTestCase):
+
+    def test_collection_returns_future(self):
+        expected_response = {"name": "node1"}
+        self.mock_session.get.return_value.content = json.dumps(
+            expected_response)
+        self.mock_session.get.return_value.encoding = None
+        self.client._bind_collection({
+            "name": "nodes",
+            "id": "http://some_host:some_port/api/collections/nodes",
+        })
+
+        future = self.client.nodes("node1")
+
+        T.assert_isinstance(future, Future)
+        T.assert_equal(future.result(1), expected_response)
+        self.mock_session.get.assert_called_once_with(
+            "http://some_host:some_port/api/collections/nodes/node1")
+
+    def test_command_returns_future(self):
+        with mock.patch.object(self.client, "post_data") as mock_post_data:
+            mock_post_data.return_value = mock.sentinel.response
+            self.client._bind_command({
+                "name": "create-repo",
+                "id": mock.sentinel.url,
+            })
+
+            future = self.client.create_repo(name="repo", iso_url="x")
+
+            T.assert_equal(future.result(1), mock.sentinel.response)
+            mock_post_data.assert_called_once_with(mock.sentinel.url,
+                                                   name="repo",
+                                                   **{"iso-url": "x"})
+
+    def test_discover_methods_async(self):
+        self.mock_session.get.return_value.content = json.dumps({
+            "collections": [{"name": "tags", "id": "/api/collections/tags"}],
+            "commands": [],
+        })
+        self.mock_session.get.return_value.encoding = None
+
+        self.client.discover_methods_async().result(1)
+
+        T.assert_equal(self.client.collections, set(["tags"]))
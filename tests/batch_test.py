@@ -0,0 +1,112 @@
+# -*- coding: utf-8 -*-
+import json
+import StringIO
+import threading
+import time
+
+import mock
+import testify as T
+
+from py_razor_client import batch
+
+
+class ParseLineTest(T.TestCase):
+
+    def test_collection(self):
+        T.assert_equal(batch.parse_line("nodes node1"),
+                       ("nodes", ["node1"], {}))
+
+    def test_command(self):
+        T.assert_equal(
+            batch.parse_line('create-repo --name r1 --iso-url "http://x/a b"'),
+            ("create-repo", [], {"name": "r1", "iso_url": "http://x/a b"}))
+
+    def test_trailing_comment(self):
+        T.assert_equal(batch.parse_line("nodes  # every node"),
+                       ("nodes", [], {}))
+
+    def test_bad_line(self):
+        with T.assert_raises(batch.BatchLineError):
+            batch.parse_line("--name r1")
+
+
+class ReadLinesTest(T.TestCase):
+
+    def test_skips_blank_and_comment_lines(self):
+        stream = StringIO.StringIO("nodes\n\n# a comment\n  repos r1  \n")
+        T.assert_equal(list(batch.read_lines(stream)),
+                       [(1, "nodes"), (4, "repos r1")])
+
+    def test_prompt(self):
+        prompt = mock.Mock()
+        list(batch.read_lines(StringIO.StringIO("nodes\n"), prompt))
+        T.assert_equal(prompt.call_count, 2)
+
+
+class RunBatchTest(T.TestCase):
+
+    @T.setup
+    def make_client(self):
+        self.client = mock.Mock()
+        self.client.sanitize_command_name.side_effect = \
+            lambda n: n.replace("-", "_")
+
+    def test_records(self):
+        self.client.nodes.return_value = {"name": "node1"}
+        self.client.delete_node.side_effect = ValueError("no such node")
+        del self.client.frobnicate
+
+        records = list(batch.run_batch(self.client, [
+            (1, "nodes node1"),
+            (2, "delete-node --name node2"),
+            (3, "frobnicate"),
+        ]))
+
+        T.assert_equal(records, [
+            {"line": 1, "command": "nodes node1", "ok": True,
+             "result": {"name": "node1"}},
+            {"line": 2, "command": "delete-node --name node2", "ok": False,
+             "error": "ValueError: no such node"},
+            {"line": 3, "command": "frobnicate", "ok": False,
+             "error": "No such collection or command: frobnicate"},
+        ])
+        self.client.delete_node.assert_called_once_with(name="node2")
+
+    def test_parallel_keeps_input_order(self):
+        running = []
+        lock = threading.Lock()
+        peak = [0]
+
+        def get_node(name):
+            with lock:
+                running.append(name)
+                peak[0] = max(peak[0], len(running))
+            # Earlier lines finish last
+            time.sleep(0.05 - 0.01 * int(name))
+            with lock:
+                running.remove(name)
+            return name
+
+        self.client.nodes.side_effect = get_node
+        lines = [(i + 1, "nodes %d" % i) for i in range(4)]
+        records = list(batch.run_batch(self.client, lines, jobs=4))
+
+        T.assert_equal([record['result'] for record in records],
+                       ["0", "1", "2", "3"])
+        T.assert_gt(peak[0], 1)
+
+
+class WriteRecordsTest(T.TestCase):
+
+    def test_all_succeeded(self):
+        stream = StringIO.StringIO()
+        status = batch.write_records([{"line": 1, "ok": True}], stream)
+        T.assert_equal(status, 0)
+        T.assert_equal(json.loads(stream.getvalue()), {"line": 1, "ok": True})
+
+    def test_some_failed(self):
+        stream = StringIO.StringIO()
+        status = batch.write_records([{"line": 1, "ok": False},
+                                      {"line": 2, "ok": True}], stream)
+        T.assert_equal(status, 1)
+        T.assert_equal(len(stream.getvalue().splitlines()), 2)
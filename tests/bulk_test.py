@@ -0,0 +1,96 @@
+# -*- coding: utf-8 -*-
+import threading
+
+import testify as T
+
+from py_razor_client import bulk
+
+
+class SplitPhasesTest(T.TestCase):
+
+    def test_no_barriers(self):
+        phases = bulk.split_phases([{"a": 1}, {"a": 2}])
+        T.assert_equal(phases, [[(0, {"a": 1}), (1, {"a": 2})]])
+
+    def test_barriers(self):
+        argument_sets = [bulk.BARRIER, {"a": 1}, bulk.BARRIER, {"a": 2},
+                         {"a": 3}, bulk.BARRIER, bulk.BARRIER]
+        phases = bulk.split_phases(argument_sets)
+        T.assert_equal(phases, [[(0, {"a": 1})],
+                                [(1, {"a": 2}), (2, {"a": 3})]])
+
+
+class RunBulkTest(T.TestCase):
+
+    def test_results_in_order(self):
+        argument_sets = [{"n": n} for n in range(30)]
+        results = bulk.run_bulk(lambda args: args["n"] * 2, argument_sets, 4)
+
+        T.assert_equal([r.index for r in results], range(30))
+        T.assert_equal([r.response for r in results], range(0, 60, 2))
+        T.assert_equal([r.arguments for r in results], argument_sets)
+        T.assert_equal(results.ok, True)
+
+    def test_failures_reported(self):
+        error = ValueError("bad")
+
+        def execute(args):
+            if args["n"] == 1:
+                raise error
+            return args["n"]
+
+        results = bulk.run_bulk(execute, [{"n": 0}, {"n": 1}, {"n": 2}], 2)
+
+        T.assert_equal(results.ok, False)
+        T.assert_equal([r.index for r in results.succeeded], [0, 2])
+        T.assert_equal(len(results.failed), 1)
+        T.assert_equal(results.failed[0].index, 1)
+        T.assert_equal(results.failed[0].exception, error)
+
+    def test_barrier_orders_phases(self):
+        lock = threading.Lock()
+        finished = []
+
+        def execute(args):
+            if args["phase"] == 2:
+                with lock:
+                    T.assert_equal(sorted(finished)[:2], [0, 1])
+            with lock:
+                finished.append(args["n"])
+            return args["n"]
+
+        argument_sets = [{"phase": 1, "n": 0}, {"phase": 1, "n": 1},
+                         bulk.BARRIER,
+                         {"phase": 2, "n": 2}, {"phase": 2, "n": 3}]
+        results = bulk.run_bulk(execute, argument_sets, 4)
+        T.assert_equal(results.ok, True)
+
+    def test_stop_on_failure(self):
+        calls = []
+
+        def execute(args):
+            calls.append(args["n"])
+            if args["n"] == 0:
+                raise ValueError("bad")
+
+        argument_sets = [{"n": 0}, bulk.BARRIER, {"n": 1}]
+        results = bulk.run_bulk(execute, argument_sets, 2,
+                                stop_on_failure=True)
+
+        T.assert_equal(calls, [0])
+        T.assert_equal(len(results), 2)
+        T.assert_isinstance(results[1].exception, bulk.BulkAbortedException)
+
+    def test_continue_on_failure(self):
+        calls = []
+
+        def execute(args):
+            calls.append(args["n"])
+            if args["n"] == 0:
+                raise ValueError("bad")
+
+        argument_sets = [{"n": 0}, bulk.BARRIER, {"n": 1}]
+        results = bulk.run_bulk(execute, argument_sets, 2)
+
+        T.assert_equal(calls, [0, 1])
+        T.assert_equal(results[1].succeeded, True)
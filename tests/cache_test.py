@@ -0,0 +1,204 @@
+# -*- coding: utf-8 -*-
+import os
+import shutil
+import tempfile
+
+import mock
+import testify as T
+
+from py_razor_client.cache import DiscoveryCache
+from py_razor_client.cache import LRUCache
+from py_razor_client.cache import ResponseCache
+
+
+class DiscoveryCacheTestCase(T.TestCase):
+
+    @T.setup_teardown
+    def create_cache(self):
+        self.cache_dir = tempfile.mkdtemp()
+        self.cache = DiscoveryCache(os.path.join(self.cache_dir, "sub"), 60)
+        self.key = "some_host:8080"
+        self.document = {"collections": [], "commands": []}
+        try:
+            yield
+        finally:
+            shutil.rmtree(self.cache_dir)
+
+    @T.setup_teardown
+    def mock_time(self):
+        with mock.patch("py_razor_client.cache.time.time") as self.mock_time:
+            self.mock_time.return_value = 1000.0
+            yield
+
+
+class LoadStoreTest(DiscoveryCacheTestCase):
+
+    def test_load_missing(self):
+        T.assert_equal(self.cache.load(self.key), None)
+
+    def test_store_and_load(self):
+        self.cache.store(self.key, self.document, etag='"abc"',
+                         last_modified="Tue, 01 Apr 2014 00:00:00 GMT")
+        entry = self.cache.load(self.key)
+
+        T.assert_equal(entry['document'], self.document)
+        T.assert_equal(entry['etag'], '"abc"')
+        T.assert_equal(entry['last_modified'],
+                       "Tue, 01 Apr 2014 00:00:00 GMT")
+        T.assert_equal(entry['fetched_at'], 1000.0)
+
+    def test_corrupt_entry_ignored(self):
+        self.cache.store(self.key, self.document)
+        with open(self.cache._path_for(self.key), "w") as f:
+            f.write("{not json")
+        T.assert_equal(self.cache.load(self.key), None)
+
+    def test_keys_are_separate(self):
+        self.cache.store(self.key, self.document)
+        T.assert_equal(self.cache.load("other_host:8080"), None)
+
+    def test_no_temp_files_left(self):
+        self.cache.store(self.key, self.document)
+        T.assert_equal(os.listdir(self.cache.cache_dir),
+                       [os.path.basename(self.cache._path_for(self.key))])
+
+    def test_invalidate(self):
+        self.cache.store(self.key, self.document)
+        self.cache.invalidate(self.key)
+        T.assert_equal(self.cache.load(self.key), None)
+
+    def test_invalidate_missing(self):
+        self.cache.invalidate(self.key)
+
+
+class FreshnessTest(DiscoveryCacheTestCase):
+
+    def test_fresh_within_ttl(self):
+        entry = self.cache.store(self.key, self.document)
+        self.mock_time.return_value = 1059.0
+        T.assert_equal(self.cache.is_fresh(entry), True)
+
+    def test_stale_after_ttl(self):
+        entry = self.cache.store(self.key, self.document)
+        self.mock_time.return_value = 1060.0
+        T.assert_equal(self.cache.is_fresh(entry), False)
+
+    def test_touch_refreshes(self):
+        entry = self.cache.store(self.key, self.document)
+        self.mock_time.return_value = 2000.0
+        self.cache.touch(self.key, entry)
+        T.assert_equal(self.cache.load(self.key)['fetched_at'], 2000.0)
+        T.assert_equal(self.cache.is_fresh(entry), True)
+
+
+class ValidatorsTest(DiscoveryCacheTestCase):
+
+    def test_validators(self):
+        entry = {"etag": '"abc"', "last_modified": "yesterday"}
+        expected_headers = {
+            "If-None-Match": '"abc"',
+            "If-Modified-Since": "yesterday",
+        }
+        T.assert_equal(self.cache.validators(entry), expected_headers)
+
+    def test_no_validators(self):
+        entry = {"etag": None, "last_modified": None}
+        T.assert_equal(self.cache.validators(entry), {})
+
+
+class LRUCacheTest(T.TestCase):
+
+    def test_get_put(self):
+        cache = LRUCache(2)
+        cache.put("a", 1)
+        T.assert_equal(cache.get("a"), 1)
+        T.assert_equal(cache.get("b"), None)
+        T.assert_equal(cache.get("b", 2), 2)
+
+    def test_evicts_least_recently_used(self):
+        cache = LRUCache(2)
+        cache.put("a", 1)
+        cache.put("b", 2)
+        cache.get("a")
+        cache.put("c", 3)
+
+        T.assert_equal(len(cache), 2)
+        T.assert_in("a", cache)
+        T.assert_not_in("b", cache)
+        T.assert_in("c", cache)
+
+    def test_put_existing_refreshes(self):
+        cache = LRUCache(2)
+        cache.put("a", 1)
+        cache.put("b", 2)
+        cache.put("a", 10)
+        cache.put("c", 3)
+
+        T.assert_equal(cache.get("a"), 10)
+        T.assert_not_in("b", cache)
+
+    def test_pop_and_clear(self):
+        cache = LRUCache(3)
+        cache.put("a", 1)
+        cache.put("b", 2)
+
+        T.assert_equal(cache.pop("a"), 1)
+        T.assert_equal(cache.pop("a"), None)
+        cache.clear()
+        T.assert_equal(len(cache), 0)
+
+        cache.put("c", 3)
+        T.assert_equal(cache.get("c"), 3)
+
+    def test_keys(self):
+        cache = LRUCache(3)
+        cache.put("a", 1)
+        cache.put("b", 2)
+        T.assert_equal(sorted(cache.keys()), ["a", "b"])
+
+    def test_invalid_size(self):
+        with T.assert_raises(ValueError):
+            LRUCache(0)
+
+
+class ResponseCacheTest(T.TestCase):
+
+    def make_response(self, headers):
+        response = mock.Mock()
+        response.headers = headers
+        return response
+
+    def test_stores_responses_with_validators(self):
+        cache = ResponseCache(2)
+        response = self.make_response({"ETag": '"abc"'})
+        cache.store("/url", response)
+
+        T.assert_equal(cache.get("/url"), response)
+        T.assert_equal(cache.validators(response),
+                       {"If-None-Match": '"abc"'})
+
+    def test_skips_responses_without_validators(self):
+        cache = ResponseCache(2)
+        cache.store("/url", self.make_response({"ETag": '"abc"'}))
+        cache.store("/url", self.make_response({}))
+        T.assert_equal(cache.get("/url"), None)
+
+    def test_invalidate(self):
+        cache = ResponseCache(2)
+        cache.store("/a", self.make_response({"Last-Modified": "x"}))
+        cache.store("/b", self.make_response({"Last-Modified": "x"}))
+
+        cache.invalidate("/a")
+        T.assert_equal(cache.get("/a"), None)
+        cache.invalidate()
+        T.assert_equal(len(cache), 0)
+
+    def test_invalidate_collection(self):
+        cache = ResponseCache(5)
+        for url in ("/nodes", "/nodes/node1", "/nodes?start=0&limit=10",
+                    "/nodes-archive", "/tags"):
+            cache.store(url, self.make_response({"Last-Modified": "x"}))
+
+        cache.invalidate_collection("/nodes")
+        T.assert_equal(sorted(cache._responses.keys()),
+                       ["/nodes-archive", "/tags"])
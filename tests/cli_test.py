@@ -1,33 +1,15 @@
 # -*- coding: utf-8 -*-
-from argparse import ArgumentParser
 from contextlib import contextmanager
+from contextlib import nested
+import json
 import StringIO
 
 import mock
 import testify as T
 
+from py_razor_client import agent
 from py_razor_client import cli
-
-
-class DynamicizeArgParserTest(T.TestCase):
-
-    def test_adds_unknown_opts(self):
-        test_cli = "--valid_argument foo --new-argument bar".split(" ")
-        parser = ArgumentParser()
-        parser.add_argument("--valid_argument")
-
-        test_args = ('--new-argument', )
-        expected_args = (("valid_argument", "foo"),
-                         ('new_argument', "bar"))
-        expected_added_args = ["new_argument", ]
-
-        parser, added_args = cli.dynamicize_argparser(parser, test_args)
-
-        args = parser.parse_args(test_cli)
-        for arg, value in expected_args:
-            T.assert_equal(getattr(args, arg), value)
-
-        T.assert_equal(added_args, expected_added_args)
+from py_razor_client.codec import Codec
 
 
 class FilterForLongOptsTest(T.TestCase):
@@ -117,3 +99,329 @@ class LoadConfigTest(T.TestCase):
                 T.assert_equal(mock_open.call_count, 0)
                 T.assert_equal(mock_exists.call_count, len(cli.RC_LOCATIONS))
                 T.assert_equal(expected_config, actual_config)
+
+
+class MakeDiscoveryCacheTest(T.TestCase):
+
+    def test_defaults(self):
+        cache = cli.make_discovery_cache({})
+        T.assert_equal(cache.cache_dir, cli.DEFAULT_CACHE_DIR)
+        T.assert_equal(cache.ttl, cli.DiscoveryCache.DEFAULT_TTL)
+
+    def test_configured(self):
+        config = {
+            "discovery_cache_dir": "/tmp/razor_cache",
+            "discovery_cache_ttl": "30",
+        }
+        cache = cli.make_discovery_cache(config)
+        T.assert_equal(cache.cache_dir, "/tmp/razor_cache")
+        T.assert_equal(cache.ttl, 30)
+
+    def test_disabled(self):
+        config = {"no_discovery_cache": True}
+        T.assert_equal(cli.make_discovery_cache(config), None)
+
+
+class MakeClientTest(T.TestCase):
+
+    def test_single_server(self):
+        config = {"hostname": "razor", "port": "8080",
+                  "no_discovery_cache": True}
+        with mock.patch("py_razor_client.razor_client.RazorClient") as mock_client:
+            client = cli.make_client(config, pool_size=4)
+
+        T.assert_equal(client, mock_client.return_value)
+        mock_client.assert_called_once_with(
+            "razor", "8080", discover_on_demand=True, pool_size=4,
+            discovery_cache=None, collect_stats=False, codec=None)
+
+    def test_servers(self):
+        config = {"hostname": None, "port": None, "no_discovery_cache": True,
+                  "servers": ["dc1:8080", "dc2:8080"]}
+        with mock.patch("py_razor_client.pool.RazorClientPool") as mock_pool:
+            client = cli.make_client(config, collect_stats=True)
+
+        T.assert_equal(client, mock_pool.return_value)
+        mock_pool.assert_called_once_with(
+            ["dc1:8080", "dc2:8080"], discovery_cache=None,
+            collect_stats=True, codec=None)
+
+    def test_hostname_wins(self):
+        config = {"hostname": "razor", "port": "8080",
+                  "servers": ["dc1:8080"]}
+        T.assert_equal(cli.uses_pool(config), False)
+
+
+class ParseArgsTest(T.TestCase):
+
+    def test_no_unknown_options_parses_once(self):
+        parser = cli.create_parser()
+        with mock.patch.object(parser, "parse_args") as mock_parse_args:
+            args, added_args = cli.parse_args(parser, ["nodes", "node1"])
+
+        T.assert_equal(mock_parse_args.call_count, 0)
+        T.assert_equal(args.collection_or_command, "nodes")
+        T.assert_equal(args.collection_item, "node1")
+        T.assert_equal(added_args, [])
+
+    def test_unknown_options_added(self):
+        parser = cli.create_parser()
+        argv = ["create-repo", "--name", "repo1", "--iso-url", "http://x/y.iso"]
+        args, added_args = cli.parse_args(parser, argv)
+
+        T.assert_equal(args.collection_or_command, "create-repo")
+        T.assert_equal(args.collection_item, None)
+        T.assert_equal(args.name, "repo1")
+        T.assert_equal(args.iso_url, "http://x/y.iso")
+        T.assert_equal(added_args, ["name", "iso_url"])
+
+    def test_unrecognized_arguments(self):
+        parser = cli.create_parser()
+        with mock.patch.object(parser, "error") as mock_error:
+            mock_error.side_effect = SystemExit
+            with T.assert_raises(SystemExit):
+                cli.parse_args(parser, ["nodes", "-z"])
+
+
+class ParseConfigTest(T.TestCase):
+
+    def test_yaml(self):
+        T.assert_equal(cli.parse_config("hostname: razor\nport: 8080\n"),
+                       {"hostname": "razor", "port": 8080})
+
+    def test_json_skips_yaml(self):
+        with mock.patch.dict("sys.modules", {"yaml": None}):
+            config = cli.parse_config('{"hostname": "razor", "port": 8080}')
+        T.assert_equal(config, {"hostname": "razor", "port": 8080})
+
+    def test_yaml_flow_mapping(self):
+        T.assert_equal(cli.parse_config("{hostname: razor}"),
+                       {"hostname": "razor"})
+
+
+class CommandArgumentsTest(T.TestCase):
+
+    def test_collection_arguments(self):
+        parser = cli.create_parser()
+        args, added_args = cli.parse_args(parser, ["nodes", "node1", "log"])
+        positional, keywords = cli.command_arguments(args, added_args)
+        T.assert_equal(positional, ["node1", "log"])
+        T.assert_equal(keywords, {})
+
+    def test_command_arguments(self):
+        parser = cli.create_parser()
+        argv = ["create-repo", "--name", "repo1", "--iso-url", "http://x"]
+        args, added_args = cli.parse_args(parser, argv)
+        positional, keywords = cli.command_arguments(args, added_args)
+        T.assert_equal(positional, [])
+        T.assert_equal(keywords, {"name": "repo1", "iso_url": "http://x"})
+
+
+class DispatchTest(T.TestCase):
+
+    def test_dispatch(self):
+        client = mock.Mock(spec=["sanitize_command_name", "create_repo"])
+        client.sanitize_command_name.side_effect = lambda n: n.replace("-", "_")
+
+        result = cli.dispatch(client, "create-repo", [], {"name": "r"})
+
+        T.assert_equal(result, client.create_repo.return_value)
+        client.create_repo.assert_called_once_with(name="r")
+
+    def test_unknown(self):
+        client = mock.Mock(spec=["sanitize_command_name"])
+        client.sanitize_command_name.side_effect = lambda n: n
+        with T.assert_raises(cli.UnknownCommandException):
+            cli.dispatch(client, "frobnicate", [], {})
+
+
+class RunInProcessTest(T.TestCase):
+
+    @T.setup
+    def make_client(self):
+        self.client = mock.Mock(spec=["sanitize_command_name", "collections",
+                                      "discovery_cache", "discover_methods"])
+        self.client.sanitize_command_name.side_effect = \
+            lambda n: n.replace("-", "_")
+        self.client.collections = set()
+
+        def discover_methods(refresh=False):
+            self.client.collections = set(["brokers"])
+            self.client.brokers = mock.Mock(return_value=iter([]))
+        self.client.discover_methods.side_effect = discover_methods
+
+    def test_rediscovers_unknown_name(self):
+        result = cli.run_in_process(self.client, "brokers", [], {},
+                                    stream=True)
+
+        self.client.discover_methods.assert_called_once_with(refresh=True)
+        T.assert_equal(result, self.client.brokers.return_value)
+        self.client.brokers.assert_called_once_with(stream=True)
+
+    def test_still_unknown(self):
+        with T.assert_raises(cli.UnknownCommandException):
+            cli.run_in_process(self.client, "frobnicate", [], {})
+        T.assert_equal(self.client.discover_methods.call_count, 1)
+
+    def test_no_discovery_cache(self):
+        self.client.discovery_cache = None
+        with T.assert_raises(cli.UnknownCommandException):
+            cli.run_in_process(self.client, "brokers", [], {})
+        T.assert_equal(self.client.discover_methods.called, False)
+
+
+class MainTest(T.TestCase):
+
+    @T.setup_teardown
+    def mock_client(self):
+        with mock.patch("py_razor_client.cli.make_client") as self.mock_make_client:
+            with mock.patch("py_razor_client.cli.load_config") as self.mock_load_config:
+                with mock.patch("py_razor_client.agent.forward") as self.mock_forward:
+                    self.mock_load_config.return_value = {}
+                    self.mock_forward.side_effect = \
+                        agent.AgentUnavailableException()
+                    self.client = self.mock_make_client.return_value
+                    self.client.codec = Codec()
+                    self.client.sanitize_command_name.side_effect = \
+                        lambda n: n.replace("-", "_")
+                    yield
+
+    def test_runs_command(self):
+        self.client.nodes.return_value = [{"name": "node1"}]
+        stdout = StringIO.StringIO()
+        with mock.patch("sys.stdout", stdout):
+            status = cli.main(["--url", "http://razor:8080", "nodes", "node1"])
+
+        T.assert_equal(status, 0)
+        self.client.nodes.assert_called_once_with("node1")
+        T.assert_equal(stdout.getvalue(), "[{'name': 'node1'}]\n")
+        config = self.mock_make_client.call_args[0][0]
+        T.assert_equal((config['hostname'], config['port']),
+                       ("razor", "8080"))
+
+    def test_timings(self):
+        self.client.stats.format_table.return_value = "the table"
+        stderr = StringIO.StringIO()
+        with nested(mock.patch("sys.stdout", StringIO.StringIO()),
+                    mock.patch("sys.stderr", stderr)):
+            cli.main(["--url", "http://razor:8080", "--timings", "nodes"])
+
+        T.assert_equal(stderr.getvalue(), "the table\n")
+        T.assert_equal(self.mock_make_client.call_args[1],
+                       {"collect_stats": True})
+
+    def test_forwards_to_agent(self):
+        self.mock_forward.side_effect = None
+        self.mock_forward.return_value = [{"name": "node1"}]
+        stdout = StringIO.StringIO()
+        with mock.patch("sys.stdout", stdout):
+            status = cli.main(["--url", "http://razor:8080", "nodes", "node1"])
+
+        T.assert_equal(status, 0)
+        T.assert_equal(self.mock_make_client.called, False)
+        T.assert_equal(stdout.getvalue(), "[{'name': 'node1'}]\n")
+        request = self.mock_forward.call_args[0][0]
+        T.assert_equal(request, agent.make_request("razor", "8080", "nodes",
+                                                   ["node1"], {}))
+
+    def test_agent_unknown_command(self):
+        self.mock_forward.side_effect = agent.AgentError(
+            "frobnicate", "UnknownCommandException")
+        with nested(mock.patch("sys.stderr", StringIO.StringIO()),
+                    T.assert_raises(SystemExit)):
+            cli.main(["--url", "http://razor:8080", "frobnicate"])
+        T.assert_equal(self.mock_make_client.called, False)
+
+    def test_agent_error(self):
+        self.mock_forward.side_effect = agent.AgentError(
+            "The agent didn't answer within 300 seconds")
+        stderr = StringIO.StringIO()
+        with nested(mock.patch("sys.stderr", stderr),
+                    T.assert_raises(SystemExit)):
+            cli.main(["--url", "http://razor:8080", "nodes"])
+        T.assert_in("The agent didn't answer within 300 seconds",
+                    stderr.getvalue())
+
+    def test_agent_timeout(self):
+        self.mock_forward.side_effect = None
+        self.mock_load_config.return_value = {"agent_timeout": 30}
+        with mock.patch("sys.stdout", StringIO.StringIO()):
+            cli.main(["--url", "http://razor:8080", "nodes"])
+        T.assert_equal(self.mock_forward.call_args[1], {"timeout": 30.0})
+
+    def test_no_agent(self):
+        with mock.patch("sys.stdout", StringIO.StringIO()):
+            cli.main(["--url", "http://razor:8080", "--no-agent", "nodes"])
+
+        T.assert_equal(self.mock_forward.called, False)
+        self.client.nodes.assert_called_once_with()
+
+    def test_format(self):
+        self.client.collections = set(["nodes"])
+        self.client.nodes.return_value = iter([{"name": "node1"},
+                                               {"name": "node2"}])
+        self.mock_forward.side_effect = None
+        stdout = StringIO.StringIO()
+        with mock.patch("sys.stdout", stdout):
+            status = cli.main(["--url", "http://razor:8080",
+                               "--format", "ndjson", "nodes"])
+
+        T.assert_equal(status, 0)
+        # Listings are streamed in-process even with an agent running
+        T.assert_equal(self.mock_forward.called, False)
+        self.client.nodes.assert_called_once_with(stream=True)
+        T.assert_equal(stdout.getvalue(),
+                       '{"name": "node1"}\n{"name": "node2"}\n')
+
+    def test_format_member(self):
+        self.client.collections = set(["nodes"])
+        self.client.nodes.return_value = {"name": "node1"}
+        stdout = StringIO.StringIO()
+        with mock.patch("sys.stdout", stdout):
+            cli.main(["--url", "http://razor:8080", "--no-agent",
+                      "--format", "json", "nodes", "node1"])
+
+        self.client.nodes.assert_called_once_with("node1")
+        T.assert_equal(stdout.getvalue(), '{"name": "node1"}\n')
+
+    def test_format_forwarded(self):
+        self.mock_forward.side_effect = None
+        self.mock_forward.return_value = {"name": "node1"}
+        stdout = StringIO.StringIO()
+        with mock.patch("sys.stdout", stdout):
+            cli.main(["--url", "http://razor:8080", "--format", "table",
+                      "nodes", "node1"])
+
+        T.assert_equal(self.mock_make_client.called, False)
+        T.assert_equal(stdout.getvalue(), "KEY   VALUE\nname  node1\n")
+
+    def test_servers_skip_agent(self):
+        with mock.patch("py_razor_client.cli.load_config") as mock_load_config:
+            mock_load_config.return_value = {"servers": ["dc1:8080",
+                                                         "dc2:8080"]}
+            with mock.patch("sys.stdout", StringIO.StringIO()):
+                status = cli.main(["nodes"])
+
+        T.assert_equal(status, 0)
+        T.assert_equal(self.mock_forward.called, False)
+        self.client.nodes.assert_called_once_with()
+
+    def test_batch(self):
+        self.client.nodes.return_value = [{"name": "node1"}]
+        stdout = StringIO.StringIO()
+        with nested(mock.patch("sys.stdout", stdout),
+                    mock.patch("sys.stdin", StringIO.StringIO("nodes\nnodes node1\n"))):
+            status = cli.main(["--url", "http://razor:8080", "--batch", "-"])
+
+        T.assert_equal(status, 0)
+        T.assert_equal(self.mock_make_client.call_count, 1)
+        T.assert_equal(self.mock_forward.called, False)
+        T.assert_equal([json.loads(line)['line']
+                        for line in stdout.getvalue().splitlines()], [1, 2])
+        T.assert_equal(self.client.nodes.call_args_list,
+                       [mock.call(), mock.call("node1")])
+
+    def test_batch_with_command(self):
+        with nested(mock.patch("sys.stderr", StringIO.StringIO()),
+                    T.assert_raises(SystemExit)):
+            cli.main(["--url", "http://razor:8080", "--batch", "-", "nodes"])
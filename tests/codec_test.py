@@ -0,0 +1,83 @@
+# -*- coding: utf-8 -*-
+import mock
+import testify as T
+
+from py_razor_client import codec
+
+
+class CodecTestCase(T.TestCase):
+
+    @T.setup_teardown
+    def reset_default(self):
+        with mock.patch.object(codec, "_default_codec", None):
+            yield
+
+
+class DefaultCodecTest(CodecTestCase):
+
+    def test_prefers_fastest_installed(self):
+        fake_simplejson = mock.Mock()
+        with mock.patch.dict("sys.modules", {"simplejson": fake_simplejson}):
+            T.assert_equal(codec.default_codec().name, "simplejson")
+
+    def test_falls_back_to_stdlib(self):
+        with mock.patch.dict("sys.modules", {"simplejson": None,
+                                             "ujson": None}):
+            T.assert_equal(codec.default_codec().name, "json")
+
+    def test_chosen_once(self):
+        T.assert_is(codec.default_codec(), codec.default_codec())
+
+
+class GetCodecTest(CodecTestCase):
+
+    def test_default(self):
+        T.assert_is(codec.get_codec(), codec.default_codec())
+
+    def test_by_name(self):
+        T.assert_isinstance(codec.get_codec("json"), codec.Codec)
+
+    def test_codec_object(self):
+        json_codec = codec.Codec()
+        T.assert_is(codec.get_codec(json_codec), json_codec)
+
+    def test_unknown(self):
+        with T.assert_raises(codec.UnknownCodecException):
+            codec.get_codec("yaml")
+
+    def test_missing_library(self):
+        with mock.patch.dict("sys.modules", {"ujson": None}):
+            with T.assert_raises(ImportError):
+                codec.get_codec("ujson")
+
+
+class CodecRoundTripTest(T.TestCase):
+
+    DOCUMENT = {"name": u"n\xf6de1", "url": "http://razor/api",
+                "tags": [1, 2.5, None, True]}
+
+    def round_trip(self, name):
+        try:
+            json_codec = codec.get_codec(name)
+        except ImportError:
+            return  # not installed here
+        encoded = json_codec.dumps(self.DOCUMENT)
+        T.assert_not_in("\\/", encoded)
+        T.assert_equal(json_codec.loads(encoded), self.DOCUMENT)
+        decoded = json_codec.loads(encoded.encode("utf-8")
+                                   if isinstance(encoded, unicode)
+                                   else encoded)
+        T.assert_equal(decoded, self.DOCUMENT)
+        # As from the standard library, even for ASCII-only strings
+        T.assert_equal(
+            [type(string) for string in (decoded.keys() + [decoded['url']])],
+            [unicode] * (len(self.DOCUMENT) + 1))
+
+    def test_json(self):
+        self.round_trip("json")
+
+    def test_simplejson(self):
+        self.round_trip("simplejson")
+
+    def test_ujson(self):
+        self.round_trip("ujson")
@@ -0,0 +1,209 @@
+# -*- coding: utf-8 -*-
+import threading
+import time
+
+import mock
+import testify as T
+
+from py_razor_client import concurrency
+
+
+class FutureTest(T.TestCase):
+
+    def test_result(self):
+        future = concurrency.Future()
+        future.set_result(mock.sentinel.result)
+        T.assert_equal(future.done(), True)
+        T.assert_equal(future.result(), mock.sentinel.result)
+        T.assert_equal(future.exception(), None)
+
+    def test_exception(self):
+        future = concurrency.Future()
+        error = ValueError("nope")
+        future.set_exception(error)
+        T.assert_equal(future.exception(), error)
+        with T.assert_raises(ValueError):
+            future.result()
+
+    def test_timeout(self):
+        future = concurrency.Future()
+        with T.assert_raises(concurrency.TimeoutError):
+            future.result(timeout=0.01)
+
+    def test_callbacks(self):
+        future = concurrency.Future()
+        before = mock.Mock()
+        after = mock.Mock()
+
+        future.add_done_callback(before)
+        T.assert_equal(before.call_count, 0)
+        future.set_result(None)
+        future.add_done_callback(after)
+
+        before.assert_called_once_with(future)
+        after.assert_called_once_with(future)
+
+
+class WorkerPoolTest(T.TestCase):
+
+    @T.setup_teardown
+    def create_pool(self):
+        self.pool = concurrency.WorkerPool(4)
+        yield
+        self.pool.shutdown()
+
+    def test_submit(self):
+        future = self.pool.submit(lambda a, b=0: a + b, 1, b=2)
+        T.assert_equal(future.result(), 3)
+
+    def test_submit_exception(self):
+        def fail():
+            raise KeyError("x")
+        with T.assert_raises(KeyError):
+            self.pool.submit(fail).result()
+
+    def test_map_preserves_order(self):
+        futures = self.pool.map(lambda x: x * 2, range(20))
+        T.assert_equal(concurrency.gather(futures), range(0, 40, 2))
+
+    def test_runs_concurrently(self):
+        barrier_count = [0]
+        lock = threading.Lock()
+        all_arrived = threading.Event()
+
+        def arrive():
+            with lock:
+                barrier_count[0] += 1
+                if barrier_count[0] == 4:
+                    all_arrived.set()
+            return all_arrived.wait(1) or all_arrived.is_set()
+
+        futures = [self.pool.submit(arrive) for _ in range(4)]
+        T.assert_equal(concurrency.gather(futures), [True] * 4)
+
+    def test_bounded_threads(self):
+        futures = self.pool.map(lambda x: x, range(50))
+        concurrency.gather(futures)
+        T.assert_lte(len(self.pool._threads), 4)
+
+    def test_submit_after_shutdown(self):
+        self.pool.shutdown()
+        with T.assert_raises(RuntimeError):
+            self.pool.submit(lambda: None)
+
+    def test_invalid_size(self):
+        with T.assert_raises(ValueError):
+            concurrency.WorkerPool(0)
+
+
+class MapOutcomesTest(T.TestCase):
+
+    def test_outcomes_in_order(self):
+        def halve(x):
+            if x % 2:
+                raise ValueError(x)
+            return x // 2
+
+        outcomes = concurrency.map_outcomes(halve, range(6), 3)
+
+        T.assert_equal([result for result, _ in outcomes],
+                       [0, None, 1, None, 2, None])
+        T.assert_equal([type(exception) for _, exception in outcomes],
+                       [type(None), ValueError] * 3)
+
+    def test_no_items(self):
+        T.assert_equal(concurrency.map_outcomes(lambda x: x, [], 3), [])
+
+    def test_workers_stopped(self):
+        pools = []
+        worker_pool_class = concurrency.WorkerPool
+
+        def make_pool(max_workers):
+            pools.append(worker_pool_class(max_workers))
+            return pools[-1]
+
+        with mock.patch.object(concurrency, "WorkerPool",
+                               side_effect=make_pool):
+            concurrency.map_outcomes(lambda x: x, range(10), 20)
+        pool, = pools
+        T.assert_equal(pool.max_workers, 10)
+        T.assert_equal([thread.is_alive() for thread in pool._threads],
+                       [False] * len(pool._threads))
+
+
+class SingleFlightTest(T.TestCase):
+
+    @T.setup
+    def create_flights(self):
+        self.flights = concurrency.SingleFlight()
+        self.release = threading.Event()
+        self.calls = []
+
+    def slow_call(self):
+        self.calls.append(None)
+        self.release.wait(1)
+        return len(self.calls)
+
+    def run_in_threads(self, fn, count):
+        results = [None] * count
+
+        def run(i):
+            try:
+                results[i] = fn()
+            except Exception as e:
+                results[i] = e
+        threads = [threading.Thread(target=run, args=(i,))
+                   for i in range(count)]
+        for thread in threads:
+            thread.start()
+        return threads, results
+
+    def test_coalesces_concurrent_calls(self):
+        threads, results = self.run_in_threads(
+            lambda: self.flights.do("key", self.slow_call), 5)
+        time.sleep(0.1)
+        self.release.set()
+        for thread in threads:
+            thread.join()
+        T.assert_equal(len(self.calls), 1)
+        T.assert_equal(results, [1] * 5)
+
+    def test_shares_exceptions(self):
+        def fail():
+            self.release.wait(1)
+            raise KeyError("k")
+        threads, results = self.run_in_threads(
+            lambda: self.flights.do("key", fail), 3)
+        time.sleep(0.1)
+        self.release.set()
+        for thread in threads:
+            thread.join()
+        T.assert_equal([type(result) for result in results], [KeyError] * 3)
+
+    def test_different_keys(self):
+        T.assert_equal(self.flights.do("a", lambda: 1), 1)
+        T.assert_equal(self.flights.do("b", lambda: 2), 2)
+
+    def test_later_calls_start_new_flights(self):
+        self.release.set()
+        T.assert_equal(self.flights.do("key", self.slow_call), 1)
+        T.assert_equal(self.flights.do("key", self.slow_call), 2)
+
+    def test_forget(self):
+        threads, _ = self.run_in_threads(
+            lambda: self.flights.do("key", self.slow_call), 1)
+        time.sleep(0.1)
+        self.flights.forget()
+        self.release.set()
+        self.flights.do("key", self.slow_call)
+        threads[0].join()
+        T.assert_equal(len(self.calls), 2)
+
+    def test_follower_timeout(self):
+        threads, _ = self.run_in_threads(
+            lambda: self.flights.do("key", self.slow_call), 1)
+        time.sleep(0.1)
+        with T.assert_raises(concurrency.TimeoutError):
+            self.flights.do("key", self.slow_call, timeout=0.05)
+        self.release.set()
+        threads[0].join()
@@ -0,0 +1,93 @@
+# -*- coding: utf-8 -*-
+import threading
+
+import mock
+import testify as T
+
+from py_razor_client import deadline
+
+
+class DeadlineTestCase(T.TestCase):
+
+    @T.setup_teardown
+    def mock_time(self):
+        with mock.patch("py_razor_client.deadline.time.time") as self.mock_time:
+            self.mock_time.return_value = 100.0
+            yield
+
+
+class DeadlineTest(DeadlineTestCase):
+
+    def test_remaining(self):
+        current = deadline.Deadline(5)
+        self.mock_time.return_value = 102.0
+        T.assert_equal(current.remaining(), 3.0)
+        T.assert_equal(current.expired(), False)
+        current.check()
+
+    def test_expired(self):
+        current = deadline.Deadline(5)
+        self.mock_time.return_value = 106.0
+        T.assert_equal(current.remaining(), 0.0)
+        T.assert_equal(current.expired(), True)
+        with T.assert_raises(deadline.DeadlineExceeded):
+            current.check()
+
+
+class DeadlineContextTest(DeadlineTestCase):
+
+    def test_sets_and_restores(self):
+        T.assert_equal(deadline.current_deadline(), None)
+        with deadline.deadline(5) as current:
+            T.assert_equal(deadline.current_deadline(), current)
+        T.assert_equal(deadline.current_deadline(), None)
+
+    def test_nested_tightens(self):
+        with deadline.deadline(5) as outer:
+            with deadline.deadline(10) as inner:
+                T.assert_equal(inner, outer)
+            with deadline.deadline(1) as inner:
+                T.assert_equal(inner.expires_at, 101.0)
+            T.assert_equal(deadline.current_deadline(), outer)
+
+    def test_thread_local(self):
+        seen = []
+        with deadline.deadline(5):
+            thread = threading.Thread(
+                target=lambda: seen.append(deadline.current_deadline()))
+            thread.start()
+            thread.join()
+        T.assert_equal(seen, [None])
+
+    def test_propagate(self):
+        seen = []
+        with deadline.deadline(5) as current:
+            fn = deadline.propagate(
+                lambda: seen.append(deadline.current_deadline()))
+        thread = threading.Thread(target=fn)
+        thread.start()
+        thread.join()
+        T.assert_equal(seen, [current])
+
+    def test_propagate_without_deadline(self):
+        fn = lambda: None
+        T.assert_equal(deadline.propagate(fn), fn)
+
+
+class TimeoutWithinDeadlineTest(DeadlineTestCase):
+
+    def test_no_deadline(self):
+        T.assert_equal(deadline.timeout_within_deadline(), None)
+        T.assert_equal(deadline.timeout_within_deadline(3), 3)
+
+    def test_deadline(self):
+        with deadline.deadline(5):
+            T.assert_equal(deadline.timeout_within_deadline(), 5.0)
+            T.assert_equal(deadline.timeout_within_deadline(3), 3)
+            T.assert_equal(deadline.timeout_within_deadline(30), 5.0)
+
+    def test_expired(self):
+        with deadline.deadline(5):
+            self.mock_time.return_value = 105.0
+            with T.assert_raises(deadline.DeadlineExceeded):
+                deadline.timeout_within_deadline(3)
@@ -0,0 +1,150 @@
+# -*- coding: utf-8 -*-
+import threading
+
+import mock
+import testify as T
+
+from py_razor_client.deadline import deadline
+from py_razor_client.deadline import DeadlineExceeded
+from py_razor_client.governor import AdaptiveLimiter
+from py_razor_client.governor import COMMAND
+from py_razor_client.governor import ConcurrencyGovernor
+from py_razor_client.governor import READ
+
+
+class AdaptiveLimiterTestCase(T.TestCase):
+
+    @T.setup_teardown
+    def mock_time(self):
+        self.now = 1000.0
+        with mock.patch("py_razor_client.governor.time") as mock_time:
+            mock_time.time.side_effect = lambda: self.now
+            yield
+
+    def run_round(self, limiter, latency, overloaded=False):
+        """Fills the limiter, then finishes every request after latency."""
+        tokens = [limiter.acquire() for _ in range(limiter.limit)]
+        self.now += latency
+        for token in tokens:
+            limiter.release(token, overloaded)
+
+
+class AdditiveIncreaseTest(AdaptiveLimiterTestCase):
+
+    def test_grows_while_busy(self):
+        limiter = AdaptiveLimiter(initial=4)
+        for _ in range(6):
+            self.run_round(limiter, 0.1)
+        T.assert_equal(limiter.limit, 6)
+
+    def test_maximum(self):
+        limiter = AdaptiveLimiter(initial=4, maximum=5)
+        for _ in range(10):
+            self.run_round(limiter, 0.1)
+        T.assert_equal(limiter.limit, 5)
+
+    def test_unsaturated(self):
+        limiter = AdaptiveLimiter(initial=4)
+        for _ in range(20):
+            token = limiter.acquire()
+            self.now += 0.1
+            limiter.release(token)
+        T.assert_equal(limiter.limit, 4)
+
+
+class MultiplicativeDecreaseTest(AdaptiveLimiterTestCase):
+
+    def test_overload(self):
+        limiter = AdaptiveLimiter(initial=8)
+        self.run_round(limiter, 0.1, overloaded=True)
+        # Only once for the whole round trip
+        T.assert_equal(limiter.limit, 4)
+        self.run_round(limiter, 0.1, overloaded=True)
+        T.assert_equal(limiter.limit, 2)
+
+    def test_latency_spike(self):
+        limiter = AdaptiveLimiter(initial=8)
+        self.run_round(limiter, 0.1)
+        self.run_round(limiter, 1.0)
+        T.assert_equal(limiter.limit, 4)
+
+    def test_jitter_within_slack(self):
+        limiter = AdaptiveLimiter(initial=8, slack=0.01)
+        self.run_round(limiter, 0.001)
+        self.run_round(limiter, 0.005)
+        T.assert_gte(limiter.limit, 8)
+
+    def test_minimum(self):
+        limiter = AdaptiveLimiter(initial=2, minimum=1)
+        for _ in range(5):
+            self.run_round(limiter, 0.1, overloaded=True)
+        T.assert_equal(limiter.limit, 1)
+
+
+class AcquireTest(T.TestCase):
+
+    def test_waits_for_a_slot(self):
+        limiter = AdaptiveLimiter(initial=1)
+        token = limiter.acquire()
+        acquired = threading.Event()
+
+        def acquire():
+            limiter.release(limiter.acquire())
+            acquired.set()
+
+        thread = threading.Thread(target=acquire)
+        thread.daemon = True
+        thread.start()
+        T.assert_equal(acquired.wait(0.05), False)
+        limiter.release(token)
+        T.assert_equal(acquired.wait(5), True)
+        T.assert_equal(limiter.in_flight, 0)
+
+    def test_deadline(self):
+        limiter = AdaptiveLimiter(initial=1)
+        limiter.acquire()
+        with deadline(0.01):
+            with T.assert_raises(DeadlineExceeded):
+                limiter.acquire()
+        T.assert_equal(limiter.in_flight, 1)
+
+
+class ConcurrencyGovernorTest(T.TestCase):
+
+    def test_separate_budgets(self):
+        governor = ConcurrencyGovernor()
+        T.assert_is(governor.limiter(READ), governor.reads)
+        T.assert_is(governor.limiter(COMMAND), governor.commands)
+        T.assert_is_not(governor.reads, governor.commands)
+
+    def test_unknown_kind(self):
+        with T.assert_raises(ValueError):
+            ConcurrencyGovernor().limiter("other")
+
+    def test_governed(self):
+        governor = ConcurrencyGovernor(reads=AdaptiveLimiter(initial=4))
+        send = mock.Mock()
+        send.return_value.status_code = 200
+
+        response = governor.governed(READ, send)("http://razor/api", x=1)
+
+        T.assert_equal(response, send.return_value)
+        send.assert_called_once_with("http://razor/api", x=1)
+        T.assert_equal(governor.reads.in_flight, 0)
+
+    def test_overload_status(self):
+        governor = ConcurrencyGovernor(reads=AdaptiveLimiter(initial=4))
+        send = mock.Mock()
+        send.return_value.status_code = 503
+
+        governor.governed(READ, send)()
+        T.assert_equal(governor.reads.limit, 2)
+
+    def test_exception(self):
+        governor = ConcurrencyGovernor(commands=AdaptiveLimiter(initial=4))
+        send = mock.Mock(side_effect=IOError("connection refused"))
+
+        with T.assert_raises(IOError):
+            governor.governed(COMMAND, send)()
+        T.assert_equal(governor.commands.limit, 2)
+        T.assert_equal(governor.commands.in_flight, 0)
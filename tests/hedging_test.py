@@ -0,0 +1,101 @@
+# -*- coding: utf-8 -*-
+import threading
+
+import testify as T
+
+from py_razor_client.deadline import Deadline
+from py_razor_client.deadline import DeadlineExceeded
+from py_razor_client import hedging
+
+
+class LatencyTrackerTest(T.TestCase):
+
+    def test_empty(self):
+        T.assert_equal(hedging.LatencyTracker().percentile(95), None)
+
+    def test_percentiles(self):
+        tracker = hedging.LatencyTracker()
+        for latency in range(1, 101):
+            tracker.record(latency)
+        T.assert_equal(tracker.percentile(0), 1)
+        T.assert_equal(tracker.percentile(50), 51)
+        T.assert_equal(tracker.percentile(95), 95)
+        T.assert_equal(tracker.percentile(100), 100)
+
+    def test_window(self):
+        tracker = hedging.LatencyTracker(window=2)
+        for latency in (100, 1, 2):
+            tracker.record(latency)
+        T.assert_equal(len(tracker), 2)
+        T.assert_equal(tracker.percentile(100), 2)
+
+    def test_timed(self):
+        tracker = hedging.LatencyTracker()
+        T.assert_equal(hedging.timed(lambda x: x, tracker)(3), 3)
+        T.assert_equal(len(tracker), 1)
+
+
+class HedgedCallTest(T.TestCase):
+
+    def make_attempts(self, *behaviours):
+        """Returns a callable that behaves like each given function in turn."""
+        lock = threading.Lock()
+        calls = []
+
+        def fn():
+            with lock:
+                behaviour = behaviours[len(calls)]
+                calls.append(behaviour)
+            return behaviour()
+        return fn, calls
+
+    def test_fast_answer_not_hedged(self):
+        fn, calls = self.make_attempts(lambda: "first")
+        T.assert_equal(hedging.hedged_call(fn, 1), "first")
+        T.assert_equal(len(calls), 1)
+
+    def test_slow_answer_hedged(self):
+        release = threading.Event()
+
+        def slow():
+            release.wait(2)
+            return "slow"
+
+        fn, calls = self.make_attempts(slow, lambda: "hedge")
+        try:
+            T.assert_equal(hedging.hedged_call(fn, 0.01), "hedge")
+        finally:
+            release.set()
+        T.assert_equal(len(calls), 2)
+
+    def test_failure_before_hedge(self):
+        def fail():
+            raise ValueError("nope")
+
+        fn, calls = self.make_attempts(fail)
+        with T.assert_raises(ValueError):
+            hedging.hedged_call(fn, 1)
+
+    def test_hedge_survives_failure(self):
+        release = threading.Event()
+
+        def slow_failure():
+            release.wait(2)
+            raise ValueError("nope")
+
+        def slow_success():
+            release.set()
+            return "hedge"
+
+        fn, calls = self.make_attempts(slow_failure, slow_success)
+        T.assert_equal(hedging.hedged_call(fn, 0.01), "hedge")
+
+    def test_deadline(self):
+        release = threading.Event()
+        fn, calls = self.make_attempts(lambda: release.wait(2),
+                                       lambda: release.wait(2))
+        try:
+            with T.assert_raises(DeadlineExceeded):
+                hedging.hedged_call(fn, 0.01, Deadline(0.05))
+        finally:
+            release.set()
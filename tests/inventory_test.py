@@ -0,0 +1,229 @@
+# -*- coding: utf-8 -*-
+import os
+import shutil
+import tempfile
+import threading
+
+import testify as T
+
+from py_razor_client.inventory import ANY
+from py_razor_client.inventory import Inventory
+from py_razor_client.razor_client import RazorClient
+
+
+def make_stub(collection, name):
+    return {"name": name,
+            "id": "http://razor/api/collections/%s/%s" % (collection, name)}
+
+
+def make_node(name, tags=(), policy=None, facts=None):
+    return {
+        "name": name,
+        "tags": [make_stub("tags", tag) for tag in tags],
+        "policy": make_stub("policies", policy) if policy else None,
+        "facts": facts or {},
+    }
+
+
+class FakeRazor(object):
+    """Serves documents to get_if_modified the way Razor would, with an
+    ETag per document that changes whenever the document does.
+    """
+
+    def __init__(self):
+        self.documents = {}
+        self.versions = {}
+        self.requests = []
+        self.failing = set()
+        self.send_etags = True
+        self._lock = threading.Lock()
+
+    def put(self, url, document):
+        self.documents[url] = document
+        self.versions[url] = self.versions.get(url, 0) + 1
+
+    def delete(self, url):
+        del self.documents[url]
+
+    def set_nodes(self, *nodes):
+        for node in nodes:
+            self.put(make_stub("nodes", node['name'])['id'], node)
+        self.put("http://razor/api/collections/nodes",
+                 {"items": [make_stub("nodes", node['name'])
+                            for node in nodes]})
+
+    def get_if_modified(self, url, etag=None, last_modified=None):
+        with self._lock:
+            self.requests.append((url, etag))
+        if url in self.failing:
+            raise ValueError("500 Server Error")
+        if not self.send_etags:
+            return self.documents[url], None, None
+        current_etag = '"%d"' % self.versions[url]
+        if etag == current_etag:
+            return None
+        return self.documents[url], current_etag, None
+
+
+class InventoryTestCase(T.TestCase):
+
+    @T.setup_teardown
+    def make_inventory(self):
+        self.razor = FakeRazor()
+        self.client = RazorClient("razor", 80, lazy_discovery=True,
+                                  pool_size=4)
+        self.client._collection_urls['nodes'] = \
+            "http://razor/api/collections/nodes"
+        self.client.get_if_modified = self.razor.get_if_modified
+        self.inventory = Inventory(self.client)
+        yield
+        self.inventory.close()
+
+    def sync(self, **kwargs):
+        return self.inventory.sync(collections=["nodes"], **kwargs)
+
+
+class SyncTest(InventoryTestCase):
+
+    def test_initial_sync(self):
+        self.razor.set_nodes(make_node("node1", ["tag1"], "policy1"),
+                             make_node("node2"))
+        result = self.sync()
+
+        T.assert_equal(sorted(result.added),
+                       [("nodes", "node1"), ("nodes", "node2")])
+        T.assert_equal(self.inventory.names("nodes"), ["node1", "node2"])
+        T.assert_equal(self.inventory.get("nodes", "node1"),
+                       make_node("node1", ["tag1"], "policy1"))
+        T.assert_equal(self.inventory.get("nodes", "node3"), None)
+
+    def test_unchanged_resync_transfers_nothing(self):
+        self.razor.set_nodes(make_node("node1"), make_node("node2"))
+        self.sync()
+        del self.razor.requests[:]
+
+        result = self.sync()
+
+        T.assert_equal(result.unchanged, 2)
+        T.assert_equal((result.added, result.changed, result.removed),
+                       ([], [], []))
+        # Every request revalidated what was stored
+        T.assert_equal(len(self.razor.requests), 3)
+        T.assert_equal(all(etag for _, etag in self.razor.requests), True)
+
+    def test_changed_member(self):
+        self.razor.set_nodes(make_node("node1", ["tag1"]), make_node("node2"))
+        self.sync()
+        node1 = make_stub("nodes", "node1")['id']
+        self.razor.put(node1, make_node("node1", ["tag2"]))
+
+        result = self.sync()
+
+        T.assert_equal(result.changed, [("nodes", "node1")])
+        T.assert_equal(result.unchanged, 1)
+        T.assert_equal(self.inventory.find_nodes(tags=["tag1"]), [])
+        T.assert_equal(self.inventory.find_nodes(tags=["tag2"]), ["node1"])
+
+    def test_added_and_removed_members(self):
+        self.razor.set_nodes(make_node("node1"), make_node("node2"))
+        self.sync()
+        self.razor.set_nodes(make_node("node2"), make_node("node3"))
+
+        result = self.sync()
+
+        T.assert_equal(result.added, [("nodes", "node3")])
+        T.assert_equal(result.removed, [("nodes", "node1")])
+        T.assert_equal(self.inventory.names("nodes"), ["node2", "node3"])
+        T.assert_equal(self.inventory.find_nodes(policy=None),
+                       ["node2", "node3"])
+
+    def test_max_age_skips_recently_checked(self):
+        self.razor.set_nodes(make_node("node1"))
+        self.sync()
+        del self.razor.requests[:]
+
+        result = self.sync(max_age=3600)
+
+        T.assert_equal(result.unchanged, 1)
+        T.assert_equal([url for url, _ in self.razor.requests],
+                       ["http://razor/api/collections/nodes"])
+
+    def test_failed_member_kept(self):
+        self.razor.set_nodes(make_node("node1", ["tag1"]))
+        self.sync()
+        node1 = make_stub("nodes", "node1")['id']
+        self.razor.put(node1, make_node("node1", ["tag2"]))
+        self.razor.failing.add(node1)
+
+        result = self.sync()
+
+        T.assert_equal([error[:2] for error in result.errors],
+                       [("nodes", "node1")])
+        T.assert_equal(self.inventory.find_nodes(tags=["tag1"]), ["node1"])
+
+    def test_failed_new_member_retried(self):
+        self.razor.set_nodes(make_node("node1"), make_node("node2"))
+        node2 = make_stub("nodes", "node2")['id']
+        self.razor.failing.add(node2)
+        self.sync()
+        T.assert_equal(self.inventory.names("nodes"), ["node1"])
+
+        self.razor.failing.clear()
+        result = self.sync()
+
+        T.assert_equal(result.added, [("nodes", "node2")])
+        T.assert_equal(self.inventory.names("nodes"), ["node1", "node2"])
+
+    def test_persists_between_instances(self):
+        self.razor.set_nodes(make_node("node1", ["tag1"]))
+        tempdir = tempfile.mkdtemp()
+        try:
+            path = os.path.join(tempdir, "inventory.sqlite")
+            with Inventory(self.client, path) as inventory:
+                inventory.sync(collections=["nodes"])
+            del self.razor.requests[:]
+
+            with Inventory(self.client, path) as inventory:
+                T.assert_equal(inventory.find_nodes(tags=["tag1"]), ["node1"])
+                result = inventory.sync(collections=["nodes"])
+            T.assert_equal(result.unchanged, 1)
+        finally:
+            shutil.rmtree(tempdir)
+
+
+class FindNodesTest(InventoryTestCase):
+
+    @T.setup
+    def populate(self):
+        self.razor.set_nodes(
+            make_node("node1", ["tag1", "tag2"], "policy1",
+                      {"cpus": 4, "os": "linux"}),
+            make_node("node2", ["tag1"], None, {"cpus": 8}),
+            make_node("node3", [], None, {"os": "linux"}),
+        )
+        self.sync()
+
+    def test_everything(self):
+        T.assert_equal(self.inventory.find_nodes(),
+                       ["node1", "node2", "node3"])
+
+    def test_tags(self):
+        T.assert_equal(self.inventory.find_nodes(tags=["tag1"]),
+                       ["node1", "node2"])
+        T.assert_equal(self.inventory.find_nodes(tags=["tag1", "tag2"]),
+                       ["node1"])
+
+    def test_tag_and_no_policy(self):
+        T.assert_equal(self.inventory.find_nodes(tags=["tag1"], policy=None),
+                       ["node2"])
+
+    def test_policy(self):
+        T.assert_equal(self.inventory.find_nodes(policy="policy1"), ["node1"])
+
+    def test_facts(self):
+        T.assert_equal(self.inventory.find_nodes(facts={"os": "linux"}),
+                       ["node1", "node3"])
+        T.assert_equal(self.inventory.find_nodes(facts={"cpus": 8}),
+                       ["node2"])
+        T.assert_equal(self.inventory.find_nodes(facts={"cpus": ANY}),
+                       ["node1", "node2"])
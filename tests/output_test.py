@@ -0,0 +1,94 @@
+# -*- coding: utf-8 -*-
+import json
+import StringIO
+
+import mock
+import testify as T
+
+from py_razor_client import output
+from py_razor_client.codec import Codec
+
+
+class OutputTestCase(T.TestCase):
+
+    @T.setup
+    def create_stream(self):
+        self.stream = StringIO.StringIO()
+        self.codec = Codec()
+        self.nodes = [{"name": "node1", "id": "http://razor/node1"},
+                      {"name": "node22", "id": "http://razor/node22"}]
+
+    def write(self, result, format):
+        output.write_result(result, self.stream, format, self.codec)
+        return self.stream.getvalue()
+
+
+class WriteJSONTest(OutputTestCase):
+
+    def test_collection(self):
+        T.assert_equal(json.loads(self.write(self.nodes, "json")), self.nodes)
+
+    def test_generator(self):
+        written = self.write((node for node in self.nodes), "json")
+        T.assert_equal(json.loads(written), self.nodes)
+        T.assert_equal(len(written.splitlines()), 4)
+
+    def test_empty_collection(self):
+        T.assert_equal(self.write([], "json"), "[]\n")
+
+    def test_member(self):
+        T.assert_equal(json.loads(self.write(self.nodes[0], "json")),
+                       self.nodes[0])
+
+
+class WriteNDJSONTest(OutputTestCase):
+
+    def test_collection(self):
+        lines = self.write(iter(self.nodes), "ndjson").splitlines()
+        T.assert_equal([json.loads(line) for line in lines], self.nodes)
+
+    def test_member(self):
+        lines = self.write(self.nodes[0], "ndjson").splitlines()
+        T.assert_equal([json.loads(line) for line in lines], [self.nodes[0]])
+
+
+class WriteTableTest(OutputTestCase):
+
+    def test_collection(self):
+        T.assert_equal(self.write(self.nodes, "table"),
+                       "NAME    ID\n"
+                       "node1   http://razor/node1\n"
+                       "node22  http://razor/node22\n")
+
+    def test_streams_rows_after_the_sample(self):
+        nodes = [{"name": "n%d" % i} for i in range(3)]
+        with mock.patch.object(output, "TABLE_SAMPLE_ROWS", 1):
+            written = self.write((node for node in nodes), "table")
+        T.assert_equal(written.splitlines(), ["NAME", "n0", "n1", "n2"])
+
+    def test_nested_values(self):
+        written = self.write([{"name": "node1", "tags": [{"name": "t"}],
+                               "policy": None}], "table")
+        T.assert_equal(written.splitlines()[1],
+                       'node1  ' + ' ' * len("POLICY") + '  [{"name": "t"}]')
+
+    def test_unicode(self):
+        written = self.write([{"name": u"n\xf6de"}], "table")
+        T.assert_equal(written, "NAME\nn\xc3\xb6de\n")
+
+    def test_member(self):
+        T.assert_equal(self.write({"name": "node1", "state": "booted"},
+                                  "table"),
+                       "KEY    VALUE\n"
+                       "name   node1\n"
+                       "state  booted\n")
+
+    def test_empty_collection(self):
+        T.assert_equal(self.write([], "table"), "")
+
+
+class WriteResultTest(OutputTestCase):
+
+    def test_unknown_format(self):
+        with T.assert_raises(ValueError):
+            self.write(self.nodes, "yaml")
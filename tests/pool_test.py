@@ -0,0 +1,248 @@
+# -*- coding: utf-8 -*-
+import mock
+import testify as T
+
+from py_razor_client.pool import MergedResult
+from py_razor_client.pool import NoServerSelectedException
+from py_razor_client.pool import parse_server
+from py_razor_client.pool import RazorClientPool
+from py_razor_client.pool import select_server
+from py_razor_client.pool import SERVER_KEY
+from py_razor_client.pool import ServerError
+from py_razor_client.razor_client import ExpandedCollection
+from py_razor_client.razor_client import MemberError
+from py_razor_client.razor_client import UnresolvedReference
+from py_razor_client.records import Record
+
+
+class HTTPError(Exception):
+
+    def __init__(self, status_code):
+        super(HTTPError, self).__init__(status_code)
+        self.response = mock.Mock(status_code=status_code)
+
+
+class ParseServerTest(T.TestCase):
+
+    def test_string(self):
+        T.assert_equal(parse_server("razor.dc1:8080"), ("razor.dc1", "8080"))
+
+    def test_pair(self):
+        T.assert_equal(parse_server(("razor.dc1", 8080)),
+                       ("razor.dc1", "8080"))
+
+    def test_mapping(self):
+        T.assert_equal(parse_server({"hostname": "razor.dc1", "port": 8080}),
+                       ("razor.dc1", "8080"))
+
+    def test_no_port(self):
+        with T.assert_raises(ValueError):
+            parse_server("razor.dc1")
+
+
+class RazorClientPoolTestCase(T.TestCase):
+
+    @T.setup_teardown
+    def mock_clients(self):
+        self.clients = {}
+        with mock.patch("py_razor_client.pool.RazorClient") as mock_client_class:
+            mock_client_class.side_effect = self.make_client
+            self.mock_client_class = mock_client_class
+            yield
+
+    def make_client(self, hostname, port, **options):
+        client = mock.Mock()
+        client.collections = set(["nodes", "tags"])
+        client.commands = set(["create_tag"])
+        client.nodes.return_value = [{"name": "%s-node" % hostname}]
+        self.clients[hostname] = client
+        return client
+
+    def make_pool(self, servers=("dc1:8080", "dc2:8080"), **options):
+        return RazorClientPool(list(servers), **options)
+
+
+class DiscoveryTest(RazorClientPoolTestCase):
+
+    def test_discovers_every_server(self):
+        pool = self.make_pool(pool_size=4)
+        T.assert_equal(pool.servers, ["dc1:8080", "dc2:8080"])
+        for client in self.clients.values():
+            client.discover_methods.assert_called_once_with(False)
+        T.assert_equal(pool.collections, set(["nodes", "tags"]))
+        T.assert_equal(pool.commands, set(["create_tag"]))
+        T.assert_equal(self.mock_client_class.call_args_list, [
+            mock.call("dc1", "8080", lazy_discovery=True, pool_size=4),
+            mock.call("dc2", "8080", lazy_discovery=True, pool_size=4)])
+
+    def test_unavailable_server(self):
+        def make_client(hostname, port, **options):
+            client = self.make_client(hostname, port)
+            if hostname == "dc2":
+                client.discover_methods.side_effect = IOError("down")
+            return client
+        self.mock_client_class.side_effect = make_client
+
+        pool = self.make_pool()
+        T.assert_equal(pool.unavailable.keys(), ["dc2:8080"])
+        T.assert_equal(list(pool.nodes()), [
+            {"name": "dc1-node", SERVER_KEY: "dc1:8080"}])
+        T.assert_equal(self.clients["dc2"].nodes.called, False)
+
+    def test_every_server_unavailable(self):
+        def make_client(hostname, port, **options):
+            client = self.make_client(hostname, port)
+            client.discover_methods.side_effect = IOError(hostname)
+            return client
+        self.mock_client_class.side_effect = make_client
+
+        with T.assert_raises(IOError):
+            self.make_pool()
+
+    def test_shared_stats(self):
+        pool = self.make_pool(collect_stats=True)
+        T.assert_is(self.clients["dc1"].stats, pool.stats)
+        T.assert_is(self.clients["dc2"].stats, pool.stats)
+
+    def test_no_servers(self):
+        with T.assert_raises(ValueError):
+            self.make_pool([])
+
+
+class ReadTest(RazorClientPoolTestCase):
+
+    def test_merges_listings(self):
+        pool = self.make_pool()
+        nodes = pool.nodes(expand=True)
+
+        T.assert_isinstance(nodes, MergedResult)
+        T.assert_equal(list(nodes), [
+            {"name": "dc1-node", SERVER_KEY: "dc1:8080"},
+            {"name": "dc2-node", SERVER_KEY: "dc2:8080"}])
+        T.assert_equal(nodes.errors, [])
+        self.clients["dc1"].nodes.assert_called_once_with(expand=True)
+
+    def test_wrapped_listings(self):
+        pool = self.make_pool()
+        for hostname, count in (("dc1", 3), ("dc2", 2)):
+            self.clients[hostname].nodes.return_value = {
+                "spec": "http://api.puppetlabs.com/razor/v1/collections/nodes",
+                "items": [{"name": "%s-node%d" % (hostname, i)}
+                          for i in range(count)]}
+
+        nodes = pool.nodes()
+        T.assert_equal([(node['name'], node[SERVER_KEY]) for node in nodes], [
+            ("dc1-node0", "dc1:8080"), ("dc1-node1", "dc1:8080"),
+            ("dc1-node2", "dc1:8080"), ("dc2-node0", "dc2:8080"),
+            ("dc2-node1", "dc2:8080")])
+
+    def test_member_errors_and_unresolved(self):
+        pool = self.make_pool()
+        error = IOError("timed out")
+        unresolved = UnresolvedReference("http://dc2/policies/p1", error)
+        self.clients["dc1"].nodes.return_value = ExpandedCollection(
+            [{"name": "a"}, {"name": "b"}])
+        self.clients["dc2"].nodes.return_value = ExpandedCollection(
+            [{"name": "c"}, {"name": "d"}],
+            errors=[MemberError(1, {"name": "d"}, error)],
+            unresolved=[unresolved])
+
+        nodes = pool.nodes(expand=True, include=["policy"])
+        T.assert_equal([(e.index, e.stub, e.exception)
+                        for e in nodes.member_errors],
+                       [(3, {"name": "d"}, error)])
+        T.assert_equal(nodes[3][SERVER_KEY], "dc2:8080")
+        T.assert_equal(nodes.unresolved, [unresolved])
+        T.assert_equal(nodes.errors, [])
+
+    def test_leaves_results_alone(self):
+        pool = self.make_pool()
+        pool.nodes()
+        T.assert_equal(self.clients["dc1"].nodes.return_value,
+                       [{"name": "dc1-node"}])
+
+    def test_streamed_listings(self):
+        pool = self.make_pool()
+        for hostname in ("dc1", "dc2"):
+            self.clients[hostname].nodes.return_value = iter(
+                [{"name": "%s-node" % hostname}])
+        T.assert_equal([node['name'] for node in pool.nodes(stream=True)],
+                       ["dc1-node", "dc2-node"])
+
+    def test_server_error(self):
+        pool = self.make_pool()
+        error = IOError("timed out")
+        self.clients["dc1"].nodes.side_effect = error
+
+        nodes = pool.nodes()
+        T.assert_equal([node['name'] for node in nodes], ["dc2-node"])
+        T.assert_equal([(e.server, e.exception) for e in nodes.errors],
+                       [("dc1:8080", error)])
+
+    def test_member(self):
+        pool = self.make_pool()
+        self.clients["dc1"].nodes.side_effect = HTTPError(404)
+        self.clients["dc2"].nodes.return_value = {"name": "node1"}
+
+        nodes = pool.nodes("node1")
+        T.assert_equal(list(nodes), [{"name": "node1",
+                                      SERVER_KEY: "dc2:8080"}])
+        T.assert_equal(nodes.errors, [])
+
+    def test_records(self):
+        pool = self.make_pool()
+        self.clients["dc1"].nodes.return_value = [Record({"name": "node1"})]
+        self.clients["dc2"].nodes.return_value = []
+
+        nodes = pool.nodes()
+        T.assert_equal(nodes[0][SERVER_KEY], "dc1:8080")
+
+
+class CommandTest(RazorClientPoolTestCase):
+
+    def test_explicit_server(self):
+        pool = self.make_pool()
+        result = pool.create_tag(name="small", razor_server="dc2:8080")
+
+        T.assert_equal(result, self.clients["dc2"].create_tag.return_value)
+        self.clients["dc2"].create_tag.assert_called_once_with(name="small")
+        T.assert_equal(self.clients["dc1"].create_tag.called, False)
+
+    def test_no_server(self):
+        pool = self.make_pool()
+        with T.assert_raises(NoServerSelectedException):
+            pool.create_tag(name="small")
+
+    def test_unknown_server(self):
+        pool = self.make_pool()
+        with T.assert_raises(NoServerSelectedException):
+            pool.create_tag(name="small", razor_server="dc3:8080")
+
+    def test_single_server(self):
+        pool = self.make_pool(["dc1:8080"])
+        pool.create_tag(name="small")
+        self.clients["dc1"].create_tag.assert_called_once_with(name="small")
+
+    def test_selector(self):
+        selector = mock.Mock(return_value="dc1:8080")
+        pool = self.make_pool(selector=selector)
+        pool.create_tag(name="small")
+
+        selector.assert_called_once_with(pool, "create_tag", {"name": "small"})
+        self.clients["dc1"].create_tag.assert_called_once_with(name="small")
+
+
+class SelectServerTest(T.TestCase):
+
+    def test_pops_server(self):
+        arguments = {"name": "small", SERVER_KEY: "dc1:8080"}
+        T.assert_equal(select_server(mock.Mock(), "create_tag", arguments),
+                       "dc1:8080")
+        T.assert_equal(arguments, {"name": "small"})
+
+
+class ServerErrorTest(T.TestCase):
+
+    def test_repr(self):
+        T.assert_equal(repr(ServerError("dc1:8080", None)),
+                       "ServerError('dc1:8080', None)")
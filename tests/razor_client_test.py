@@ -1,11 +1,24 @@
 # -*- coding: utf-8 -*-
 from contextlib import nested
 import json
+import threading
+import time
+import urlparse
+
 import mock
 import testify as T
 from urlparse import urlunsplit
 
+from py_razor_client.codec import default_codec
+from py_razor_client.deadline import deadline
+from py_razor_client.deadline import DeadlineExceeded
+from py_razor_client.governor import ConcurrencyGovernor
+from py_razor_client.razor_client import collection_members
+from py_razor_client.razor_client import ExpandedCollection
 from py_razor_client.razor_client import RazorClient
+from py_razor_client.records import NodeRecord
+from py_razor_client.records import Record
+from py_razor_client.schema import CommandValidationError
 
 
 class RazorClientTestCase(T.TestCase):
@@ -14,17 +27,21 @@ class RazorClientTestCase(T.TestCase):
     def create_razor_client(self):
         self.hostname = "some_host"
         self.port = "some_port"
-        requests_tgt = "py_razor_client.razor_client.requests"
-        requests_mock = mock.patch(requests_tgt)
+        session_tgt = "requests.Session"
+        session_mock = mock.patch(session_tgt)
 
-        with requests_mock as self.mock_requests:
+        with session_mock as self.mock_session_class:
+            self.mock_session = self.mock_session_class.return_value
+            self.mock_session.get.return_value = self.make_json_response({})
+            self.mock_session.post.return_value = self.make_json_response({})
             self.razor_client = RazorClient(self.hostname, self.port, True)
-            self.mock_requests.reset_mock()
+            self.mock_session_class.reset_mock()
             yield
 
     def make_json_response(self, expected_response):
         mock_response = mock.Mock()
-        mock_response.json.return_value = expected_response
+        mock_response.content = json.dumps(expected_response)
+        mock_response.encoding = None
         return mock_response
 
     def make_text_response(self, expected_response):
@@ -56,6 +73,211 @@ class ConstructorTest(RazorClientTestCase):
         self.mock_discover_methods.assert_called_once_with()
 
 
+class DiscoverOnDemandTest(RazorClientTestCase):
+
+    @T.setup_teardown
+    def create_client(self):
+        self.api_document = {
+            "collections": [{"name": "nodes", "id": "/api/collections/nodes"}],
+            "commands": [{"name": "delete-node", "id": "/api/commands/delete-node"}],
+        }
+        self.mock_session.get.return_value = self.make_json_response(
+            self.api_document)
+        self.razor_client = RazorClient(self.hostname, self.port,
+                                        discover_on_demand=True)
+        yield
+
+    def test_construction_skips_discovery(self):
+        T.assert_equal(self.mock_session.get.call_count, 0)
+
+    def test_method_access_discovers(self):
+        T.assert_equal(callable(self.razor_client.delete_node), True)
+        T.assert_equal(self.mock_session.get.call_count, 1)
+
+        self.razor_client.nodes
+        T.assert_equal(self.mock_session.get.call_count, 1)
+
+    def test_collections_and_commands_discover(self):
+        T.assert_equal(self.razor_client.collections, set(["nodes"]))
+        T.assert_equal(self.razor_client.commands, set(["delete_node"]))
+        T.assert_equal(self.mock_session.get.call_count, 1)
+
+    def test_unknown_attribute(self):
+        with T.assert_raises(AttributeError):
+            self.razor_client.frobnicate
+        with T.assert_raises(AttributeError):
+            self.razor_client.frobnicate
+        T.assert_equal(self.mock_session.get.call_count, 1)
+
+    def test_private_attribute_skips_discovery(self):
+        with T.assert_raises(AttributeError):
+            self.razor_client._frobnicate
+        T.assert_equal(self.mock_session.get.call_count, 0)
+
+    def test_failed_discovery_retried(self):
+        self.mock_session.get.side_effect = [ValueError("down"),
+                                             self.mock_session.get.return_value]
+        with T.assert_raises(ValueError):
+            self.razor_client.nodes
+        T.assert_equal(callable(self.razor_client.nodes), True)
+        T.assert_equal(self.mock_session.get.call_count, 2)
+
+    def test_concurrent_access_discovers_once(self):
+        release = threading.Event()
+
+        def slow_get(*args, **kwargs):
+            release.wait(1)
+            return self.make_json_response(self.api_document)
+        self.mock_session.get.side_effect = slow_get
+
+        results = []
+        threads = [threading.Thread(
+            target=lambda: results.append(self.razor_client.nodes))
+            for _ in range(5)]
+        for thread in threads:
+            thread.start()
+        release.set()
+        for thread in threads:
+            thread.join()
+
+        T.assert_equal(len(results), 5)
+        T.assert_equal(self.mock_session.get.call_count, 1)
+
+    def test_lazy_discovery_has_no_methods(self):
+        razor_client = RazorClient(self.hostname, self.port, True)
+        with T.assert_raises(AttributeError):
+            razor_client.nodes
+        T.assert_equal(razor_client.collections, set())
+        T.assert_equal(self.mock_session.get.call_count, 0)
+
+
+class SessionTest(RazorClientTestCase):
+
+    def test_session_created_once(self):
+        first = self.razor_client.session
+        second = self.razor_client.session
+
+        T.assert_equal(first, self.mock_session)
+        T.assert_equal(second, self.mock_session)
+        self.mock_session_class.assert_called_once_with()
+
+    def test_session_mounts_pooled_adapter(self):
+        razor_client = RazorClient(self.hostname, self.port, True,
+                                   pool_size=3, pool_block=True)
+        razor_client.session
+
+        T.assert_equal(self.mock_session.mount.call_count, 2)
+        for call_args in self.mock_session.mount.call_args_list:
+            adapter = call_args[0][1]
+            T.assert_equal(adapter._pool_connections, 3)
+            T.assert_equal(adapter._pool_maxsize, 3)
+            T.assert_equal(adapter._pool_block, True)
+
+    def test_keep_alive_off(self):
+        self.mock_session.headers = {}
+        razor_client = RazorClient(self.hostname, self.port, True,
+                                   keep_alive=False)
+        razor_client.session
+        T.assert_equal(self.mock_session.headers["Connection"], "close")
+
+    def test_close(self):
+        self.razor_client.session
+        self.razor_client.close()
+
+        self.mock_session.close.assert_called_once_with()
+        T.assert_equal(self.razor_client._session, None)
+
+    def test_close_without_session(self):
+        self.razor_client.close()
+        T.assert_equal(self.mock_session.close.call_count, 0)
+
+    def test_context_manager_closes(self):
+        with self.razor_client as client:
+            client.session
+        self.mock_session.close.assert_called_once_with()
+
+
+class GetIfModifiedTest(RazorClientTestCase):
+
+    @T.setup
+    def make_url(self):
+        self.url = "http://%s:%s/api/collections/nodes/node1" % (
+            self.hostname, self.port)
+
+    def test_modified(self):
+        response = self.make_json_response({"name": "node1"})
+        response.status_code = 200
+        response.headers = {"ETag": '"v2"', "Last-Modified": "yesterday"}
+        self.mock_session.get.return_value = response
+
+        T.assert_equal(self.razor_client.get_if_modified(self.url, '"v1"'),
+                       ({"name": "node1"}, '"v2"', "yesterday"))
+        self.mock_session.get.assert_called_once_with(
+            self.url, headers={"If-None-Match": '"v1"'})
+
+    def test_not_modified(self):
+        response = mock.Mock(status_code=304, headers={})
+        self.mock_session.get.return_value = response
+
+        T.assert_equal(self.razor_client.get_if_modified(self.url, '"v1"'),
+                       None)
+        T.assert_equal(response.json.call_count, 0)
+
+    def test_unconditional(self):
+        response = self.make_json_response({"name": "node1"})
+        response.status_code = 200
+        response.headers = {}
+        self.mock_session.get.return_value = response
+
+        T.assert_equal(self.razor_client.get_if_modified(self.url),
+                       ({"name": "node1"}, None, None))
+        self.mock_session.get.assert_called_once_with(self.url)
+
+    def test_error(self):
+        response = mock.Mock(status_code=404)
+        response.raise_for_status.side_effect = ValueError("404")
+        self.mock_session.get.return_value = response
+
+        with T.assert_raises(ValueError):
+            self.razor_client.get_if_modified(self.url)
+
+
+class GetManyIfModifiedTest(RazorClientTestCase):
+
+    def test_results_in_order(self):
+        def get_if_modified(path, etag, last_modified):
+            if path == "bad":
+                raise ValueError(path)
+            if etag:
+                return None
+            return path, None, None
+
+        with mock.patch.object(self.razor_client, "get_if_modified",
+                               side_effect=get_if_modified):
+            results = self.razor_client.get_many_if_modified(
+                [("a", None, None), ("b", '"v1"', None), ("bad", None, None)])
+
+        T.assert_equal(results[:2], [(("a", None, None), None), (None, None)])
+        T.assert_equal(results[2][0], None)
+        T.assert_isinstance(results[2][1], ValueError)
+
+    def test_nothing_to_get(self):
+        T.assert_equal(self.razor_client.get_many_if_modified([]), [])
+
+
+class CollectionUrlTest(RazorClientTestCase):
+
+    def test_collection_url(self):
+        self.razor_client._bind_collection(
+            {"name": "nodes", "id": "http://razor/api/collections/nodes"})
+        T.assert_equal(self.razor_client.collection_url("nodes"),
+                       "http://razor/api/collections/nodes")
+
+    def test_unknown_collection(self):
+        with T.assert_raises(ValueError):
+            self.razor_client.collection_url("widgets")
+
+
 class DiscoverMethodsTest(RazorClientTestCase):
 
     def test_discover_methods(self):
@@ -65,7 +287,7 @@ class DiscoverMethodsTest(RazorClientTestCase):
             "collections": collections,
             "commands": commands
         })
-        self.mock_requests.get.return_value = mock_response
+        self.mock_session.get.return_value = mock_response
 
         bind_mocks = (mock.patch.object(self.razor_client, "_bind_collection"),
                       mock.patch.object(self.razor_client, "_bind_command"))
@@ -83,12 +305,87 @@ class DiscoverMethodsTest(RazorClientTestCase):
                 mock_bind_command.assert_any_call(command)
 
 
+class DiscoveryCacheTest(RazorClientTestCase):
+
+    @T.setup_teardown
+    def mock_cache(self):
+        self.mock_cache = mock.Mock()
+        self.mock_cache.validators.return_value = {"If-None-Match": '"v1"'}
+        self.razor_client.discovery_cache = self.mock_cache
+        self.cached_document = {"collections": [], "commands": []}
+        self.cached_entry = {"document": self.cached_document}
+        self.key = "%s:%s" % (self.hostname, self.port)
+        self.api_url = "http://%s/api" % self.key
+        yield
+
+    def test_fresh_entry_skips_request(self):
+        self.mock_cache.load.return_value = self.cached_entry
+        self.mock_cache.is_fresh.return_value = True
+
+        document = self.razor_client._get_api_document()
+
+        T.assert_equal(document, self.cached_document)
+        T.assert_equal(self.mock_session.get.call_count, 0)
+        self.mock_cache.load.assert_called_once_with(self.key)
+
+    def test_stale_entry_revalidated(self):
+        self.mock_cache.load.return_value = self.cached_entry
+        self.mock_cache.is_fresh.return_value = False
+        self.mock_cache.touch.return_value = self.cached_entry
+        self.mock_session.get.return_value.status_code = 304
+
+        document = self.razor_client._get_api_document()
+
+        T.assert_equal(document, self.cached_document)
+        self.mock_session.get.assert_called_once_with(
+            self.api_url, headers={"If-None-Match": '"v1"'})
+        self.mock_cache.touch.assert_called_once_with(self.key,
+                                                      self.cached_entry)
+
+    def test_changed_api_stored(self):
+        new_document = {"collections": [{"name": "nodes"}], "commands": []}
+        self.mock_cache.load.return_value = self.cached_entry
+        self.mock_cache.is_fresh.return_value = False
+        mock_response = self.make_json_response(new_document)
+        mock_response.status_code = 200
+        mock_response.headers = {"ETag": '"v2"'}
+        self.mock_session.get.return_value = mock_response
+
+        document = self.razor_client._get_api_document()
+
+        T.assert_equal(document, new_document)
+        self.mock_cache.store.assert_called_once_with(
+            self.key, new_document, etag='"v2"', last_modified=None)
+
+    def test_missing_entry_fetched(self):
+        self.mock_cache.load.return_value = None
+        mock_response = self.make_json_response(self.cached_document)
+        mock_response.status_code = 200
+        mock_response.headers = {}
+        self.mock_session.get.return_value = mock_response
+
+        self.razor_client._get_api_document()
+
+        self.mock_session.get.assert_called_once_with(self.api_url)
+        T.assert_equal(self.mock_cache.store.call_count, 1)
+
+    def test_refresh_ignores_freshness(self):
+        self.mock_cache.load.return_value = self.cached_entry
+        self.mock_cache.is_fresh.return_value = True
+        self.mock_cache.touch.return_value = self.cached_entry
+        self.mock_session.get.return_value.status_code = 304
+
+        self.razor_client._get_api_document(refresh=True)
+
+        T.assert_equal(self.mock_session.get.call_count, 1)
+
+
 class GetPathTest(RazorClientTestCase):
 
     def test_get_path_relative_url_with_json(self):
-        expected_response = mock.sentinel.response
+        expected_response = {"name": "node1"}
         mock_response = self.make_json_response(expected_response)
-        self.mock_requests.get.return_value = mock_response
+        self.mock_session.get.return_value = mock_response
 
         test_path = "/api/collections/nodes"
         expected_host = ":".join((self.hostname, self.port))
@@ -97,12 +394,12 @@ class GetPathTest(RazorClientTestCase):
         actual_response = self.razor_client.get_path(test_path, True)
 
         T.assert_equal(expected_response, actual_response)
-        self.mock_requests.get.assert_called_once_with(expected_path)
+        self.mock_session.get.assert_called_once_with(expected_path)
 
     def test_get_path_relative_url_with_text(self):
         expected_response = mock.sentinel.response
         mock_response = self.make_text_response(expected_response)
-        self.mock_requests.get.return_value = mock_response
+        self.mock_session.get.return_value = mock_response
 
         test_path = "/api/collections/nodes"
         expected_host = ":".join((self.hostname, self.port))
@@ -111,12 +408,12 @@ class GetPathTest(RazorClientTestCase):
         actual_response = self.razor_client.get_path(test_path, False)
 
         T.assert_equal(expected_response, actual_response)
-        self.mock_requests.get.assert_called_once_with(expected_path)
+        self.mock_session.get.assert_called_once_with(expected_path)
 
     def test_get_path_absolute_url_with_json(self):
-        expected_response = mock.sentinel.response
+        expected_response = {"name": "node1"}
         mock_response = self.make_json_response(expected_response)
-        self.mock_requests.get.return_value = mock_response
+        self.mock_session.get.return_value = mock_response
 
         test_path = "http://%s:%s/api/collections/nodes" % (self.hostname,
                                                             self.port)
@@ -125,12 +422,12 @@ class GetPathTest(RazorClientTestCase):
         actual_response = self.razor_client.get_path(test_path, True)
 
         T.assert_equal(expected_response, actual_response)
-        self.mock_requests.get.assert_called_once_with(expected_path)
+        self.mock_session.get.assert_called_once_with(expected_path)
 
     def test_get_path_absolute_url_with_text(self):
         expected_response = mock.sentinel.response
         mock_response = self.make_text_response(expected_response)
-        self.mock_requests.get.return_value = mock_response
+        self.mock_session.get.return_value = mock_response
 
         test_path = "http://%s:%s/api/collections/nodes" % (self.hostname,
                                                             self.port)
@@ -139,15 +436,515 @@ class GetPathTest(RazorClientTestCase):
         actual_response = self.razor_client.get_path(test_path, False)
 
         T.assert_equal(expected_response, actual_response)
-        self.mock_requests.get.assert_called_once_with(expected_path)
+        self.mock_session.get.assert_called_once_with(expected_path)
+
+
+class ResponseCacheTest(RazorClientTestCase):
+
+    @T.setup_teardown
+    def enable_response_cache(self):
+        self.razor_client = RazorClient(self.hostname, self.port, True,
+                                        response_cache_size=2)
+        self.url = "http://%s:%s/api/collections/nodes" % (self.hostname,
+                                                           self.port)
+        yield
+
+    def make_cacheable_response(self, status_code=200, body=None):
+        response = self.make_json_response(body)
+        response.status_code = status_code
+        response.headers = {"ETag": '"v1"'}
+        return response
+
+    def test_disabled_by_default(self):
+        client = RazorClient(self.hostname, self.port, True)
+        T.assert_equal(client.response_cache, None)
+
+    def test_not_modified_reuses_body(self):
+        first = self.make_cacheable_response(body=[{"name": "node1"}])
+        not_modified = self.make_cacheable_response(304)
+        self.mock_session.get.side_effect = [first, not_modified]
+
+        T.assert_equal(self.razor_client.get_path(self.url),
+                       [{"name": "node1"}])
+        T.assert_equal(self.razor_client.get_path(self.url),
+                       [{"name": "node1"}])
+
+        T.assert_equal(self.mock_session.get.call_args_list, [
+            mock.call(self.url),
+            mock.call(self.url, headers={"If-None-Match": '"v1"'}),
+        ])
+        T.assert_equal(not_modified.json.call_count, 0)
+
+    def test_modified_replaces_body(self):
+        first = self.make_cacheable_response(body=[{"name": "node1"}])
+        second = self.make_cacheable_response(body=[{"name": "node2"}])
+        second.headers = {"ETag": '"v2"'}
+        self.mock_session.get.side_effect = [first, second]
+
+        self.razor_client.get_path(self.url)
+        T.assert_equal(self.razor_client.get_path(self.url),
+                       [{"name": "node2"}])
+        T.assert_equal(self.razor_client.response_cache.get(self.url), second)
+
+    def test_errors_not_cached(self):
+        error_response = self.make_cacheable_response(500)
+        error_response.raise_for_status.side_effect = ValueError("500")
+        self.mock_session.get.return_value = error_response
+
+        with T.assert_raises(ValueError):
+            self.razor_client.get_path(self.url)
+        T.assert_equal(self.razor_client.response_cache.get(self.url), None)
+
+
+    def test_command_invalidates_collection(self):
+        self.razor_client._bind_collection({"name": "nodes", "id": self.url})
+        self.razor_client._bind_collection(
+            {"name": "tags", "id": self.url.replace("nodes", "tags")})
+        tags_url = self.url.replace("nodes", "tags")
+        self.mock_session.get.side_effect = [
+            self.make_cacheable_response(body=[]),
+            self.make_cacheable_response(body=[]),
+            self.make_cacheable_response(body=[]),
+        ]
+        self.razor_client.get_path(self.url)
+        self.razor_client.get_path(tags_url)
+        self.razor_client.post_data("/api/commands/delete-node", name="n")
+        self.razor_client.get_path(self.url)
+
+        T.assert_equal(self.mock_session.get.call_args_list[-1],
+                       mock.call(self.url))
+        T.assert_equal(self.razor_client.response_cache.get(tags_url)
+                       is not None, True)
+
+    def test_unmapped_command_invalidates_everything(self):
+        self.mock_session.get.return_value = self.make_cacheable_response(
+            body=[])
+        self.razor_client.get_path(self.url)
+        self.razor_client.post_data("/api/commands/frobnicate", name="n")
+        T.assert_equal(len(self.razor_client.response_cache), 0)
+
+    def test_failed_command_keeps_cache(self):
+        self.mock_session.get.return_value = self.make_cacheable_response(
+            body=[])
+        self.mock_session.post.return_value.ok = False
+        self.razor_client.get_path(self.url)
+        self.razor_client.post_data("/api/commands/frobnicate", name="n")
+        T.assert_equal(len(self.razor_client.response_cache), 1)
+
+
+class TimeoutTest(RazorClientTestCase):
+
+    @T.setup_teardown
+    def create_client(self):
+        self.url = "http://%s:%s/api/collections/nodes" % (self.hostname,
+                                                           self.port)
+        yield
+
+    def test_no_timeout_by_default(self):
+        self.razor_client.get_path(self.url)
+        self.mock_session.get.assert_called_once_with(self.url)
+
+    def test_timeout(self):
+        self.razor_client.timeout = 5
+        self.razor_client.get_path(self.url)
+        self.razor_client.post_data(self.url)
+
+        self.mock_session.get.assert_called_once_with(self.url, timeout=5)
+        T.assert_equal(self.mock_session.post.call_args[1]['timeout'], 5)
+
+    def test_deadline_limits_timeout(self):
+        self.razor_client.timeout = 5
+        with deadline(1):
+            self.razor_client.get_path(self.url)
+
+        timeout = self.mock_session.get.call_args[1]['timeout']
+        T.assert_lte(timeout, 1)
+        T.assert_gt(timeout, 0)
+
+    def test_expired_deadline(self):
+        with mock.patch("py_razor_client.deadline.time.time") as mock_time:
+            mock_time.return_value = 100.0
+            with deadline(1):
+                mock_time.return_value = 101.0
+                with T.assert_raises(DeadlineExceeded):
+                    self.razor_client.get_path(self.url)
+        T.assert_equal(self.mock_session.get.call_count, 0)
+
+    def test_deadline_covers_discovery(self):
+        with mock.patch("py_razor_client.deadline.time.time") as mock_time:
+            mock_time.return_value = 100.0
+            with deadline(1):
+                mock_time.return_value = 101.0
+                with T.assert_raises(DeadlineExceeded):
+                    RazorClient(self.hostname, self.port)
+
+    def test_deadline_propagates_to_expand(self):
+        self.mock_session.get.return_value = self.make_json_response({})
+        stubs = [{"name": "node1", "id": "/node1"}]
+        with deadline(1):
+            self.razor_client.expand_members(stubs)
+        T.assert_lte(self.mock_session.get.call_args[1]['timeout'], 1)
+
+
+class HedgingTest(RazorClientTestCase):
+
+    @T.setup_teardown
+    def mock_hedged_call(self):
+        with mock.patch("py_razor_client.razor_client.hedged_call") as self.mock_hedged_call:
+            self.mock_hedged_call.return_value = self.make_json_response({})
+            yield
+
+    def test_not_hedged_by_default(self):
+        self.razor_client.get_path("/api")
+        T.assert_equal(self.mock_hedged_call.call_count, 0)
+
+    def test_fixed_delay(self):
+        client = RazorClient(self.hostname, self.port, True, hedge_delay=0.5)
+        client.get_path("/api")
+        T.assert_equal(self.mock_hedged_call.call_count, 1)
+        T.assert_equal(self.mock_hedged_call.call_args[0][1], 0.5)
+
+    def test_percentile_delay(self):
+        client = RazorClient(self.hostname, self.port, True,
+                             hedge_delay=0.5, hedge_percentile=90)
+        T.assert_equal(client._hedge_delay(), 0.5)
+
+        for latency in range(1, RazorClient.MIN_HEDGE_SAMPLES + 1):
+            client.latencies.record(latency / 100.0)
+        T.assert_equal(client._hedge_delay(), 0.18)
+
+    def test_percentile_without_fallback(self):
+        client = RazorClient(self.hostname, self.port, True,
+                             hedge_percentile=90)
+        client.get_path("/api")
+        T.assert_equal(self.mock_hedged_call.call_count, 0)
+        T.assert_equal(len(client.latencies), 1)
+
+    def test_posts_never_hedged(self):
+        client = RazorClient(self.hostname, self.port, True, hedge_delay=0.5)
+        client.post_data("/api/commands/delete-node")
+        T.assert_equal(self.mock_hedged_call.call_count, 0)
+
+
+class GovernorTest(RazorClientTestCase):
+
+    @T.setup
+    def create_client(self):
+        self.governor = ConcurrencyGovernor()
+        self.client = RazorClient(self.hostname, self.port, True,
+                                  governor=self.governor)
+
+    def test_reads(self):
+        with mock.patch.object(self.governor.reads, "release") as release:
+            self.client.get_path("/api")
+        T.assert_equal(release.call_count, 1)
+        T.assert_equal(self.governor.commands.in_flight, 0)
+
+    def test_streamed_reads(self):
+        response = self.mock_session.get.return_value
+        response.iter_content.return_value = iter(["[]"])
+        with mock.patch.object(self.governor.reads, "release") as release:
+            list(self.client.iter_path("/api/collections/nodes"))
+        T.assert_equal(release.call_count, 1)
+
+    def test_commands(self):
+        with mock.patch.object(self.governor.commands, "release") as release:
+            self.client.post_data("/api/commands/delete-node", name="n")
+        T.assert_equal(release.call_count, 1)
+
+    def test_overloaded_server(self):
+        response = self.make_json_response({})
+        response.status_code = 503
+        self.mock_session.get.return_value = response
+        limit = self.governor.reads.limit
+        self.client.get_if_modified("/api")
+        T.assert_equal(self.governor.reads.limit, limit // 2)
+
+
+class CoalesceReadsTest(RazorClientTestCase):
+
+    @T.setup
+    def block_gets(self):
+        self.release = threading.Event()
+        response = self.make_json_response({"name": "node1"})
+
+        def get(url, **options):
+            self.release.wait(1)
+            return response
+        self.mock_session.get.side_effect = get
+
+    def read_concurrently(self, read, count=4):
+        results = [None] * count
+
+        def run(i):
+            results[i] = read()
+        threads = [threading.Thread(target=run, args=(i,))
+                   for i in range(count)]
+        for thread in threads:
+            thread.start()
+        time.sleep(0.1)
+        self.release.set()
+        for thread in threads:
+            thread.join()
+        return results
+
+    def test_identical_gets_coalesced(self):
+        results = self.read_concurrently(
+            lambda: self.razor_client.get_path("/api/collections/nodes/node1"))
+        T.assert_equal(self.mock_session.get.call_count, 1)
+        T.assert_equal(results, [{"name": "node1"}] * 4)
+        # Each caller decodes its own copy
+        T.assert_equal(len(set(id(result) for result in results)), 4)
+
+    def test_different_gets_not_coalesced(self):
+        paths = iter(["/api/collections/nodes/node%d" % i for i in range(4)])
+        lock = threading.Lock()
+
+        def read():
+            with lock:
+                path = next(paths)
+            return self.razor_client.get_path(path)
+        self.read_concurrently(read)
+        T.assert_equal(self.mock_session.get.call_count, 4)
+
+    def test_disabled(self):
+        self.razor_client = RazorClient(self.hostname, self.port, True,
+                                        coalesce_reads=False)
+        self.read_concurrently(
+            lambda: self.razor_client.get_path("/api/collections/nodes/node1"))
+        T.assert_equal(self.mock_session.get.call_count, 4)
+
+    def test_commands_not_coalesced(self):
+        self.release.set()
+        for _ in range(3):
+            self.razor_client.post_data("/api/commands/delete-node", name="n")
+        T.assert_equal(self.mock_session.post.call_count, 3)
+
+    def test_commands_forget_reads_in_flight(self):
+        with mock.patch.object(self.razor_client._flights, "forget") as forget:
+            self.razor_client.post_data("/api/commands/delete-node", name="n")
+        T.assert_equal(forget.call_count, 1)
+
+    def test_follower_deadline(self):
+        thread = threading.Thread(
+            target=self.razor_client.get_path, args=("/api",))
+        thread.start()
+        time.sleep(0.1)
+        try:
+            with deadline(0.05):
+                with T.assert_raises(DeadlineExceeded):
+                    self.razor_client.get_path("/api")
+        finally:
+            self.release.set()
+            thread.join()
+
+
+class StatsTest(RazorClientTestCase):
+
+    @T.setup_teardown
+    def create_client(self):
+        self.razor_client = RazorClient(self.hostname, self.port, True,
+                                        collect_stats=True)
+        self.base_url = "http://%s:%s" % (self.hostname, self.port)
+        yield
+
+    def make_response(self, status_code=200, body=None):
+        response = self.make_json_response(body)
+        response.status_code = status_code
+        response.headers = {"Content-Length": "10"}
+        return response
+
+    def test_disabled_by_default(self):
+        T.assert_equal(RazorClient(self.hostname, self.port, True).stats, None)
+
+    def test_get_recorded(self):
+        self.mock_session.get.return_value = self.make_response()
+        self.razor_client.get_path("/api/collections/nodes/node1")
+
+        endpoint = self.razor_client.stats.endpoints()["GET collections/nodes/*"]
+        T.assert_equal(endpoint.count, 1)
+        T.assert_equal(endpoint.statuses, {200: 1})
+        T.assert_equal(endpoint.response_bytes, 10)
+
+    def test_streamed_get_counted_once(self):
+        response = self.make_response()
+        response.iter_content.return_value = iter(["[", "]"])
+        self.mock_session.get.return_value = response
+        list(self.razor_client.iter_path("/api/collections/nodes"))
+
+        endpoint = self.razor_client.stats.endpoints()["GET collections/nodes"]
+        T.assert_equal(endpoint.response_bytes, 2)
+
+    def test_revalidated_get_recorded_as_not_modified(self):
+        client = RazorClient(self.hostname, self.port, True,
+                             collect_stats=True, response_cache_size=2)
+        first = self.make_response()
+        first.headers = {"Content-Length": "10", "ETag": '"v1"'}
+        not_modified = self.make_response(304)
+        not_modified.headers = {"Content-Length": "0"}
+        self.mock_session.get.side_effect = [first, not_modified]
+
+        client.get_path("/api/collections/nodes")
+        client.get_path("/api/collections/nodes")
+
+        endpoint = client.stats.endpoints()["GET collections/nodes"]
+        T.assert_equal(endpoint.statuses, {200: 1, 304: 1})
+        T.assert_equal(endpoint.response_bytes, 10)
+
+    def test_post_recorded(self):
+        self.mock_session.post.return_value = self.make_response()
+        self.razor_client.post_data("/api/commands/delete-node", name="n")
+
+        endpoint = self.razor_client.stats.endpoints()["POST commands/delete-node"]
+        T.assert_equal(endpoint.count, 1)
+        T.assert_equal(endpoint.request_bytes, len('{"name": "n"}'))
+
+    def test_error_recorded(self):
+        response = self.make_response(500)
+        error = ValueError("500")
+        error.response = response
+        response.raise_for_status.side_effect = error
+        self.mock_session.get.return_value = response
+
+        with T.assert_raises(ValueError):
+            self.razor_client.get_path("/api/collections/nodes")
+
+        endpoint = self.razor_client.stats.endpoints()["GET collections/nodes"]
+        T.assert_equal(endpoint.errors, 1)
+        T.assert_equal(endpoint.statuses, {500: 1})
+
+    def test_listener_called(self):
+        listener = mock.Mock()
+        self.razor_client.stats.add_listener(listener)
+        self.mock_session.get.return_value = self.make_response()
+
+        self.razor_client.get_path("/api")
+
+        T.assert_equal(listener.call_count, 1)
+        T.assert_equal(listener.call_args[0][0].endpoint, "GET api")
+
+
+class IterPathTest(RazorClientTestCase):
+
+    def test_iter_path(self):
+        mock_response = self.mock_session.get.return_value
+        mock_response.iter_content.return_value = iter(['[{"name": "a"}', ',{"name": "b"}]'])
+
+        test_path = "/api/collections/nodes"
+        expected_path = "http://%s:%s%s" % (self.hostname, self.port, test_path)
+
+        items = list(self.razor_client.iter_path(test_path))
+
+        T.assert_equal(items, [{"name": "a"}, {"name": "b"}])
+        self.mock_session.get.assert_called_once_with(expected_path,
+                                                      stream=True)
+        mock_response.iter_content.assert_called_once_with(
+            RazorClient.STREAM_CHUNK_SIZE)
+        mock_response.close.assert_called_once_with()
+
+    def test_iter_path_error(self):
+        mock_response = self.mock_session.get.return_value
+        mock_response.raise_for_status.side_effect = ValueError("500")
+
+        with T.assert_raises(ValueError):
+            list(self.razor_client.iter_path("/api/collections/nodes"))
+        mock_response.close.assert_called_once_with()
+
+
+class IterPagesTest(RazorClientTestCase):
+
+    @T.setup_teardown
+    def mock_get_path(self):
+        self.url = "http://razor/api/collections/nodes"
+        self.stubs = [{"name": "node%d" % i, "id": "%s/node%d" % (self.url, i)}
+                      for i in range(5)]
+        with mock.patch.object(self.razor_client, "get_path") as mock_get_path:
+            mock_get_path.side_effect = self.get_page
+            self.mock_get_path = mock_get_path
+            yield
+
+    def get_page(self, url):
+        query = urlparse.parse_qs(urlparse.urlsplit(url)[3])
+        start = int(query['start'][0])
+        limit = int(query['limit'][0])
+        return {"items": self.stubs[start:start + limit],
+                "total": len(self.stubs)}
+
+    def requested_urls(self):
+        return [args[0] for args, _ in self.mock_get_path.call_args_list]
+
+    def test_pages(self):
+        pages = list(self.razor_client.iter_pages(self.url, 2))
+        T.assert_equal(pages, [self.stubs[0:2], self.stubs[2:4],
+                               self.stubs[4:5]])
+        T.assert_equal(self.requested_urls(), [
+            self.url + "?start=0&limit=2",
+            self.url + "?start=2&limit=2",
+            self.url + "?start=4&limit=2",
+        ])
+
+    def test_without_prefetch(self):
+        pages = self.razor_client.iter_pages(self.url, 2, prefetch=False)
+        T.assert_equal(next(pages), self.stubs[0:2])
+        T.assert_equal(self.mock_get_path.call_count, 1)
+        T.assert_equal(list(pages), [self.stubs[2:4], self.stubs[4:5]])
+
+    def test_exact_multiple(self):
+        self.stubs = self.stubs[:4]
+        pages = list(self.razor_client.iter_pages(self.url, 2))
+        T.assert_equal(pages, [self.stubs[0:2], self.stubs[2:4]])
+        T.assert_equal(self.mock_get_path.call_count, 2)
+
+    def test_unpaged_server(self):
+        self.mock_get_path.side_effect = None
+        self.mock_get_path.return_value = self.stubs
+        pages = list(self.razor_client.iter_pages(self.url, 2))
+        T.assert_equal(pages, [self.stubs])
+        T.assert_equal(self.mock_get_path.call_count, 1)
+
+    def test_error(self):
+        self.mock_get_path.side_effect = ValueError("500")
+        with T.assert_raises(ValueError):
+            list(self.razor_client.iter_pages(self.url, 2))
+
+    def test_get_collection_page_size(self):
+        nodes = self.razor_client._get_collection(self.url, page_size=2)
+        T.assert_equal(list(nodes), self.stubs)
+
+    def test_get_collection_page_size_expand(self):
+        with mock.patch.object(self.razor_client, "expand_members") as mock_expand:
+            mock_expand.side_effect = lambda page, max_workers: [
+                dict(stub, expanded=True) for stub in page]
+            nodes = list(self.razor_client._get_collection(
+                self.url, page_size=2, expand=True, max_workers=3))
+
+        T.assert_equal([node['name'] for node in nodes],
+                       [stub['name'] for stub in self.stubs])
+        T.assert_equal(all(node['expanded'] for node in nodes), True)
+        T.assert_equal(mock_expand.call_args_list, [
+            mock.call(self.stubs[0:2], 3), mock.call(self.stubs[2:4], 3),
+            mock.call(self.stubs[4:5], 3)])
+
+    def test_get_collection_page_size_and_stream(self):
+        with T.assert_raises(ValueError):
+            self.razor_client._get_collection(self.url, page_size=2,
+                                              stream=True)
+
+    def test_get_collection_page_size_records(self):
+        self.razor_client.records = True
+        nodes = list(self.razor_client._get_collection(self.url, page_size=2))
+        T.assert_equal([node.name for node in nodes],
+                       [stub['name'] for stub in self.stubs])
+        # Stubs, as from a plain listing
+        T.assert_equal(type(nodes[0]), Record)
 
 
 class PostDataTest(RazorClientTestCase):
 
     def test_relative_path(self):
-        expected_response = mock.sentinel.response
+        expected_response = {"name": "node1"}
         mock_response = self.make_json_response(expected_response)
-        self.mock_requests.post.return_value = mock_response
+        self.mock_session.post.return_value = mock_response
 
         test_path = "/api/commands/delete_node"
         expected_host = ":".join((self.hostname, self.port))
@@ -160,15 +957,15 @@ class PostDataTest(RazorClientTestCase):
         actual_response = self.razor_client.post_data(test_path)
 
         T.assert_equal(expected_response, actual_response)
-        self.mock_requests.post.assert_called_once_with(
+        self.mock_session.post.assert_called_once_with(
             expected_path,
             headers=expected_headers,
             data=expected_data)
 
     def test_absolute_path(self):
-        expected_response = mock.sentinel.response
+        expected_response = {"name": "node1"}
         mock_response = self.make_json_response(expected_response)
-        self.mock_requests.post.return_value = mock_response
+        self.mock_session.post.return_value = mock_response
 
         test_path = "http://%s:%s/api/commands/delete_node" % (self.hostname,
                                                                self.port)
@@ -181,7 +978,7 @@ class PostDataTest(RazorClientTestCase):
         actual_response = self.razor_client.post_data(test_path)
 
         T.assert_equal(expected_response, actual_response)
-        self.mock_requests.post.assert_called_once_with(
+        self.mock_session.post.assert_called_once_with(
             expected_path,
             headers=expected_headers,
             data=expected_data)
@@ -198,12 +995,58 @@ class PostDataTest(RazorClientTestCase):
         test_url = "http://%s:%s/irrelevant" % (self.hostname, self.port)
 
         self.razor_client.post_data(test_url, **data)
-        self.mock_requests.post.assert_called_once_with(
+        self.mock_session.post.assert_called_once_with(
             test_url,
             headers=expected_headers,
             data=expected_data)
 
 
+class ExecuteBulkTest(RazorClientTestCase):
+
+    @T.setup_teardown
+    def bind_command(self):
+        self.command_url = "http://%s:%s/api/commands/create-repo" % (
+            self.hostname, self.port)
+        self.razor_client._bind_command({"name": "create-repo",
+                                         "id": self.command_url})
+        yield
+
+    def test_posts_transformed_arguments(self):
+        self.mock_session.post.return_value = self.make_json_response(
+            {"name": "repo"})
+        argument_sets = [{"name": "repo%d" % i, "iso_url": "http://x/%d" % i}
+                         for i in range(3)]
+
+        results = self.razor_client.execute_bulk("create-repo", argument_sets)
+
+        T.assert_equal(results.ok, True)
+        T.assert_equal([r.response for r in results],
+                       [{"name": "repo"}] * 3)
+        T.assert_equal(len(self.mock_session.post.call_args_list), 3)
+        posted = sorted(json.loads(c[1]['data'])['name']
+                        for c in self.mock_session.post.call_args_list)
+        T.assert_equal(posted, ["repo0", "repo1", "repo2"])
+        for call_args in self.mock_session.post.call_args_list:
+            T.assert_equal(call_args[0], (self.command_url,))
+            T.assert_in("iso-url", json.loads(call_args[1]['data']))
+        # The caller's argument sets are left untouched
+        T.assert_in("iso_url", argument_sets[0])
+
+    def test_error_status_fails_item(self):
+        error_response = self.make_json_response({"error": "no"})
+        error_response.raise_for_status.side_effect = ValueError("400")
+        self.mock_session.post.return_value = error_response
+
+        results = self.razor_client.execute_bulk("create_repo", [{"name": "x"}])
+
+        T.assert_equal(results.ok, False)
+        T.assert_isinstance(results[0].exception, ValueError)
+
+    def test_unknown_command(self):
+        with T.assert_raises(ValueError):
+            self.razor_client.execute_bulk("frobnicate", [{}])
+
+
 class SanitizeCommandNameTest(RazorClientTestCase):
 
     def test_sanitizes_dashes(self):
@@ -336,6 +1179,415 @@ class GetListCollectionTest(RazorClientTestCase):
 
         self.mock_get_path.assert_called_once_with(expected_url)
 
+    def test_get_collection_unknown_option(self):
+        with T.assert_raises(TypeError):
+            self.razor_client._get_collection("/api", bogus=True)
+
+    def test_get_collection_expand(self):
+        stubs = [{"name": "node1", "id": "/node1"}]
+        self.mock_get_path.return_value = stubs
+        with mock.patch.object(self.razor_client, "expand_members") as mock_expand:
+            actual = self.razor_client._get_collection("/api", expand=True,
+                                                       max_workers=3)
+
+            T.assert_equal(actual, mock_expand.return_value)
+            mock_expand.assert_called_once_with(stubs, 3)
+
+    def test_get_collection_expand_wrapped_items(self):
+        stubs = [{"name": "node1", "id": "/node1"}]
+        self.mock_get_path.return_value = {"items": stubs}
+        with mock.patch.object(self.razor_client, "expand_members") as mock_expand:
+            self.razor_client._get_collection("/api", expand=True)
+            mock_expand.assert_called_once_with(stubs, None)
+
+    def test_get_collection_stream(self):
+        with mock.patch.object(self.razor_client, "iter_path") as mock_iter_path:
+            actual = self.razor_client._get_collection("/api", stream=True)
+
+            T.assert_equal(actual, mock_iter_path.return_value)
+            mock_iter_path.assert_called_once_with("/api")
+            T.assert_equal(self.mock_get_path.call_count, 0)
+
+    def test_get_collection_stream_and_expand(self):
+        with T.assert_raises(ValueError):
+            self.razor_client._get_collection("/api", stream=True,
+                                              expand=True)
+
+    def test_get_collection_item_not_expanded(self):
+        with mock.patch.object(self.razor_client, "expand_members") as mock_expand:
+            self.razor_client._get_collection("/api", "item", expand=True)
+            T.assert_equal(mock_expand.call_count, 0)
+
+
+class CollectionMembersTest(T.TestCase):
+
+    def test_wrapped(self):
+        T.assert_equal(collection_members({"items": [{"name": "n"}]}),
+                       [{"name": "n"}])
+        T.assert_equal(collection_members({}), [])
+
+    def test_bare_list(self):
+        T.assert_equal(collection_members([{"name": "n"}]), [{"name": "n"}])
+
+
+class CodecTest(RazorClientTestCase):
+
+    def test_default_codec(self):
+        T.assert_is(self.razor_client.codec, default_codec())
+
+    def test_named_codec(self):
+        client = RazorClient(self.hostname, self.port, True, codec="json")
+        T.assert_equal(client.codec.name, "json")
+
+    def test_decodes_bytes(self):
+        codec = mock.Mock()
+        client = RazorClient(self.hostname, self.port, True, codec=codec)
+        response = self.make_json_response({"name": "node1"})
+        self.mock_session.get.return_value = response
+        codec.loads.return_value = {"name": "node1"}
+
+        T.assert_equal(client.get_path("/api"), {"name": "node1"})
+        codec.loads.assert_called_once_with(response.content)
+        T.assert_equal(response.json.call_count, 0)
+
+    def test_decodes_other_charsets(self):
+        response = self.make_json_response(None)
+        response.content = u'{"name": "n\xf6de"}'.encode("latin-1")
+        response.encoding = "ISO-8859-1"
+        self.mock_session.get.return_value = response
+
+        T.assert_equal(self.razor_client.get_path("/api"),
+                       {"name": u"n\xf6de"})
+
+    def test_encodes_posts(self):
+        codec = mock.Mock()
+        codec.dumps.return_value = "{}"
+        client = RazorClient(self.hostname, self.port, True, codec=codec)
+        client.post_data("/api/commands/create-repo", name="r")
+        codec.dumps.assert_called_once_with({"name": "r"})
+
+
+class RecordsTest(RazorClientTestCase):
+
+    @T.setup_teardown
+    def mock_get_path(self):
+        self.razor_client.records = True
+        self.url = "http://razor/api/collections/nodes"
+        self.node = {"name": "node1", "id": self.url + "/node1",
+                     "facts": {"cpus": 4}}
+        with mock.patch.object(self.razor_client, "get_path") as mock_get_path:
+            self.mock_get_path = mock_get_path
+            yield
+
+    def test_off_by_default(self):
+        T.assert_equal(RazorClient(self.hostname, self.port, True).records,
+                       False)
+
+    def test_member(self):
+        self.mock_get_path.return_value = self.node
+        node = self.razor_client._get_collection(self.url, "node1")
+        T.assert_isinstance(node, NodeRecord)
+        T.assert_equal(node.facts, {"cpus": 4})
+
+    def test_listing(self):
+        self.mock_get_path.return_value = {"items": [
+            {"name": "node1", "id": self.url + "/node1"}]}
+        stubs = self.razor_client._get_collection(self.url)
+        T.assert_equal([(type(stub), stub.name) for stub in stubs],
+                       [(Record, "node1")])
+
+    def test_expanded(self):
+        self.mock_get_path.side_effect = [
+            [{"name": "node1", "id": self.url + "/node1"}], self.node]
+        nodes = self.razor_client._get_collection(self.url, expand=True)
+        T.assert_isinstance(nodes, ExpandedCollection)
+        T.assert_equal([node.to_dict()['facts'] for node in nodes],
+                       [{"cpus": 4}])
+
+    def test_streamed(self):
+        stub = {"name": "node1", "id": self.url + "/node1"}
+        with mock.patch.object(self.razor_client, "iter_path") as mock_iter_path:
+            mock_iter_path.return_value = iter([stub])
+            stubs = list(self.razor_client._get_collection(self.url,
+                                                           stream=True))
+        # The same as from a plain listing
+        T.assert_equal([(type(stub), stub.name) for stub in stubs],
+                       [(Record, "node1")])
+        T.assert_equal(stubs[0].to_dict(),
+                       {"name": "node1", "id": self.url + "/node1",
+                        "spec": None})
+
+    def test_paged_expanded(self):
+        stub = {"name": "node1", "id": self.url + "/node1"}
+        self.mock_get_path.side_effect = [{"items": [stub], "total": 1},
+                                          self.node]
+        nodes = list(self.razor_client._get_collection(
+            self.url, page_size=10, expand=True))
+        T.assert_isinstance(nodes[0], NodeRecord)
+        T.assert_equal(nodes[0].facts, {"cpus": 4})
+
+
+class ExpandMembersTest(RazorClientTestCase):
+
+    @T.setup_teardown
+    def mock_get_path(self):
+        with mock.patch.object(self.razor_client, "get_path") as mock_get_path:
+            self.mock_get_path = mock_get_path
+            yield
+
+    def make_stubs(self, count):
+        return [{"name": "node%d" % i, "id": "/nodes/node%d" % i}
+                for i in range(count)]
+
+    def test_preserves_order(self):
+        stubs = self.make_stubs(25)
+        # Mock's call counting isn't thread-safe, so track calls here
+        fetched = []
+
+        def get_path(url):
+            fetched.append(url)
+            return {"id": url, "full": True}
+        self.mock_get_path.side_effect = get_path
+
+        members = self.razor_client.expand_members(stubs, max_workers=5)
+
+        T.assert_isinstance(members, ExpandedCollection)
+        T.assert_equal([m['id'] for m in members], [s['id'] for s in stubs])
+        T.assert_equal(members.errors, [])
+        T.assert_equal(sorted(fetched), sorted(s['id'] for s in stubs))
+
+    def test_per_item_errors(self):
+        stubs = self.make_stubs(3)
+        error = ValueError("boom")
+
+        def get_path(url):
+            if url == "/nodes/node1":
+                raise error
+            return {"id": url, "full": True}
+        self.mock_get_path.side_effect = get_path
+
+        members = self.razor_client.expand_members(stubs)
+
+        T.assert_equal(members[0], {"id": "/nodes/node0", "full": True})
+        T.assert_equal(members[1], stubs[1])
+        T.assert_equal(members[2], {"id": "/nodes/node2", "full": True})
+        T.assert_equal(len(members.errors), 1)
+        T.assert_equal(members.errors[0].index, 1)
+        T.assert_equal(members.errors[0].stub, stubs[1])
+        T.assert_equal(members.errors[0].exception, error)
+
+    def test_empty(self):
+        members = self.razor_client.expand_members([])
+        T.assert_equal(members, [])
+        T.assert_equal(members.errors, [])
+
+
+class ResolveReferencesTest(RazorClientTestCase):
+
+    @T.setup_teardown
+    def mock_get_path(self):
+        self.documents = {}
+        self.add("repos/repo1", {"name": "repo1", "task": self.ref("tasks/t")})
+        self.add("brokers/noop", {"name": "noop"})
+        self.add("policies/p1", {"name": "p1", "repo": self.ref("repos/repo1"),
+                                 "broker": self.ref("brokers/noop")})
+        self.add("tags/virtual", {"name": "virtual"})
+        self.add("tags/small", {"name": "small"})
+        self.add("nodes/node1", {"name": "node1",
+                                 "policy": self.ref("policies/p1"),
+                                 "tags": [self.ref("tags/virtual"),
+                                          self.ref("tags/small")]})
+        self.add("nodes/node2", {"name": "node2",
+                                 "policy": self.ref("policies/p1"),
+                                 "tags": [self.ref("tags/virtual")]})
+        self.add("nodes/node3", {"name": "node3", "policy": None})
+        self.nodes = [self.documents[self.url("nodes/node%d" % i)]
+                      for i in (1, 2, 3)]
+        with mock.patch.object(self.razor_client, "get_path") as mock_get_path:
+            mock_get_path.side_effect = self.get_path
+            self.mock_get_path = mock_get_path
+            yield
+
+    def url(self, path):
+        return "http://razor/api/collections/" + path
+
+    def ref(self, path):
+        return {"id": self.url(path), "name": path.rsplit("/", 1)[-1]}
+
+    def add(self, path, document):
+        self.documents[self.url(path)] = dict(document, id=self.url(path))
+
+    def get_path(self, url):
+        try:
+            return self.documents[url]
+        except KeyError:
+            raise ValueError("404 %s" % url)
+
+    def fetched_urls(self):
+        return sorted(args[0] for args, _ in self.mock_get_path.call_args_list)
+
+    def test_resolves_each_url_once(self):
+        resolved = self.razor_client.resolve_references(
+            self.nodes, ["policy", "tags"])
+
+        T.assert_equal(resolved[0]['policy']['repo'],
+                       self.ref("repos/repo1"))
+        T.assert_equal([tag['name'] for tag in resolved[0]['tags']],
+                       ["virtual", "small"])
+        T.assert_is(resolved[0]['policy'], resolved[1]['policy'])
+        T.assert_equal(resolved[2]['policy'], None)
+        T.assert_equal(self.fetched_urls(), [self.url("policies/p1"),
+                                             self.url("tags/small"),
+                                             self.url("tags/virtual")])
+        T.assert_equal(resolved.unresolved, [])
+
+    def test_depth(self):
+        resolved = self.razor_client.resolve_references(
+            self.nodes, ["policy", "repo", "broker"], depth=2)
+
+        policy = resolved[0]['policy']
+        T.assert_equal(policy['repo']['task'], self.ref("tasks/t"))
+        T.assert_equal(policy['broker'], self.documents[self.url("brokers/noop")])
+        T.assert_equal(self.fetched_urls(), [self.url("brokers/noop"),
+                                             self.url("policies/p1"),
+                                             self.url("repos/repo1")])
+
+    def test_cycles(self):
+        self.add("tags/virtual", {"name": "virtual",
+                                  "nodes": [self.ref("nodes/node1")]})
+        resolved = self.razor_client.resolve_references(
+            self.nodes[:1], ["tags", "nodes"], depth=5)
+
+        node = resolved[0]['tags'][0]['nodes'][0]
+        T.assert_equal(node['name'], "node1")
+        T.assert_equal(node['tags'][0]['nodes'][0]['name'], "node1")
+        T.assert_equal(len(self.fetched_urls()), 3)
+
+    def test_leaves_documents_alone(self):
+        self.razor_client.resolve_references(self.nodes, ["policy"])
+        T.assert_equal(self.nodes[0]['policy'], self.ref("policies/p1"))
+
+    def test_unresolved(self):
+        del self.documents[self.url("tags/small")]
+        resolved = self.razor_client.resolve_references(self.nodes, ["tags"])
+
+        T.assert_equal(resolved[0]['tags'][1], self.ref("tags/small"))
+        T.assert_equal([error.url for error in resolved.unresolved],
+                       [self.url("tags/small")])
+        T.assert_isinstance(resolved.unresolved[0].exception, ValueError)
+
+    def test_get_collection_item(self):
+        node = self.razor_client._get_collection(self.url("nodes"), "node1",
+                                                 include=["policy"])
+        T.assert_equal(node['policy']['name'], "p1")
+        T.assert_equal(node['policy']['repo'], self.ref("repos/repo1"))
+
+    def test_get_collection_listing(self):
+        self.documents[self.url("nodes")] = [self.ref("nodes/node1"),
+                                             self.ref("nodes/node2")]
+        nodes = self.razor_client._get_collection(self.url("nodes"),
+                                                  include=["policy"])
+
+        T.assert_isinstance(nodes, ExpandedCollection)
+        T.assert_equal([node['policy']['name'] for node in nodes],
+                       ["p1", "p1"])
+
+    def test_get_collection_pages(self):
+        with mock.patch.object(self.razor_client, "iter_pages") as mock_pages:
+            mock_pages.return_value = iter([[self.ref("nodes/node1")],
+                                            [self.ref("nodes/node2")]])
+            nodes = list(self.razor_client._get_collection(
+                self.url("nodes"), page_size=1, include=["policy"]))
+
+        T.assert_equal([node['policy']['name'] for node in nodes],
+                       ["p1", "p1"])
+        T.assert_equal(self.fetched_urls().count(self.url("policies/p1")), 1)
+
+    def test_get_collection_stream(self):
+        with T.assert_raises(ValueError):
+            self.razor_client._get_collection(self.url("nodes"), stream=True,
+                                              include=["policy"])
+
+
+class ValidateCommandsTest(RazorClientTestCase):
+
+    @T.setup
+    def create_client(self):
+        self.command_url = "http://%s:%s/api/commands/create-repo" % (
+            self.hostname, self.port)
+        self.api_document = {"collections": [], "commands": [
+            {"name": "create-repo", "id": self.command_url}]}
+        self.command_document = {"name": "create-repo", "schema": {
+            "name": {"type": "string", "required": True},
+            "iso-url": {"type": "string"}}}
+        self.mock_session.get.side_effect = self.get
+        self.client = RazorClient(self.hostname, self.port,
+                                  validate_commands=True)
+
+    def get(self, url, **kwargs):
+        if url == self.command_url:
+            return self.make_json_response(self.command_document)
+        return self.make_json_response(self.api_document)
+
+    def test_off_by_default(self):
+        self.mock_session.get.reset_mock()
+        RazorClient(self.hostname, self.port)
+        T.assert_equal(self.mock_session.get.call_count, 1)
+
+    def test_renames_arguments(self):
+        self.client.create_repo(name="r", iso_url="http://x")
+        data = json.loads(self.mock_session.post.call_args[1]['data'])
+        T.assert_equal(data, {"name": "r", "iso-url": "http://x"})
+
+    def test_rejects_locally(self):
+        with T.assert_raises(CommandValidationError):
+            self.client.create_repo(iso_url="http://x")
+        T.assert_equal(self.mock_session.post.call_count, 0)
+
+    def test_bulk(self):
+        results = self.client.execute_bulk("create-repo", [{"name": "r"},
+                                                           {"nmae": "r"}])
+        T.assert_equal(results[0].exception, None)
+        T.assert_isinstance(results[1].exception, CommandValidationError)
+        T.assert_equal(self.mock_session.post.call_count, 1)
+
+    def test_command_without_schema(self):
+        del self.command_document['schema']
+        client = RazorClient(self.hostname, self.port, validate_commands=True)
+        client.create_repo(nmae="r", iso_url="http://x")
+        data = json.loads(self.mock_session.post.call_args[1]['data'])
+        T.assert_equal(data, {"nmae": "r", "iso-url": "http://x"})
+
+    def test_unavailable_schema(self):
+        def get(url, **kwargs):
+            if url == self.command_url:
+                raise ValueError("500")
+            return self.make_json_response(self.api_document)
+        self.mock_session.get.side_effect = get
+
+        client = RazorClient(self.hostname, self.port, validate_commands=True)
+        client.create_repo(nmae="r")
+        T.assert_equal(self.mock_session.post.call_count, 1)
+
+    def test_cached_schemas(self):
+        cache = mock.Mock()
+        cache.load.return_value = None
+        client = RazorClient(self.hostname, self.port, discovery_cache=cache,
+                             validate_commands=True)
+
+        key = "%s:%s-commands" % (self.hostname, self.port)
+        cache.store.assert_any_call(key,
+                                    {self.command_url: self.command_document})
+
+        cache.load.return_value = {"document": {
+            self.command_url: self.command_document}}
+        cache.is_fresh.return_value = True
+        self.mock_session.get.reset_mock()
+        client._load_command_schemas(self.api_document['commands'])
+        T.assert_equal(self.mock_session.get.call_count, 0)
+        with T.assert_raises(CommandValidationError):
+            client.create_repo()
+
 
 class ExecuteCommandTest(RazorClientTestCase):
 
@@ -0,0 +1,108 @@
+# -*- coding: utf-8 -*-
+import testify as T
+
+from py_razor_client import records
+from py_razor_client.records import BrokerRecord
+from py_razor_client.records import NodeRecord
+from py_razor_client.records import Record
+
+
+def make_node(name="node1"):
+    return {
+        u"name": name,
+        u"id": u"http://razor/api/collections/nodes/%s" % name,
+        u"spec": u"http://api.puppetlabs.com/razor/v1/collections/nodes/member",
+        u"hw_info": {u"serial": u"SN1"},
+        u"tags": [{u"name": u"tag1", u"id": u"http://razor/tags/tag1"}],
+        u"policy": None,
+        u"facts": {u"cpus": 4, u"os": u"linux"},
+        u"hostname": u"%s.example.com" % name,
+    }
+
+
+class RecordTest(T.TestCase):
+
+    def test_attributes(self):
+        node = NodeRecord(make_node())
+        T.assert_equal(node.name, "node1")
+        T.assert_equal(node.hostname, "node1.example.com")
+        T.assert_equal(node.policy, None)
+        T.assert_equal(node.last_checkin, None)
+
+    def test_no_instance_dict(self):
+        T.assert_equal(hasattr(NodeRecord(make_node()), "__dict__"), False)
+
+    def test_references_are_records(self):
+        node = NodeRecord(make_node())
+        T.assert_equal([(type(tag), tag.name) for tag in node.tags],
+                       [(Record, "tag1")])
+
+    def test_lazy_fields_decoded_on_access(self):
+        node = NodeRecord(make_node())
+        T.assert_isinstance(node._facts, records._Encoded)
+        T.assert_equal(node.facts, {"cpus": 4, "os": "linux"})
+        T.assert_is(node.facts, node.facts)
+
+    def test_keys_interned(self):
+        first = NodeRecord(make_node("node1"))
+        second = NodeRecord(make_node("node2"))
+        first_key, = [key for key in first.facts if key == "cpus"]
+        second_key, = [key for key in second.facts if key == "cpus"]
+        T.assert_is(first_key, second_key)
+        T.assert_is(first.spec, second.spec)
+
+    def test_nested_keys_interned(self):
+        document = dict(make_node(), facts={u"disks": [{u"size": 1}]})
+        first = NodeRecord(document)
+        second = NodeRecord(document)
+        first_key, = first.facts['disks'][0].keys()
+        second_key, = second.facts['disks'][0].keys()
+        T.assert_equal(type(first_key), str)
+        T.assert_is(first_key, second_key)
+
+    def test_mapping_access(self):
+        node = NodeRecord(make_node())
+        T.assert_equal(node["facts"], {"cpus": 4, "os": "linux"})
+        T.assert_equal(node.get("state", "missing"), None)
+        T.assert_equal(node.get("bogus", "missing"), "missing")
+        T.assert_equal("name" in node, True)
+        with T.assert_raises(KeyError):
+            node["bogus"]
+
+    def test_extra_keys_kept(self):
+        node = NodeRecord(dict(make_node(), shoe_size=12))
+        T.assert_equal(node["shoe_size"], 12)
+        T.assert_equal(NodeRecord(make_node())._extra, None)
+
+    def test_to_dict(self):
+        plain = NodeRecord(make_node()).to_dict()
+        T.assert_equal(plain['facts'], {"cpus": 4, "os": "linux"})
+        T.assert_equal(plain['tags'], [{"name": "tag1", "spec": None,
+                                        "id": "http://razor/tags/tag1"}])
+        T.assert_equal(plain['policy'], None)
+        T.assert_equal(plain['last_checkin'], None)
+        T.assert_equal(type(plain), dict)
+
+    def test_hyphenated_keys(self):
+        broker = BrokerRecord({"name": "b1", "broker-type": "noop",
+                               "configuration": {"a": 1}})
+        T.assert_equal(broker.broker_type, "noop")
+        T.assert_equal(broker["broker-type"], "noop")
+        T.assert_equal(broker.configuration, {"a": 1})
+
+    def test_equality(self):
+        T.assert_equal(NodeRecord(make_node()), NodeRecord(make_node()))
+        T.assert_not_equal(NodeRecord(make_node("node1")),
+                           NodeRecord(make_node("node2")))
+
+
+class RecordForTest(T.TestCase):
+
+    def test_known_collection(self):
+        T.assert_isinstance(records.record_for("nodes", make_node()),
+                            NodeRecord)
+
+    def test_unknown_collection(self):
+        record = records.record_for("widgets", {"name": "w", "size": 3})
+        T.assert_equal(type(record), Record)
+        T.assert_equal(record["size"], 3)
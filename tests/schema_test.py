@@ -0,0 +1,95 @@
+# -*- coding: utf-8 -*-
+import testify as T
+
+from py_razor_client.schema import CommandSchema
+from py_razor_client.schema import CommandValidationError
+from py_razor_client.schema import compile_schema
+
+
+class CommandSchemaTest(T.TestCase):
+
+    @T.setup
+    def create_schema(self):
+        self.schema = CommandSchema("create-repo", {
+            "name": {"type": "string", "required": True},
+            "iso-url": {"type": "string"},
+            "max-count": {"type": "integer"},
+            "enabled": {"type": "boolean"},
+            "tags": {"type": "array"},
+            "configuration": {},
+        })
+
+    def assert_problems(self, arguments, problems):
+        try:
+            self.schema.prepare(arguments)
+        except CommandValidationError as e:
+            T.assert_equal(e.command, "create-repo")
+            T.assert_equal(e.problems, problems)
+        else:
+            T.assert_equal("no CommandValidationError", "raised")
+
+    def test_renames(self):
+        prepared = self.schema.prepare({"name": "r", "iso_url": "http://x",
+                                        "max_count": 2, "enabled": False,
+                                        "tags": ["a"],
+                                        "configuration": {"k": "v"}})
+        T.assert_equal(prepared, {"name": "r", "iso-url": "http://x",
+                                  "max-count": 2, "enabled": False,
+                                  "tags": ["a"],
+                                  "configuration": {"k": "v"}})
+
+    def test_parameter_names(self):
+        T.assert_equal(self.schema.prepare({"name": "r", "iso-url": "x"}),
+                       {"name": "r", "iso-url": "x"})
+
+    def test_leaves_arguments_alone(self):
+        arguments = {"name": "r", "iso_url": "x"}
+        self.schema.prepare(arguments)
+        T.assert_equal(arguments, {"name": "r", "iso_url": "x"})
+
+    def test_unknown_argument(self):
+        self.assert_problems({"name": "r", "isourl": "x"},
+                             ["unknown argument isourl"])
+
+    def test_missing_required(self):
+        self.assert_problems({"iso_url": "x"},
+                             ["missing required argument name"])
+        self.assert_problems({"name": None},
+                             ["missing required argument name"])
+
+    def test_wrong_type(self):
+        self.assert_problems({"name": 3},
+                             ["name should be of type string, not int"])
+
+    def test_bool_isnt_a_number(self):
+        self.assert_problems({"name": "r", "max_count": True},
+                             ["max-count should be of type integer, not bool"])
+
+    def test_given_twice(self):
+        self.assert_problems({"name": "r", "iso_url": "x", "iso-url": "y"},
+                             ["iso-url given more than once"])
+
+    def test_reports_every_problem(self):
+        self.assert_problems({"bogus": 1, "enabled": "yes"}, [
+            "unknown argument bogus",
+            "enabled should be of type boolean, not str",
+            "missing required argument name",
+        ])
+
+    def test_message(self):
+        error = CommandValidationError("create-repo", ["a", "b"])
+        T.assert_equal(str(error), "Invalid arguments for create-repo: a; b")
+        T.assert_isinstance(error, ValueError)
+
+
+class CompileSchemaTest(T.TestCase):
+
+    def test_compiles(self):
+        schema = compile_schema({"name": "delete-repo",
+                                 "schema": {"name": {"type": "string"}}})
+        T.assert_equal(schema.name, "delete-repo")
+        T.assert_equal(schema.renames, {"name": "name"})
+
+    def test_no_schema(self):
+        T.assert_equal(compile_schema({"name": "delete-repo"}), None)
+        T.assert_equal(compile_schema(None), None)
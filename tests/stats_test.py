@@ -0,0 +1,165 @@
+# -*- coding: utf-8 -*-
+import mock
+import testify as T
+
+from py_razor_client import stats
+
+
+class EndpointForTest(T.TestCase):
+
+    def test_endpoints(self):
+        cases = (
+            ("GET", "http://razor:8080/api", "GET api"),
+            ("GET", "http://razor:8080/api/collections/nodes",
+             "GET collections/nodes"),
+            ("GET", "http://razor:8080/api/collections/nodes/node1",
+             "GET collections/nodes/*"),
+            ("GET", "http://razor:8080/api/collections/nodes/node1/log",
+             "GET collections/nodes/*/log"),
+            ("POST", "http://razor:8080/api/commands/create-repo",
+             "POST commands/create-repo"),
+        )
+        for method, url, expected in cases:
+            T.assert_equal(stats.endpoint_for(method, url), expected)
+
+
+class HistogramTest(T.TestCase):
+
+    def test_empty(self):
+        histogram = stats.Histogram()
+        T.assert_equal(histogram.mean, None)
+        T.assert_equal(histogram.percentile(50), None)
+
+    def test_aggregates(self):
+        histogram = stats.Histogram()
+        for value in (0.002, 0.004, 0.2, 100.0):
+            histogram.add(value)
+
+        T.assert_equal(histogram.count, 4)
+        T.assert_equal(histogram.min, 0.002)
+        T.assert_equal(histogram.max, 100.0)
+        T.assert_almost_equal(histogram.mean, 25.0515, 4)
+        T.assert_equal(histogram.percentile(25), 0.0025)
+        T.assert_equal(histogram.percentile(75), 0.25)
+        T.assert_equal(histogram.percentile(100), 100.0)
+
+    def test_percentile_capped_by_max(self):
+        histogram = stats.Histogram()
+        histogram.add(0.3)
+        T.assert_equal(histogram.percentile(50), 0.3)
+
+
+class RequestRecordTest(T.TestCase):
+
+    @T.setup_teardown
+    def mock_time(self):
+        with mock.patch("py_razor_client.stats.time.time") as self.mock_time:
+            self.mock_time.return_value = 10.0
+            yield
+
+    def test_response_received(self):
+        record = stats.RequestRecord("GET", "http://razor/api")
+        response = mock.Mock(status_code=200, headers={"Content-Length": "42"})
+        self.mock_time.return_value = 10.5
+
+        record.response_received(response)
+
+        T.assert_equal(record.latency, 0.5)
+        T.assert_equal(record.status, 200)
+        T.assert_equal(record.response_bytes, 42)
+
+    def test_response_without_length(self):
+        record = stats.RequestRecord("GET", "http://razor/api")
+        response = mock.Mock(status_code=200, headers={}, content="abc",
+                             _content_consumed=True)
+        record.response_received(response)
+        T.assert_equal(record.response_bytes, 3)
+
+    def test_streamed_response(self):
+        record = stats.RequestRecord("GET", "http://razor/api")
+        response = mock.Mock(status_code=200, headers={"Content-Length": "42"})
+        record.response_received(response, streamed=True)
+        T.assert_equal(record.status, 200)
+        T.assert_equal(record.response_bytes, 0)
+
+    def test_decoding(self):
+        record = stats.RequestRecord("GET", "http://razor/api")
+        with record.decoding():
+            self.mock_time.return_value = 10.25
+        T.assert_equal(record.decode_time, 0.25)
+
+    def test_failed(self):
+        record = stats.RequestRecord("GET", "http://razor/api")
+        error = ValueError()
+        error.response = mock.Mock(status_code=404)
+        self.mock_time.return_value = 11.0
+
+        record.failed(error)
+
+        T.assert_equal(record.error, error)
+        T.assert_equal(record.status, 404)
+        T.assert_equal(record.latency, 1.0)
+
+
+class RequestStatsTest(T.TestCase):
+
+    def make_record(self, url="http://razor/api/collections/nodes",
+                    latency=0.1, status=200, error=None):
+        record = stats.RequestRecord("GET", url)
+        record.latency = latency
+        record.status = status
+        record.error = error
+        record.response_bytes = 100
+        return record
+
+    def test_aggregates_per_endpoint(self):
+        request_stats = stats.RequestStats()
+        request_stats.add(self.make_record())
+        request_stats.add(self.make_record(latency=0.3))
+        request_stats.add(self.make_record(
+            "http://razor/api/collections/nodes/node1", status=404,
+            error=ValueError()))
+
+        endpoints = request_stats.endpoints()
+        T.assert_equal(sorted(endpoints), ["GET collections/nodes",
+                                           "GET collections/nodes/*"])
+        nodes = endpoints["GET collections/nodes"]
+        T.assert_equal(nodes.count, 2)
+        T.assert_equal(nodes.response_bytes, 200)
+        T.assert_almost_equal(nodes.latency.mean, 0.2, 6)
+        member = endpoints["GET collections/nodes/*"]
+        T.assert_equal(member.errors, 1)
+        T.assert_equal(member.statuses, {404: 1})
+
+    def test_listeners(self):
+        request_stats = stats.RequestStats()
+        listener = mock.Mock()
+        broken_listener = mock.Mock(side_effect=ValueError("broken"))
+        request_stats.add_listener(broken_listener)
+        request_stats.add_listener(listener)
+        record = self.make_record()
+
+        with mock.patch("py_razor_client.stats.log") as mock_log:
+            request_stats.add(record)
+            request_stats.remove_listener(listener)
+            request_stats.add(record)
+
+        listener.assert_called_once_with(record)
+        T.assert_equal(mock_log.exception.call_count, 2)
+
+    def test_reset(self):
+        request_stats = stats.RequestStats()
+        request_stats.add(self.make_record())
+        request_stats.reset()
+        T.assert_equal(request_stats.endpoints(), {})
+
+    def test_format_table(self):
+        request_stats = stats.RequestStats()
+        request_stats.add(self.make_record())
+        lines = request_stats.format_table().splitlines()
+
+        T.assert_equal(len(lines), 3)
+        T.assert_equal(lines[0].split()[0], "endpoint")
+        T.assert_equal(lines[1].split()[:4], ["GET", "collections/nodes",
+                                              "1", "0"])
+        T.assert_equal(lines[2], "total request time: 100.0 ms")
@@ -0,0 +1,74 @@
+# -*- coding: utf-8 -*-
+import json
+
+import testify as T
+
+from py_razor_client.streaming import iter_json_items
+
+
+def chunked(text, size):
+    return [text[i:i + size] for i in range(0, len(text), size)]
+
+
+class IterJsonItemsTest(T.TestCase):
+
+    members = [
+        {"name": "node1", "id": "http://razor/api/collections/nodes/node1"},
+        {"name": u"nöde2", "facts": {"a": [1, 2.5, None, True]}},
+        12345,
+        "a string with ] and , and \\\" inside",
+    ]
+
+    def assert_items(self, document, expected, chunk_size):
+        text = json.dumps(document).encode("utf-8")
+        actual = list(iter_json_items(chunked(text, chunk_size)))
+        T.assert_equal(actual, expected)
+
+    def test_bare_array(self):
+        for chunk_size in (1, 2, 7, 64, 4096):
+            self.assert_items(self.members, self.members, chunk_size)
+
+    def test_items_object(self):
+        document = {
+            "spec": "http://api.puppetlabs.com/razor/v1/collections/nodes",
+            "total": 4,
+            "items": self.members,
+        }
+        for chunk_size in (1, 3, 4096):
+            self.assert_items(document, self.members, chunk_size)
+
+    def test_items_object_key_order(self):
+        text = '{"items": [1, 2], "spec": {"x": 1}}'
+        T.assert_equal(list(iter_json_items(chunked(text, 2))), [1, 2])
+
+    def test_empty_array(self):
+        self.assert_items([], [], 1)
+
+    def test_object_without_items(self):
+        self.assert_items({"spec": "x"}, [], 1)
+        self.assert_items({}, [], 1)
+
+    def test_whitespace(self):
+        text = ' \n[ 1 ,\n 2\t,{"a" : 3} ]\n'
+        T.assert_equal(list(iter_json_items(chunked(text, 1))),
+                       [1, 2, {"a": 3}])
+
+    def test_yields_before_end_of_stream(self):
+        def chunks():
+            yield '[{"name": "first"},'
+            raise AssertionError("read past the first member")
+
+        items = iter_json_items(chunks())
+        T.assert_equal(next(items), {"name": "first"})
+
+    def test_truncated(self):
+        with T.assert_raises(ValueError):
+            list(iter_json_items(['[{"name": "node1"}, {"na']))
+
+    def test_not_a_collection(self):
+        with T.assert_raises(ValueError):
+            list(iter_json_items(['"just a string"']))
+
+    def test_bad_separator(self):
+        with T.assert_raises(ValueError):
+            list(iter_json_items(['[1 2]']))
@@ -0,0 +1,167 @@
+# -*- coding: utf-8 -*-
+import threading
+
+import mock
+import testify as T
+
+from py_razor_client.razor_client import RazorClient
+from py_razor_client.watcher import Watcher
+from tests.inventory_test import FakeRazor
+from tests.inventory_test import make_node
+from tests.inventory_test import make_stub
+
+
+class WatcherTestCase(T.TestCase):
+
+    @T.setup
+    def make_watcher(self):
+        self.razor = FakeRazor()
+        self.client = RazorClient("razor", 80, lazy_discovery=True,
+                                  pool_size=4)
+        self.client._collection_urls['nodes'] = \
+            "http://razor/api/collections/nodes"
+        self.client.get_if_modified = self.razor.get_if_modified
+        self.watcher = Watcher(self.client, ["nodes"], interval=0)
+
+    def summarize(self, events):
+        return [(event.kind, event.name) for event in events]
+
+
+class PollTest(WatcherTestCase):
+
+    def test_first_poll_adds_everything(self):
+        self.razor.set_nodes(make_node("node1"), make_node("node2"))
+        events = self.watcher.poll()
+        T.assert_equal(sorted(self.summarize(events)),
+                       [("add", "node1"), ("add", "node2")])
+        T.assert_equal(events[0].previous, None)
+
+    def test_nothing_changed(self):
+        self.razor.set_nodes(make_node("node1"))
+        self.watcher.poll()
+        T.assert_equal(self.watcher.poll(), [])
+
+    def test_member_changed(self):
+        self.razor.set_nodes(make_node("node1", ["tag1"]))
+        self.watcher.poll()
+        self.razor.put(make_stub("nodes", "node1")['id'],
+                       make_node("node1", ["tag2"]))
+
+        events = self.watcher.poll()
+
+        T.assert_equal(self.summarize(events), [("change", "node1")])
+        T.assert_equal(events[0].document, make_node("node1", ["tag2"]))
+        T.assert_equal(events[0].previous, make_node("node1", ["tag1"]))
+
+    def test_member_removed(self):
+        self.razor.set_nodes(make_node("node1"), make_node("node2"))
+        self.watcher.poll()
+        self.razor.set_nodes(make_node("node2"))
+
+        events = self.watcher.poll()
+
+        T.assert_equal(self.summarize(events), [("remove", "node1")])
+        T.assert_equal(events[0].previous, make_node("node1"))
+
+    def test_content_hash_without_validators(self):
+        self.razor.send_etags = False
+        self.razor.set_nodes(make_node("node1", facts={"a": 1, "b": 2}))
+        self.watcher.poll()
+        # The same content, re-serialized, isn't a change
+        self.razor.put(make_stub("nodes", "node1")['id'],
+                       make_node("node1", facts={"b": 2, "a": 1}))
+        T.assert_equal(self.watcher.poll(), [])
+
+        self.razor.put(make_stub("nodes", "node1")['id'],
+                       make_node("node1", facts={"a": 2}))
+        T.assert_equal(self.summarize(self.watcher.poll()),
+                       [("change", "node1")])
+
+    def test_max_requests_rotates(self):
+        self.watcher.max_requests = 2
+        self.razor.set_nodes(*[make_node("node%d" % i) for i in range(3)])
+
+        T.assert_equal(len(self.watcher.poll()), 2)
+        T.assert_equal(self.summarize(self.watcher.poll()), [("add", "node2")])
+        del self.razor.requests[:]
+
+        self.watcher.poll()
+        # The listing plus the two members checked longest ago
+        T.assert_equal(sorted(url for url, _ in self.razor.requests), [
+            "http://razor/api/collections/nodes",
+            make_stub("nodes", "node0")['id'],
+            make_stub("nodes", "node1")['id'],
+        ])
+
+    def test_failed_member_retried(self):
+        self.razor.set_nodes(make_node("node1"))
+        node1 = make_stub("nodes", "node1")['id']
+        self.razor.failing.add(node1)
+        with mock.patch("py_razor_client.watcher.log"):
+            T.assert_equal(self.watcher.poll(), [])
+
+        self.razor.failing.remove(node1)
+        T.assert_equal(self.summarize(self.watcher.poll()),
+                       [("add", "node1")])
+
+    def test_listeners(self):
+        self.razor.set_nodes(make_node("node1"))
+        broken = mock.Mock(side_effect=ValueError)
+        listener = mock.Mock()
+        self.watcher.add_listener(broken)
+        self.watcher.add_listener(listener)
+
+        with mock.patch("py_razor_client.watcher.log"):
+            events = self.watcher.poll()
+
+        listener.assert_called_once_with(events[0])
+
+
+class EventsTest(WatcherTestCase):
+
+    def test_events_until_stopped(self):
+        self.razor.set_nodes(make_node("node1"), make_node("node2"))
+        seen = []
+        for event in self.watcher.events():
+            seen.append(event.name)
+            if len(seen) == 2:
+                self.watcher.stop()
+        T.assert_equal(sorted(seen), ["node1", "node2"])
+
+    def test_survives_failed_poll(self):
+        self.razor.set_nodes(make_node("node1"))
+        listing = "http://razor/api/collections/nodes"
+        self.razor.failing.add(listing)
+        polls = []
+
+        def get_if_modified(url, *validators):
+            if url == listing:
+                polls.append(url)
+                if len(polls) == 2:
+                    self.razor.failing.remove(listing)
+            return self.razor.get_if_modified(url, *validators)
+        self.client.get_if_modified = get_if_modified
+
+        with mock.patch("py_razor_client.watcher.log") as mock_log:
+            for event in self.watcher.events():
+                self.watcher.stop()
+        T.assert_equal(event.name, "node1")
+        T.assert_equal(len(polls), 2)
+        T.assert_equal(mock_log.exception.call_count, 1)
+
+    def test_start_and_stop(self):
+        self.razor.set_nodes(make_node("node1"))
+        self.watcher.interval = 60
+        heard = []
+        first_event = threading.Event()
+
+        def listener(event):
+            heard.append(event)
+            first_event.set()
+        self.watcher.add_listener(listener)
+
+        self.watcher.start()
+        first_event.wait(5)
+        self.watcher.stop()
+
+        T.assert_equal([event.name for event in heard], ["node1"])